@@ -2,10 +2,13 @@
 Main application file for the Interactive World Map.
 Includes navigation and multi-page layout.
 """
+import ipaddress
 import logging
+import os
 from urllib.parse import parse_qs
 import dash
 from dash import html, dcc, Input, Output
+from flask import Response, abort, jsonify, request
 logging.basicConfig(level=logging.ERROR)
 
 # Import page modules
@@ -19,6 +22,14 @@ from pages.mathematics import get_mathematics_layout
 from pages.sports import get_sports_layout
 from pages.analytics import get_analytics_layout, register_analytics_callbacks
 from components.navbar import create_simple_navbar
+from utils.question_bank import question_bank
+from utils.quiz_prefetch import quiz_prefetcher
+from utils.analytics_cache import analytics_cache, analytics_store
+from utils.answer_recorder import answer_recorder
+from utils.async_quiz_stats import async_quiz_stats
+from utils.db_connections import connection_manager
+from utils.live_stats import live_stats
+from utils.quiz_stats import quiz_stats
 
 
 # Initialize the Dash app
@@ -26,6 +37,16 @@ logging.debug("Initializing the app...")
 app = dash.Dash(__name__, suppress_callback_exceptions=True, title="Quizverse")
 server = app.server
 
+# Load the question bank once so quiz starts are served from memory
+question_bank.load()
+# Create and migrate the statistics tables before serving requests
+quiz_stats.init_stats_tables()
+# Load question categories up front so recording answers needs no lookup
+quiz_stats.question_metadata.load()
+# Fold the append-only answer log into the aggregates in the background
+if quiz_stats.append_only:
+    quiz_stats.start_compaction()
+
 # Main app layout with navigation and page content
 app.layout = html.Div([
     dcc.Location(id='url', refresh=False),
@@ -164,6 +185,54 @@ app.clientside_callback(
     [Input('page-content', 'data-navbar-auto-hide')]
 )
 
+def metrics_public() -> bool:
+    """Whether /metrics may be read from other hosts, not just from this one"""
+    return os.environ.get('QUIZ_METRICS_PUBLIC', '').lower() in ('1', 'true', 'yes', 'on')
+
+
+def _is_local_request() -> bool:
+    """Whether the request comes straight from this host rather than through a proxy"""
+    if request.headers.get('X-Forwarded-For') or request.headers.get('Forwarded'):
+        return False
+    try:
+        return ipaddress.ip_address(request.remote_addr or '').is_loopback
+    except ValueError:
+        return False
+
+
+@server.route('/metrics')
+def metrics():
+    """Expose in-process cache counters for monitoring, to local scrapers unless QUIZ_METRICS_PUBLIC is set."""
+    if not metrics_public() and not _is_local_request():
+        abort(404)
+    return jsonify({
+        'question_bank': question_bank.get_stats(),
+        'quiz_prefetch': quiz_prefetcher.get_stats(),
+        'answer_recorder': answer_recorder.get_stats(),
+        'async_stats': async_quiz_stats.get_stats(),
+        'db_connections': connection_manager.get_stats(),
+        'question_metadata': quiz_stats.question_metadata.get_stats(),
+        'analytics_cache': analytics_cache.get_stats(),
+        'analytics_store': analytics_store.get_stats(),
+        'live_stats': live_stats.get_stats(),
+        'trending': quiz_stats.trending.get_stats(),
+        'answer_writes': {
+            'retries': quiz_stats.write_retries,
+            'duplicates': quiz_stats.duplicate_answers
+        }
+    })
+
+@server.route('/analytics/stream')
+def analytics_stream():
+    """Stream stats version changes to the analytics page's live mode."""
+    stream = live_stats.open_stream(request.headers.get('Last-Event-ID'),
+                                    multithreaded=request.environ.get('wsgi.multithread', False))
+    if stream is None:
+        # Live mode is off, full or on a sync worker; the page falls back to polling
+        return Response("Live analytics unavailable", status=503, mimetype='text/plain')
+    return Response(stream, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 #Register call backs
 register_universal_username_modal_callbacks(app)
 register_explore_callbacks(app)
@@ -0,0 +1,82 @@
+/*
+ * Live mode of the analytics page.
+ *
+ * Opens a Server-Sent Events stream to /analytics/stream and clicks the hidden
+ * analytics-live-trigger button whenever the stats version changes, so the page
+ * refreshes through its normal callbacks. The stream is closed while the tab is
+ * hidden and reopened when it becomes visible again. If the server refuses the
+ * stream, analytics-live-failed is clicked and the page goes back to polling.
+ */
+(function () {
+    var stream = null;
+    var wanted = false;
+
+    function click(id) {
+        var button = document.getElementById(id);
+        if (button) {
+            button.click();
+        }
+    }
+
+    function close() {
+        if (stream) {
+            stream.close();
+            stream = null;
+        }
+    }
+
+    function open() {
+        if (stream || !wanted || document.hidden) {
+            return;
+        }
+        stream = new EventSource('/analytics/stream');
+        stream.addEventListener('stats', function () {
+            if (!document.getElementById('analytics-live-trigger')) {
+                // Navigated away from the analytics page
+                close();
+                wanted = false;
+                return;
+            }
+            click('analytics-live-trigger');
+        });
+        stream.onerror = function () {
+            // Network errors reconnect by themselves; a refused stream ends up closed
+            if (stream && stream.readyState === EventSource.CLOSED) {
+                close();
+                wanted = false;
+                click('analytics-live-failed');
+            }
+        };
+    }
+
+    document.addEventListener('visibilitychange', function () {
+        if (document.hidden) {
+            close();
+        } else {
+            // A new connection starts with the current version, which refreshes the page if it changed
+            open();
+        }
+    });
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        analytics: {
+            toggleLive: function (value, failedClicks) {
+                var live = Array.isArray(value) && value.indexOf('live') !== -1;
+                var triggered = (dash_clientside.callback_context.triggered || []).map(function (t) {
+                    return t.prop_id;
+                });
+                close();
+                wanted = false;
+                if (!live) {
+                    return [false, ''];
+                }
+                if (triggered.indexOf('analytics-live-failed.n_clicks') !== -1 || !window.EventSource) {
+                    return [false, 'Live updates unavailable, refreshing every 30s'];
+                }
+                wanted = true;
+                open();
+                return [true, '● Live'];
+            }
+        }
+    });
+})();
@@ -0,0 +1,61 @@
+"""
+Gunicorn configuration (picked up automatically from the working directory, so
+also by the Dockerfile's CMD).
+
+The app runs WEB_CONCURRENCY worker processes, 1 by default, so the per-process
+question bank, prefetch and analytics caches serve every request. Operators who
+scale out set WEB_CONCURRENCY; with more than one worker, the master starts the
+stats aggregator before forking the workers, so a single process owns the SQLite
+writer connection for answer statistics. Set QUIZ_STATS_AGGREGATOR=1 to start it
+for a single worker too, or QUIZ_STATS_AGGREGATOR=0 to disable it (or when
+running it as a sidecar).
+
+Live analytics streams (QUIZ_ANALYTICS_LIVE=1) each hold a request thread for
+minutes, so live mode runs gthread workers with GUNICORN_THREADS threads (8 by
+default) and allows at most half of them to stream, leaving the rest for callbacks.
+"""
+import multiprocessing
+import os
+import time
+
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+
+if os.environ.get('QUIZ_ANALYTICS_LIVE', '').lower() in ('1', 'true', 'yes', 'on'):
+    worker_class = 'gthread'
+    threads = int(os.environ.get('GUNICORN_THREADS', 8))
+    # Read by utils.live_stats in the forked workers
+    os.environ.setdefault('QUIZ_ANALYTICS_LIVE_STREAMS', str(max(1, threads // 2)))
+
+_aggregator_process = None
+
+
+def on_starting(server):
+    """Start the stats aggregator and point the workers at its socket"""
+    global _aggregator_process
+    setting = os.environ.get('QUIZ_STATS_AGGREGATOR', 'auto').lower()
+    if setting in ('0', 'false', 'no', 'off') or (setting == 'auto' and server.cfg.workers <= 1):
+        return
+
+    from utils.stats_aggregator import DEFAULT_SOCKET_PATH, run_aggregator
+    socket_path = os.environ.setdefault('QUIZ_STATS_AGGREGATOR_SOCKET', DEFAULT_SOCKET_PATH)
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+
+    # Spawn rather than fork so the aggregator does not inherit the master's state
+    _aggregator_process = multiprocessing.get_context('spawn').Process(
+        target=run_aggregator, args=(socket_path,), name='quiz-stats-aggregator', daemon=True
+    )
+    _aggregator_process.start()
+
+    # Give the aggregator a moment to bind; workers fall back to direct writes until it does
+    deadline = time.monotonic() + 5.0
+    while not os.path.exists(socket_path) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    server.log.info("Stats aggregator started on %s (pid %s)", socket_path, _aggregator_process.pid)
+
+
+def on_exit(server):
+    """Stop the aggregator after the workers, committing its pending answers"""
+    if _aggregator_process is not None and _aggregator_process.is_alive():
+        _aggregator_process.terminate()
+        _aggregator_process.join(10)
@@ -2,77 +2,128 @@
 Analytics page callbacks for interactive functionality.
 """
 
-import json
 import logging
-from datetime import date, timedelta
+from datetime import date, datetime
 
-from dash import Input, Output
-from utils.quiz_stats import QuizStatsManager
-from utils.datetime_utils import get_local_today, is_same_local_date
+from dash import ClientsideFunction, Input, Output, State, callback_context
+from dash.exceptions import PreventUpdate
+from utils.analytics_cache import analytics_cache, analytics_store
+from utils.async_quiz_stats import async_quiz_stats
 from .layouts import (
     create_daily_performance_chart,
+    create_activity_chart,
+    create_response_time_chart,
     create_category_performance_chart,
     create_sessions_table,
     create_trending_questions_table,
     create_leaderboard_table
 )
 
+def compute_analytics_snapshot(start_date, end_date):
+    """Query everything the analytics page shows for a date range."""
+    # The queries are independent, so run them concurrently on the reader pool
+    today_future = async_quiz_stats.get_daily_stats()
+    sessions_future = async_quiz_stats.get_recent_sessions(limit=20)
+    trending_future = async_quiz_stats.get_trending_questions(limit=15, period_days=7)
+    leaderboard_future = async_quiz_stats.get_session_leaderboard(period_days=30, limit=15)
+    # Distinct players and sessions since local midnight, merged from hourly counters
+    local_midnight = datetime.now().astimezone().replace(hour=0, minute=0, second=0, microsecond=0)
+    distinct_today_future = async_quiz_stats.get_distinct_counts_since(local_midnight)
+    
+    # Daily stats for the selected date range, in one pass over the range
+    range_future = activity_future = overall_times_future = subcategory_times_future = None
+    if start_date and end_date:
+        range_future = async_quiz_stats.get_daily_stats_range(start_date, end_date)
+        # Hourly to monthly activity, at a granularity suited to the range length
+        activity_future = async_quiz_stats.get_rollup_series(start_date, end_date)
+        # Response-time percentiles merged from the daily sketches of the range
+        overall_times_future = async_quiz_stats.get_response_time_percentiles(start_date, end_date)
+        subcategory_times_future = async_quiz_stats.get_response_time_percentiles(
+            start_date, end_date, scope='subcategory')
+    
+    return {
+        'today_stats': today_future.result(),
+        'daily_stats_range': range_future.result() if range_future else [],
+        'activity': activity_future.result() if activity_future else {},
+        'response_times': {
+            'overall': overall_times_future.result().get(0) if overall_times_future else None,
+            'subcategories': list(subcategory_times_future.result().values()) if subcategory_times_future else []
+        },
+        'recent_sessions': sessions_future.result(),
+        'trending_questions': trending_future.result(),
+        'leaderboard': leaderboard_future.result(),
+        'distinct_today': distinct_today_future.result(),
+        'last_updated': date.today().isoformat()
+    }
+
+def get_analytics_snapshot(start_date, end_date, stats_version=None):
+    """
+    Get the shared snapshot for a date range and the token it is published under.
+    
+    Every tab viewing the same range shares one snapshot; today is part of the key
+    so the snapshot rolls over at midnight, and the stats version so a write from
+    another process gets a fresh snapshot.
+    """
+    snapshot_key = (start_date, end_date, date.today().isoformat(), stats_version)
+    
+    def compute():
+        snapshot = compute_analytics_snapshot(start_date, end_date)
+        return analytics_store.put(snapshot), snapshot
+    
+    return analytics_cache.get(snapshot_key, compute)
+
+def load_analytics_section(store_data, section, default):
+    """Read one section of the snapshot referenced by the page's analytics-data-store."""
+    if not store_data:
+        return default
+    snapshot = analytics_store.get(store_data.get('token'))
+    if snapshot is None:
+        # Published by another worker process, or expired: use the range's current snapshot
+        _, snapshot = get_analytics_snapshot(store_data.get('start_date'), store_data.get('end_date'),
+                                             store_data.get('version'))
+    return snapshot.get(section, default)
+
 def register_analytics_callbacks(app):
     """Register all analytics-related callbacks."""
     
     @app.callback(
         [
-            Output('analytics-data-store', 'children'),
+            Output('analytics-data-store', 'data'),
             Output('total-questions-today', 'children'),
             Output('overall-accuracy-today', 'children'),
             Output('active-sessions-today', 'children'),
+            Output('players-today', 'children'),
             Output('avg-response-time-today', 'children')
         ],
         [
             Input('refresh-analytics-btn', 'n_clicks'),
             Input('analytics-refresh-interval', 'n_intervals'),
+            Input('analytics-live-trigger', 'n_clicks'),
             Input('analytics-date-range', 'start_date'),
             Input('analytics-date-range', 'end_date')
-        ]
+        ],
+        State('analytics-data-store', 'data')
     )
-    def refresh_analytics_data(refresh_clicks, interval_triggers, start_date, end_date):
+    def refresh_analytics_data(refresh_clicks, interval_triggers, live_triggers, start_date, end_date, previous):
         """Refresh analytics data and update summary cards."""
         try:
-            stats_manager = QuizStatsManager()
-            
-            # Get today's stats for summary cards
-            today_stats = stats_manager.get_daily_stats()
-            
-            # Get recent sessions
-            recent_sessions = stats_manager.get_recent_sessions(limit=20)
-            
-            # Get trending questions
-            trending_questions = stats_manager.get_trending_questions(limit=15, period_days=7)
+            if start_date and end_date:
+                start_date = date.fromisoformat(start_date).isoformat()
+                end_date = date.fromisoformat(end_date).isoformat()
             
-            # Get session leaderboard
-            leaderboard = stats_manager.get_session_leaderboard(period_days=30, limit=15)
+            # Nothing was written since the page's snapshot: leave the cards, charts and tables as they are,
+            # unless the user asked for a refresh
+            stats_version = async_quiz_stats.get_stats_version().result()
+            today = date.today().isoformat()
+            triggered_id = callback_context.triggered[0]['prop_id'].split('.')[0] if callback_context.triggered else None
+            if triggered_id != 'refresh-analytics-btn' and previous and \
+                    (previous.get('version'), previous.get('day'), previous.get('start_date'),
+                     previous.get('end_date')) == (stats_version, today, start_date, end_date):
+                raise PreventUpdate
             
-            # Get daily stats for the selected date range
-            daily_stats_range = []
-            if start_date and end_date:
-                current_date = date.fromisoformat(start_date)
-                end_date_obj = date.fromisoformat(end_date)
-                
-                while current_date <= end_date_obj:
-                    day_stats = stats_manager.get_daily_stats(current_date.isoformat())
-                    if day_stats['summary']['total_questions_asked'] > 0:
-                        daily_stats_range.append(day_stats)
-                    current_date += timedelta(days=1)
-            
-            # Prepare data store
-            analytics_data = {
-                'today_stats': today_stats,
-                'daily_stats_range': daily_stats_range,
-                'recent_sessions': recent_sessions,
-                'trending_questions': trending_questions,
-                'leaderboard': leaderboard,
-                'last_updated': date.today().isoformat()
-            }
+            token, analytics_data = get_analytics_snapshot(start_date, end_date, stats_version)
+            today_stats = analytics_data['today_stats']
+            distinct_today = analytics_data['distinct_today']
             
             # Extract summary values
             summary = today_stats['summary']
@@ -80,42 +131,58 @@ def register_analytics_callbacks(app):
             accuracy = f"{summary['overall_accuracy']:.1f}%"
             avg_time = f"{summary['avg_response_time']:.1f}s"
             
-            # Count today's sessions (properly handle timezone conversion)
-            today_local_date = get_local_today()  # Get today in local timezone
-            
-            active_sessions = len([s for s in recent_sessions 
-                                 if s['started_at'] and is_same_local_date(s['started_at'], today_local_date)])
+            # Sessions and players since local midnight, estimated from HyperLogLog counters
+            active_sessions = distinct_today['sessions']
+            players = f"{distinct_today['users']} players"
             
+            # The browser only keeps the token; charts and tables read their sections server-side
             return (
-                json.dumps(analytics_data),
+                {'token': token, 'version': stats_version, 'day': today,
+                 'start_date': start_date, 'end_date': end_date},
                 str(total_questions),
                 accuracy,
                 str(active_sessions),
+                players,
                 avg_time
             )
             
+        except PreventUpdate:
+            raise
         except Exception as e:
             logging.error("Error refreshing analytics data: %s",e)
             return (
-                json.dumps({}),
+                None,
                 "Error",
                 "Error",
                 "Error",
+                "",
                 "Error"
             )
     
+    # Live mode: open or close the stats stream in the browser and pause polling while it is open
+    app.clientside_callback(
+        ClientsideFunction(namespace='analytics', function_name='toggleLive'),
+        [
+            Output('analytics-refresh-interval', 'disabled'),
+            Output('analytics-live-status', 'children')
+        ],
+        [
+            Input('analytics-live-toggle', 'value'),
+            Input('analytics-live-failed', 'n_clicks')
+        ]
+    )
+    
     @app.callback(
         Output('daily-performance-chart', 'figure'),
-        Input('analytics-data-store', 'children')
+        Input('analytics-data-store', 'data')
     )
-    def update_daily_performance_chart(analytics_data_json):
+    def update_daily_performance_chart(store_data):
         """Update the daily performance chart."""
         try:
-            if not analytics_data_json:
+            if not store_data:
                 return create_daily_performance_chart([])
             
-            analytics_data = json.loads(analytics_data_json)
-            daily_stats = analytics_data.get('daily_stats_range', [])
+            daily_stats = load_analytics_section(store_data, 'daily_stats_range', [])
             
             return create_daily_performance_chart(daily_stats)
             
@@ -123,18 +190,53 @@ def register_analytics_callbacks(app):
             logging.error("Error updating daily performance chart: %s",e)
             return create_daily_performance_chart([])
     
+    @app.callback(
+        Output('activity-chart', 'figure'),
+        Input('analytics-data-store', 'data')
+    )
+    def update_activity_chart(store_data):
+        """Update the quiz activity chart."""
+        try:
+            if not store_data:
+                return create_activity_chart({})
+            
+            activity = load_analytics_section(store_data, 'activity', {})
+            
+            return create_activity_chart(activity)
+            
+        except Exception as e:
+            logging.error("Error updating activity chart: %s",e)
+            return create_activity_chart({})
+    
+    @app.callback(
+        Output('response-time-chart', 'figure'),
+        Input('analytics-data-store', 'data')
+    )
+    def update_response_time_chart(store_data):
+        """Update the response time percentiles chart."""
+        try:
+            if not store_data:
+                return create_response_time_chart({})
+            
+            response_times = load_analytics_section(store_data, 'response_times', {})
+            
+            return create_response_time_chart(response_times)
+            
+        except Exception as e:
+            logging.error("Error updating response time chart: %s",e)
+            return create_response_time_chart({})
+    
     @app.callback(
         Output('category-performance-chart', 'figure'),
-        Input('analytics-data-store', 'children')
+        Input('analytics-data-store', 'data')
     )
-    def update_category_performance_chart(analytics_data_json):
+    def update_category_performance_chart(store_data):
         """Update the category performance chart."""
         try:
-            if not analytics_data_json:
+            if not store_data:
                 return create_category_performance_chart([])
             
-            analytics_data = json.loads(analytics_data_json)
-            today_stats = analytics_data.get('today_stats', {})
+            today_stats = load_analytics_section(store_data, 'today_stats', {})
             category_stats = today_stats.get('category_stats', [])
             
             return create_category_performance_chart(category_stats)
@@ -145,16 +247,15 @@ def register_analytics_callbacks(app):
     
     @app.callback(
         Output('recent-sessions-table', 'children'),
-        Input('analytics-data-store', 'children')
+        Input('analytics-data-store', 'data')
     )
-    def update_recent_sessions_table(analytics_data_json):
+    def update_recent_sessions_table(store_data):
         """Update the recent sessions table."""
         try:
-            if not analytics_data_json:
+            if not store_data:
                 return create_sessions_table([])
             
-            analytics_data = json.loads(analytics_data_json)
-            recent_sessions = analytics_data.get('recent_sessions', [])
+            recent_sessions = load_analytics_section(store_data, 'recent_sessions', [])
             
             return create_sessions_table(recent_sessions)
             
@@ -164,16 +265,15 @@ def register_analytics_callbacks(app):
     
     @app.callback(
         Output('trending-questions-table', 'children'),
-        Input('analytics-data-store', 'children')
+        Input('analytics-data-store', 'data')
     )
-    def update_trending_questions_table(analytics_data_json):
+    def update_trending_questions_table(store_data):
         """Update the trending questions table."""
         try:
-            if not analytics_data_json:
+            if not store_data:
                 return create_trending_questions_table([])
             
-            analytics_data = json.loads(analytics_data_json)
-            trending_questions = analytics_data.get('trending_questions', [])
+            trending_questions = load_analytics_section(store_data, 'trending_questions', [])
             
             return create_trending_questions_table(trending_questions)
             
@@ -183,16 +283,15 @@ def register_analytics_callbacks(app):
     
     @app.callback(
         Output('session-leaderboard-table', 'children'),
-        Input('analytics-data-store', 'children')
+        Input('analytics-data-store', 'data')
     )
-    def update_session_leaderboard_table(analytics_data_json):
+    def update_session_leaderboard_table(store_data):
         """Update the session leaderboard table."""
         try:
-            if not analytics_data_json:
+            if not store_data:
                 return create_leaderboard_table([])
             
-            analytics_data = json.loads(analytics_data_json)
-            leaderboard = analytics_data.get('leaderboard', [])
+            leaderboard = load_analytics_section(store_data, 'leaderboard', [])
             
             return create_leaderboard_table(leaderboard)
             
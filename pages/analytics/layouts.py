@@ -29,7 +29,18 @@ def get_analytics_layout():
                     end_date=date.today(),
                     display_format='YYYY-MM-DD',
                     style={"margin-left": "10px"}
-                )
+                ),
+                html.Span(" ", style={"margin": "0 10px"}),
+                dcc.Checklist(
+                    id='analytics-live-toggle',
+                    options=[{'label': ' Live updates', 'value': 'live'}],
+                    value=[],
+                    inline=True
+                ),
+                html.Span(id="analytics-live-status", style={"margin-left": "10px"}),
+                # Clicked by assets/analytics_live.js when the live stream reports a change or fails
+                html.Button(id="analytics-live-trigger", n_clicks=0, style={"display": "none"}),
+                html.Button(id="analytics-live-failed", n_clicks=0, style={"display": "none"})
             ], className="analytics-controls")
         ], style={"margin-bottom": "20px"}),
         
@@ -52,7 +63,8 @@ def get_analytics_layout():
             html.Div([
                 html.Div([
                     html.H3(id="active-sessions-today", children="0"),
-                    html.P("Sessions Today", className="card-subtitle")
+                    html.P("Sessions Today", className="card-subtitle"),
+                    html.P(id="players-today", children="", className="card-subtitle")
                 ], className="analytics-card")
             ], className="col-md-3"),
             
@@ -72,6 +84,18 @@ def get_analytics_layout():
                 dcc.Graph(id="daily-performance-chart")
             ], className="chart-container", style={"margin-bottom": "30px"}),
             
+            # Activity per hour, day, week or month
+            html.Div([
+                html.H3("⏱️ Quiz Activity"),
+                dcc.Graph(id="activity-chart")
+            ], className="chart-container", style={"margin-bottom": "30px"}),
+            
+            # Response time percentiles overall and per subcategory
+            html.Div([
+                html.H3("🐢 Response Times"),
+                dcc.Graph(id="response-time-chart")
+            ], className="chart-container", style={"margin-bottom": "30px"}),
+            
             # Category performance
             html.Div([
                 html.H3("📚 Category Performance"),
@@ -100,10 +124,10 @@ def get_analytics_layout():
             ], className="table-container", style={"margin-bottom": "30px"})
         ]),
         
-        # Hidden div to store analytics data
-        html.Div(id="analytics-data-store", style={"display": "none"}),
+        # Token of the server-side analytics snapshot the page is showing
+        dcc.Store(id="analytics-data-store"),
         
-        # Auto-refresh interval (every 30 seconds)
+        # Auto-refresh interval (every 30 seconds), disabled while live updates stream in
         dcc.Interval(
             id='analytics-refresh-interval',
             interval=30*1000,  # 30 seconds
@@ -158,6 +182,87 @@ def create_daily_performance_chart(daily_stats):
     
     return fig
 
+def create_activity_chart(activity):
+    """Create answers and sessions per time bucket chart."""
+    buckets = activity.get('buckets', []) if activity else []
+    if not buckets:
+        return go.Figure().add_annotation(
+            text="No data available",
+            xref="paper", yref="paper",
+            x=0.5, y=0.5, showarrow=False
+        )
+    
+    starts = [bucket['bucket_start'] for bucket in buckets]
+    
+    fig = go.Figure()
+    
+    fig.add_trace(go.Bar(
+        x=starts,
+        y=[bucket['answers'] for bucket in buckets],
+        name='Answers',
+        marker_color='lightblue'
+    ))
+    
+    fig.add_trace(go.Scatter(
+        x=starts,
+        y=[bucket['sessions_started'] for bucket in buckets],
+        mode='lines+markers',
+        name='Sessions Started',
+        line=dict(color='#2ca02c'),
+        yaxis='y2'
+    ))
+    
+    fig.update_layout(
+        title=f"Quiz Activity per {activity['granularity'].capitalize()}",
+        xaxis_title="Time (UTC)",
+        yaxis=dict(title="Answers", side="left"),
+        yaxis2=dict(title="Sessions", side="right", overlaying="y"),
+        hovermode='x unified',
+        legend=dict(x=0.02, y=0.98)
+    )
+    
+    return fig
+
+def create_response_time_chart(response_times):
+    """Create p50/p90/p99 response time chart, overall and per subcategory."""
+    groups = []
+    if response_times and response_times.get('overall'):
+        groups.append(('All Questions', response_times['overall']))
+    subcategories = sorted((response_times or {}).get('subcategories', []),
+                           key=lambda stat: stat['count'], reverse=True)
+    groups += [(f"{stat.get('category')} / {stat.get('subcategory')}", stat) for stat in subcategories]
+    if not groups:
+        return go.Figure().add_annotation(
+            text="No data available",
+            xref="paper", yref="paper",
+            x=0.5, y=0.5, showarrow=False
+        )
+    
+    names = [name for name, _ in groups]
+    counts = [stat['count'] for _, stat in groups]
+    
+    fig = go.Figure()
+    
+    for percentile, color in (('p50', 'lightblue'), ('p90', '#ff7f0e'), ('p99', '#d62728')):
+        fig.add_trace(go.Bar(
+            x=names,
+            y=[stat.get(percentile) for _, stat in groups],
+            name=percentile,
+            marker_color=color,
+            customdata=counts,
+            hovertemplate=f'<b>%{{x}}</b><br>{percentile}: %{{y:.2f}}s<br>Answers: %{{customdata}}<extra></extra>'
+        ))
+    
+    fig.update_layout(
+        title="Response Time Percentiles",
+        xaxis_title="Subcategory",
+        yaxis_title="Seconds",
+        barmode='group',
+        legend=dict(x=0.02, y=0.98)
+    )
+    
+    return fig
+
 def create_category_performance_chart(category_stats):
     """Create category performance chart."""
     if not category_stats:
@@ -4,10 +4,14 @@ Dash callbacks for the trivia module.
 import time
 import logging
 import traceback
+import uuid
 from dash import html, Input, Output, State, callback_context
 import dash.exceptions
-from utils.quiz_generators import get_quiz_questions,QUIZ_TYPE_LABEL
-from utils.quiz_stats import quiz_stats
+from utils.quiz_generators import QUIZ_TYPE_LABEL
+from utils.quiz_stats import answer_event_id
+from utils.answer_recorder import answer_recorder
+from utils.async_quiz_stats import async_quiz_stats
+from .universal_callbacks import get_questions_for_user, prefetch_questions_for_user
 from .quiz_components import create_progress_bar, create_question_layout, create_completion_screen
 from .ui_components import create_feedback_message
 
@@ -49,18 +53,20 @@ def register_trivia_callbacks(app):
         #     questions = get_math_quiz_questions(quiz_type, None, 10)  # Math quizzes use 10 questions
         #     quiz_type_display = MATH_QUIZ_TYPE_LABEL[quiz_type]
         # elif 
+        # Use stored username
+        username = username_data.get('username', 'anonymous_user')
+        
+        # Take the question set prefetched while the completion screen was showing
+        prefetch_key = current_data.get('prefetch_key') if current_data else None
+        prefetched_for = current_data.get('username', 'anonymous_user') if current_data else None
+        questions = get_questions_for_user(prefetch_key, quiz_type, username, prefetched_for=prefetched_for)
         if quiz_type in QUIZ_TYPE_LABEL:
-            questions = get_quiz_questions(quiz_type, NUM_OF_QUESTIONS)
             quiz_type_display = QUIZ_TYPE_LABEL[quiz_type]
         else:
-            questions = get_quiz_questions(quiz_type, NUM_OF_QUESTIONS)
             quiz_type_display = f"{quiz_type.capitalize()} Quiz" # Fallback just in case
         
-        # Use stored username
-        username = username_data.get('username', 'anonymous_user')
-        
         # Start a new quiz session for analytics
-        session_id = quiz_stats.start_quiz_session(
+        session_id = async_quiz_stats.start_quiz_session(
             session_name=f"{quiz_type_display} Quiz", 
             user_id=username
         )
@@ -75,6 +81,7 @@ def register_trivia_callbacks(app):
             'quiz_type_display': quiz_type_display,
             'user_answers': {},
             'session_id': session_id,
+            'username': username,
             'question_start_time': time.time()
         }
 
@@ -143,12 +150,15 @@ def register_trivia_callbacks(app):
                     logging.info("Recording quiz answer for session %s: question_id=%s, is_correct=%s, response_time=%s", 
                                current_data['session_id'], question_id, is_correct, response_time)
                     
-                    quiz_stats.record_quiz_answer_with_session(
+                    answer_recorder.record(
                         session_id=current_data['session_id'],
                         question_id=question_id,
                         is_correct=is_correct,
                         response_time=response_time,
-                        user_answer=user_answer
+                        user_answer=user_answer,
+                        user_id=current_data.get('username'),
+                        # Same key for a double click or a retried callback, so the answer counts once
+                        event_id=answer_event_id(current_data['session_id'], current_index)
                     )
                     
                     logging.info("Successfully recorded quiz answer for session %s", current_data['session_id'])
@@ -230,7 +240,8 @@ def register_trivia_callbacks(app):
                     questions,
                     user_answers
                 )
-                completion_data = {'index': 0, 'score': 0, 'questions': [], 'answered': False, 'user_answers': {}, 'quiz_type': quiz_type}
+                completion_data = {'index': 0, 'score': 0, 'questions': [], 'answered': False, 'user_answers': {}, 'quiz_type': quiz_type,
+                                   'prefetch_key': _prefetch_restart(quiz_type, current_data)}
                 return completion_screen, completion_data, []
             else:
                 # Next question
@@ -260,7 +271,9 @@ def register_trivia_callbacks(app):
             # Complete the quiz session for analytics
             if 'session_id' in current_data:
                 try:
-                    session_result = quiz_stats.end_quiz_session(current_data['session_id'])
+                    # Writes buffered answers first; a session ended before they are all in is
+                    # finalized again by the recorder's next complete flush
+                    session_result = answer_recorder.end_session(current_data['session_id'])
                     logging.info("Successfully ended quiz session: %s", current_data['session_id'])
                     logging.info("Session result: %s", session_result)
                 except Exception as e:
@@ -288,7 +301,8 @@ def register_trivia_callbacks(app):
                 'answered': False,
                 'user_answers': user_answers,
                 'quiz_type': quiz_type,
-                'completed': True
+                'completed': True,
+                'prefetch_key': _prefetch_restart(quiz_type, current_data)
             }
             return completion_screen, completion_data, []
 
@@ -336,6 +350,13 @@ def register_trivia_callbacks(app):
         raise dash.exceptions.PreventUpdate
 
 
+def _prefetch_restart(quiz_type, current_data):
+    """Prefetch questions for a restart while the completion screen is showing."""
+    prefetch_key = str(uuid.uuid4())
+    prefetch_questions_for_user(prefetch_key, quiz_type, current_data.get('username', 'anonymous_user'))
+    return prefetch_key
+
+
 def _return_to_quiz_selection(current_data=None):
     """Helper function to return to the quiz selection screen."""
     reset_data = {'index': 0, 'score': 0, 'questions': [], 'answered': False, 'user_answers': {}}
@@ -4,15 +4,54 @@ Universal quiz callbacks that work across all quiz pages.
 import logging
 import time
 import traceback
+import uuid
 from dash import Input, Output, State, callback_context
 import dash.exceptions
 from utils.quiz_generators import get_quiz_questions, QUIZ_TYPE_LABEL
+from utils.quiz_prefetch import quiz_prefetcher
 from utils.quiz_stats import quiz_stats
+from utils.async_quiz_stats import async_quiz_stats
 from .quiz_components import create_progress_bar, create_question_layout
 
 
 NUM_OF_QUESTIONS = 20
 
+
+def load_seen_questions(username):
+    """Load the questions this user has already seen, or None if they cannot be loaded."""
+    try:
+        return quiz_stats.get_seen_questions(username)
+    except Exception as e:
+        logging.error("Error loading seen questions for user %s: %s", username, e)
+        return None
+
+
+def fetch_questions_for_user(quiz_type, username):
+    """Fetch a question set, preferring questions this user has not seen yet."""
+    return get_quiz_questions(quiz_type, NUM_OF_QUESTIONS, seen=load_seen_questions(username))
+
+
+def prefetch_questions_for_user(prefetch_key, quiz_type, username):
+    """Start building the next question set for this user in the background."""
+    quiz_prefetcher.prefetch(prefetch_key, quiz_type, lambda: fetch_questions_for_user(quiz_type, username))
+
+
+def get_questions_for_user(prefetch_key, quiz_type, username, prefetched_for=None):
+    """
+    Take a prefetched question set, or fetch synchronously on a miss.
+
+    When the set was prefetched for another username (the player typed a different
+    name in the modal), it is only used if this user has seen none of its questions.
+    """
+    def accept(questions):
+        if prefetched_for is None or prefetched_for == username:
+            return True
+        seen_questions = load_seen_questions(username)
+        return seen_questions is None or not any(question['id'] in seen_questions for question in questions)
+
+    return quiz_prefetcher.get_questions(prefetch_key, quiz_type,
+                                         lambda: fetch_questions_for_user(quiz_type, username), accept)
+
 def register_universal_username_modal_callbacks(app):
     """Register universal username modal callbacks that work across all quiz pages."""
     
@@ -79,10 +118,16 @@ def register_universal_username_modal_callbacks(app):
             if quiz_type:
                 # Show modal
                 current_username = username_store_data.get('username', '')
+                
+                # Build the question set while the player confirms their username
+                prefetch_key = str(uuid.uuid4())
+                prefetch_user = current_username or 'anonymous_user'
+                prefetch_questions_for_user(prefetch_key, quiz_type, prefetch_user)
+                
                 if current_username == 'anonymous_user':
                     current_username = ''
                 
-                pending_quiz = {'quiz_type': quiz_type}
+                pending_quiz = {'quiz_type': quiz_type, 'prefetch_key': prefetch_key, 'prefetch_user': prefetch_user}
                 return {
                     'display': 'flex',
                     'position': 'fixed',
@@ -141,14 +186,15 @@ def register_universal_username_modal_callbacks(app):
         # Use entered username or default to anonymous_user
         username = username_input.strip() if username_input and username_input.strip() else 'anonymous_user'
         
-        #Get Questions from DB
-        questions = get_quiz_questions(quiz_type, NUM_OF_QUESTIONS)
+        #Get Questions prefetched while the modal was open, or from DB on a miss
+        questions = get_questions_for_user(pending_quiz.get('prefetch_key'), quiz_type, username,
+                                           prefetched_for=pending_quiz.get('prefetch_user'))
         logging.debug("Questions fetched successfully for quiztype: %s",quiz_type)
         quiz_type_display = QUIZ_TYPE_LABEL.get(quiz_type, f"{quiz_type.capitalize()} Quiz")
 
         # Start a new quiz session for analytics with the username
         try:
-            session_id = quiz_stats.start_quiz_session(
+            session_id = async_quiz_stats.start_quiz_session(
                 session_name=f"{quiz_type_display}", 
                 user_id=username
             )
@@ -169,6 +215,7 @@ def register_universal_username_modal_callbacks(app):
             'quiz_type_display': quiz_type_display,
             'user_answers': {},
             'session_id': session_id,
+            'username': username,
             'question_start_time': time.time()
         }
 
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark the overhead of deduplicating answers by event id.
+
+Builds a quiz_sessions table with N existing answers (10M by default) and compares
+recording new answers without event ids (plain INSERT) against the idempotent path
+(lookup of the event id, then INSERT into the unique event_id index). Each answer
+is its own transaction, as on the answer callback path.
+
+Usage:
+    python tests/benchmarks/bench_answer_dedupe.py
+    python tests/benchmarks/bench_answer_dedupe.py --rows 1000000 --answers 5000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from utils.db_connections import ConnectionManager
+
+QUIZ_SESSIONS_SCHEMA = """
+    CREATE TABLE quiz_sessions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT NOT NULL,
+        question_id INTEGER NOT NULL,
+        user_answer TEXT,
+        is_correct BOOLEAN NOT NULL,
+        response_time REAL NOT NULL,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        event_id TEXT
+    );
+    CREATE INDEX idx_quiz_sessions_session_id ON quiz_sessions(session_id);
+"""
+
+QUESTIONS_PER_SESSION = 20
+
+
+def existing_rows(rows):
+    for i in range(rows):
+        session_id = f"{i // QUESTIONS_PER_SESSION:08x}-0000-4000-8000-000000000000"
+        index = i % QUESTIONS_PER_SESSION
+        yield (session_id, random.randint(1, 5000), 'answer', index % 2, 3.5, f"{session_id}:{index}")
+
+
+def build_database(path, rows, with_index):
+    start = time.perf_counter()
+    with sqlite3.connect(path) as conn:
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.executescript(QUIZ_SESSIONS_SCHEMA)
+        conn.executemany("""
+            INSERT INTO quiz_sessions (session_id, question_id, user_answer, is_correct, response_time, event_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, existing_rows(rows))
+        if with_index:
+            conn.execute("CREATE UNIQUE INDEX idx_quiz_sessions_event_id ON quiz_sessions(event_id)")
+    return time.perf_counter() - start
+
+
+def record_plain(conn, answer):
+    with conn:
+        conn.execute("""
+            INSERT INTO quiz_sessions (session_id, question_id, user_answer, is_correct, response_time)
+            VALUES (?, ?, ?, ?, ?)
+        """, answer[:5])
+
+
+def record_idempotent(conn, answer):
+    with conn:
+        if conn.execute("SELECT 1 FROM quiz_sessions WHERE event_id = ?", (answer[5],)).fetchone():
+            return
+        conn.execute("""
+            INSERT INTO quiz_sessions (session_id, question_id, user_answer, is_correct, response_time, event_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, answer)
+
+
+def measure(path, record, answers):
+    manager = ConnectionManager()
+    conn = manager.get_connection(path)
+    new_answers = [(f"new-{i // QUESTIONS_PER_SESSION}", 1, 'answer', 1, 2.0,
+                    f"new-{i // QUESTIONS_PER_SESSION}:{i % QUESTIONS_PER_SESSION}") for i in range(answers)]
+    start = time.perf_counter()
+    for answer in new_answers:
+        record(conn, answer)
+    elapsed = time.perf_counter() - start
+
+    # Every retry of an already recorded answer must be a no-op
+    retry_start = time.perf_counter()
+    for answer in new_answers[:min(1000, answers)]:
+        record(conn, answer)
+    retry_elapsed = time.perf_counter() - retry_start
+    manager.close_all()
+    return elapsed / answers * 1e6, retry_elapsed / min(1000, answers) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10_000_000, help="Existing answers in quiz_sessions")
+    parser.add_argument('--answers', type=int, default=10_000, help="New answers recorded per variant")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        plain_path = os.path.join(tmp, "plain.db")
+        indexed_path = os.path.join(tmp, "indexed.db")
+        plain_build = build_database(plain_path, args.rows, with_index=False)
+        indexed_build = build_database(indexed_path, args.rows, with_index=True)
+        plain_size = os.path.getsize(plain_path) / 2**20
+        indexed_size = os.path.getsize(indexed_path) / 2**20
+
+        plain_us, plain_retry_us = measure(plain_path, record_plain, args.answers)
+        idempotent_us, idempotent_retry_us = measure(indexed_path, record_idempotent, args.answers)
+
+    print(f"quiz_sessions with {args.rows:,} existing answers, {args.answers:,} new answers")
+    print(f"{'variant':<26} | {'build s':>8} | {'size MiB':>8} | {'us/answer':>9} | {'us/retry':>8}")
+    print(f"{'no event id (plain)':<26} | {plain_build:>8.1f} | {plain_size:>8.0f} | {plain_us:>9.1f} | {plain_retry_us:>8.1f}")
+    print(f"{'event id + unique index':<26} | {indexed_build:>8.1f} | {indexed_size:>8.0f} | {idempotent_us:>9.1f} | {idempotent_retry_us:>8.1f}")
+    print("(plain retries insert a duplicate; idempotent retries are skipped)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark least-asked-first question selection.
+
+Compares the original query, which summed daily_question_stats per question and
+then sorted by ``ORDER BY total_times_asked, RANDOM() LIMIT ?``, with the current
+SQL fallback (the same top-k query over question_usage_totals) and with a draw
+from the bucketed sampler of the in-memory bank, for a single subcategory of 10k,
+100k and 1M questions. The last column is the cost of rebuilding a bank sampler
+from question_usage_totals, which runs on a background thread.
+
+Usage:
+    python tests/benchmarks/bench_question_sampler.py
+    python tests/benchmarks/bench_question_sampler.py --sizes 10000 100000 --repeat 20
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from tests.unit.conftest import CONTENT_SCHEMA
+from utils.database_utils import QuizDatabase
+from utils.question_bank import QuestionBank, QuestionGroup
+from utils.quiz_generators import _build_bank_sampler, _fetch_questions_from_db
+from utils.quiz_stats import QuizStatsManager
+
+ORIGINAL_QUERY = """
+    SELECT q.*, c.name as category_name, s.name as subcategory_name,
+           COALESCE(SUM(dqs.times_asked), 0) as total_times_asked
+    FROM questions_normalized q
+    JOIN categories c ON q.category_id = c.id
+    JOIN subcategories s ON q.subcategory_id = s.id
+    LEFT JOIN daily_question_stats dqs ON q.id = dqs.question_id
+    WHERE c.name = ? AND s.name = ? AND q.is_active = 1 AND c.is_active = 1 AND s.is_active = 1
+    GROUP BY q.id, q.question, q.correct_answer, q.option1, q.option2, q.option3, 
+             q.fun_fact, q.category_id, q.subcategory_id, q.difficulty, q.points,
+             q.image, q.is_active, c.name, s.name
+    ORDER BY total_times_asked ASC, RANDOM()
+    LIMIT ?
+"""
+
+
+def build_database(path, size, max_usage, days):
+    """Create a database with one subcategory of `size` questions asked on `days` days."""
+    with sqlite3.connect(path) as conn:
+        conn.executescript(CONTENT_SCHEMA)
+        conn.execute("INSERT INTO categories (id, name, display_name) VALUES (1, 'bench', 'Bench')")
+        conn.execute("INSERT INTO subcategories (id, category_id, name, display_name) VALUES (1, 1, 'bench', 'Bench')")
+        conn.executemany("""
+            INSERT INTO questions_normalized
+            (id, category_id, subcategory_id, question, correct_answer, option1, option2, option3)
+            VALUES (?, 1, 1, ?, 'a', 'b', 'c', 'd')
+        """, ((i, f"question {i}") for i in range(1, size + 1)))
+    stats_manager = QuizStatsManager(path)
+    stats_manager.init_stats_tables()
+    with sqlite3.connect(path) as conn:
+        conn.executemany(
+            "INSERT INTO daily_question_stats (question_id, date, times_asked) VALUES (?, DATE('now', ?), ?)",
+            ((i, f"-{day} days", random.randint(0, max_usage // days))
+             for i in range(1, size + 1) for day in range(days))
+        )
+    stats_manager.rebuild_usage_totals()
+
+
+def timed(fn, repeat):
+    """Return the median wall time of `fn` in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def run(size, k, repeat, max_usage, days):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        build_database(path, size, max_usage, days)
+        db = QuizDatabase(path)
+
+        original = timed(lambda: db.execute_query(ORIGINAL_QUERY, ('bench', 'bench', k)), repeat)
+
+        with patch('utils.quiz_generators.quiz_db', db):
+            sql_fallback = timed(lambda: _fetch_questions_from_db('bench', 'bench', k), repeat)
+
+        group = QuestionGroup('bench', 'bench', 1, 1)
+        group.ids.extend(range(1, size + 1))
+        with patch('utils.quiz_generators.question_bank', QuestionBank(db)):
+            rebuild = timed(lambda: _build_bank_sampler(group), max(1, repeat // 5))
+            sampler = _build_bank_sampler(group)
+        bank_draw = timed(lambda: sampler.sample(k), repeat)
+
+    print(f"{size:>9,} | {original:>14.2f} | {sql_fallback:>12.2f} | {bank_draw:>9.4f} | {rebuild:>18.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--k', type=int, default=20, help="Questions drawn per quiz start")
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--max-usage', type=int, default=50, help="Highest usage count seeded")
+    parser.add_argument('--days', type=int, default=7, help="Days of daily_question_stats per question")
+    args = parser.parse_args()
+
+    print(f"Median time per draw of {args.k} questions (ms)")
+    print(f"{'questions':>9} | {'original query':>14} | {'SQL fallback':>12} | {'bank draw':>9} | "
+          f"{'background rebuild':>18}")
+    for size in args.sizes:
+        run(size, args.k, args.repeat, args.max_usage, args.days)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Load test for answer recording from several worker processes.
+
+Each worker process records answers one at a time, like answer clicks spread over
+gunicorn workers, either by writing to SQLite directly or by sending them to a
+stats aggregator over its Unix domain socket. Reports committed answers per second
+for 1 to N workers.
+
+Usage:
+    python tests/benchmarks/bench_stats_aggregator.py
+    python tests/benchmarks/bench_stats_aggregator.py --workers 1 2 4 8 --answers 2000
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from tests.unit.conftest import CONTENT_SCHEMA
+from utils.quiz_stats import AnswerEvent, QuizStatsManager
+from utils.stats_aggregator import AggregatorClient, run_aggregator
+
+QUESTIONS = 1000
+
+
+def build_database(path):
+    """Create a database with one subcategory of questions and the statistics tables."""
+    with sqlite3.connect(path) as conn:
+        conn.executescript(CONTENT_SCHEMA)
+        conn.execute("INSERT INTO categories (id, name, display_name) VALUES (1, 'bench', 'Bench')")
+        conn.execute("INSERT INTO subcategories (id, category_id, name, display_name) VALUES (1, 1, 'bench', 'Bench')")
+        conn.executemany("""
+            INSERT INTO questions_normalized
+            (id, category_id, subcategory_id, question, correct_answer, option1, option2, option3)
+            VALUES (?, 1, 1, ?, 'a', 'b', 'c', 'd')
+        """, ((i, f"question {i}") for i in range(1, QUESTIONS + 1)))
+    QuizStatsManager(path)
+
+
+def worker(db_path, socket_path, answers, start_barrier):
+    stats_manager = QuizStatsManager(db_path)
+    writer = AggregatorClient(socket_path, stats_manager) if socket_path else stats_manager
+    session_id = f"bench-{os.getpid()}"
+    start_barrier.wait()
+    for _ in range(answers):
+        writer.record_quiz_answers([AnswerEvent(random.randint(1, QUESTIONS), random.random() < 0.6,
+                                                random.uniform(1, 10), session_id=session_id)])
+    if socket_path:
+        writer.flush(timeout=60)
+
+
+def run(mode, workers, answers):
+    with tempfile.TemporaryDirectory(prefix='qs-') as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        build_database(db_path)
+        context = multiprocessing.get_context('spawn')
+
+        socket_path = None
+        aggregator = None
+        if mode == 'aggregator':
+            socket_path = os.path.join(tmp, "stats.sock")
+            aggregator = context.Process(target=run_aggregator, args=(socket_path, db_path))
+            aggregator.start()
+            while not os.path.exists(socket_path):
+                time.sleep(0.01)
+
+        barrier = context.Barrier(workers + 1)
+        processes = [context.Process(target=worker, args=(db_path, socket_path, answers, barrier))
+                     for _ in range(workers)]
+        for process in processes:
+            process.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - start
+
+        if aggregator is not None:
+            aggregator.terminate()
+            aggregator.join()
+        with sqlite3.connect(db_path) as conn:
+            committed = conn.execute("SELECT COUNT(*) FROM quiz_sessions").fetchone()[0]
+    return committed, committed / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--answers', type=int, default=1000, help="Answers recorded per worker")
+    args = parser.parse_args()
+
+    print(f"Committed answers per second ({args.answers} answers per worker)")
+    print(f"{'workers':>7} | {'direct writes':>13} | {'aggregator':>10}")
+    for workers in args.workers:
+        direct_committed, direct_rate = run('direct', workers, args.answers)
+        aggregator_committed, aggregator_rate = run('aggregator', workers, args.answers)
+        assert direct_committed == aggregator_committed == workers * args.answers
+        print(f"{workers:>7} | {direct_rate:>13,.0f} | {aggregator_rate:>10,.0f}")
+
+
+if __name__ == '__main__':
+    main()
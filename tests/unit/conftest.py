@@ -0,0 +1,123 @@
+"""
+Shared fixtures for unit tests that need a real SQLite quiz database.
+"""
+import os
+import sqlite3
+import tempfile
+import threading
+import pytest
+
+# Module-level instances (quiz_stats, quiz_db, ...) must never open the committed database;
+# set before any utils module is imported
+os.environ.setdefault('QUIZ_DB_PATH', os.path.join(tempfile.mkdtemp(prefix='quiz-tests-'), 'quiz_database.db'))
+
+CONTENT_SCHEMA = """
+    CREATE TABLE categories (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT UNIQUE NOT NULL,
+        display_name TEXT NOT NULL,
+        description TEXT,
+        icon TEXT,
+        color TEXT,
+        is_active BOOLEAN DEFAULT 1,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE subcategories (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        category_id INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        display_name TEXT NOT NULL,
+        description TEXT,
+        is_active BOOLEAN DEFAULT 1,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (category_id) REFERENCES categories (id) ON DELETE CASCADE,
+        UNIQUE(category_id, name)
+    );
+    CREATE TABLE questions_normalized (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        category_id INTEGER NOT NULL,
+        subcategory_id INTEGER,
+        question TEXT NOT NULL,
+        correct_answer TEXT NOT NULL,
+        option1 TEXT NOT NULL,
+        option2 TEXT NOT NULL,
+        option3 TEXT NOT NULL,
+        fun_fact TEXT,
+        image TEXT,
+        difficulty TEXT DEFAULT 'medium',
+        points INTEGER DEFAULT 1,
+        time_limit INTEGER DEFAULT 30,
+        is_active BOOLEAN DEFAULT 1,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (category_id) REFERENCES categories (id) ON DELETE CASCADE,
+        FOREIGN KEY (subcategory_id) REFERENCES subcategories (id) ON DELETE SET NULL,
+        UNIQUE(question, category_id, subcategory_id)
+    );
+    CREATE INDEX idx_questions_category ON questions_normalized(category_id);
+    CREATE INDEX idx_questions_subcategory ON questions_normalized(subcategory_id);
+"""
+
+# (category, subcategory) -> number of questions seeded
+SEED_SUBCATEGORIES = {
+    ('geography', 'capital'): 30,
+    ('geography', 'flag'): 10,
+    ('science', 'biology'): 20,
+}
+
+
+def add_question(db_path, category, subcategory, question, **fields):
+    """Insert a question into an existing test database and return its id."""
+    with sqlite3.connect(db_path) as conn:
+        category_id = conn.execute("SELECT id FROM categories WHERE name = ?", (category,)).fetchone()[0]
+        subcategory_id = conn.execute(
+            "SELECT id FROM subcategories WHERE category_id = ? AND name = ?", (category_id, subcategory)
+        ).fetchone()[0]
+        cursor = conn.execute("""
+            INSERT INTO questions_normalized
+            (category_id, subcategory_id, question, correct_answer, option1, option2, option3,
+             fun_fact, image, difficulty, points)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (category_id, subcategory_id, question,
+              fields.get('correct_answer', 'right'), 'wrong1', 'wrong2', 'wrong3',
+              fields.get('fun_fact', ''), fields.get('image', ''),
+              fields.get('difficulty', 'medium'), fields.get('points', 1)))
+        return cursor.lastrowid
+
+
+@pytest.fixture
+def content_db_path(tmp_path):
+    """Create a quiz database with categories, subcategories and seeded questions."""
+    from utils.db_connections import connection_manager
+    db_path = str(tmp_path / "quiz_database.db")
+    with sqlite3.connect(db_path) as conn:
+        conn.executescript(CONTENT_SCHEMA)
+        for category, subcategory in SEED_SUBCATEGORIES:
+            conn.execute(
+                "INSERT OR IGNORE INTO categories (name, display_name) VALUES (?, ?)",
+                (category, category.title())
+            )
+            category_id = conn.execute("SELECT id FROM categories WHERE name = ?", (category,)).fetchone()[0]
+            conn.execute(
+                "INSERT INTO subcategories (category_id, name, display_name) VALUES (?, ?, ?)",
+                (category_id, subcategory, subcategory.title())
+            )
+    for (category, subcategory), count in SEED_SUBCATEGORIES.items():
+        for i in range(count):
+            add_question(db_path, category, subcategory, f"{subcategory} question {i}")
+    yield db_path
+    # Background content checks and usage refreshes query through the pool; let them finish
+    # before their connections are closed under them
+    for thread in threading.enumerate():
+        if thread.name.endswith('-refresh'):
+            thread.join(5)
+    # Drop pooled connections to the temporary database
+    connection_manager.close_all()
+
+
+@pytest.fixture
+def stats_db_path(content_db_path):
+    """Quiz database with the statistics tables initialized."""
+    from utils.quiz_stats import QuizStatsManager
+    QuizStatsManager(content_db_path).init_stats_tables()
+    return content_db_path
@@ -0,0 +1,132 @@
+"""
+Unit tests for the shared analytics snapshot cache.
+"""
+import threading
+import time
+import pytest
+from utils.analytics_cache import AnalyticsSnapshotCache, AnalyticsSnapshotStore
+from utils.quiz_stats import QuizStatsManager
+
+
+class TestSnapshotCache:
+    """Test TTL expiry, single-flight and invalidation."""
+
+    def test_serves_snapshot_until_ttl(self):
+        cache = AnalyticsSnapshotCache(ttl=0.2)
+        calls = []
+        compute = lambda: calls.append(1) or len(calls)
+
+        assert cache.get(('2024-03-01', '2024-03-31'), compute) == 1
+        assert cache.get(('2024-03-01', '2024-03-31'), compute) == 1
+        assert cache.get(('2024-02-01', '2024-02-29'), compute) == 2
+        time.sleep(0.25)
+        assert cache.get(('2024-03-01', '2024-03-31'), compute) == 3
+
+        stats = cache.get_stats()
+        assert (stats['hits'], stats['misses']) == (1, 3)
+        assert stats['hit_rate'] == 0.25
+        assert stats['oldest_age_seconds'] >= 0.25
+
+    def test_concurrent_refreshes_share_one_computation(self):
+        cache = AnalyticsSnapshotCache()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return {'summary': 'shared'}
+
+        results = []
+        owner = threading.Thread(target=lambda: results.append(cache.get('key', compute)))
+        owner.start()
+        started.wait(5)
+        waiters = [threading.Thread(target=lambda: results.append(cache.get('key', compute))) for _ in range(3)]
+        for waiter in waiters:
+            waiter.start()
+        while cache.get_stats()['shared'] < 3:
+            time.sleep(0.01)
+        release.set()
+        for thread in [owner] + waiters:
+            thread.join(5)
+
+        assert len(calls) == 1
+        assert results == [{'summary': 'shared'}] * 4
+        assert cache.get_stats()['shared'] == 3
+
+    def test_failures_are_shared_but_not_cached(self):
+        cache = AnalyticsSnapshotCache()
+
+        def fail():
+            raise RuntimeError("database is locked")
+
+        with pytest.raises(RuntimeError):
+            cache.get('key', fail)
+        assert cache.get('key', lambda: 'ok') == 'ok'
+
+    def test_invalidate_drops_snapshots(self):
+        cache = AnalyticsSnapshotCache()
+        cache.get('key', lambda: 'old')
+        cache.invalidate()
+        assert cache.get('key', lambda: 'new') == 'new'
+        assert cache.get_stats()['invalidations'] == 1
+
+    def test_snapshot_computed_across_invalidation_is_not_kept(self):
+        cache = AnalyticsSnapshotCache()
+
+        def compute():
+            cache.invalidate()
+            return 'stale'
+
+        assert cache.get('key', compute) == 'stale'
+        assert cache.get('key', lambda: 'fresh') == 'fresh'
+
+    def test_evicts_oldest_snapshot(self):
+        cache = AnalyticsSnapshotCache(max_entries=2)
+        for key in ('a', 'b', 'c'):
+            cache.get(key, lambda: key)
+        assert cache.get_stats()['entries'] == 2
+        assert cache.get_stats()['evicted'] == 1
+        assert cache.get('a', lambda: 'recomputed') == 'recomputed'
+
+    def test_stats_version_in_key_picks_up_writes(self, stats_db_path):
+        stats_manager = QuizStatsManager(stats_db_path)
+        writer = QuizStatsManager(stats_db_path)
+        cache = AnalyticsSnapshotCache()
+
+        cache.get(('range', stats_manager.get_stats_version()), lambda: 'before')
+        # Another manager stands in for another process: no listener of this one runs
+        session_id = writer.start_quiz_session()
+        writer.record_quiz_answer(1, True, 1.0, session_id=session_id)
+        assert cache.get(('range', stats_manager.get_stats_version()), lambda: 'after') == 'after'
+        assert cache.get_stats()['invalidations'] == 0
+
+
+class TestSnapshotStore:
+    """Test token-addressed snapshot publication."""
+
+    def test_snapshots_are_read_back_by_token(self):
+        store = AnalyticsSnapshotStore()
+        first = store.put({'leaderboard': [1]})
+        second = store.put({'leaderboard': [2]})
+
+        assert first != second
+        assert store.get(first) == {'leaderboard': [1]}
+        assert store.get(second) == {'leaderboard': [2]}
+        assert store.get('unknown') is None
+        assert store.get(None) is None
+        assert store.get_stats()['hits'] == 2
+
+    def test_snapshots_expire(self):
+        store = AnalyticsSnapshotStore(retention=0.1)
+        token = store.put({'summary': 'old'})
+        time.sleep(0.15)
+        assert store.get(token) is None
+        assert store.get_stats()['entries'] == 0
+
+    def test_oldest_snapshot_is_dropped_when_full(self):
+        store = AnalyticsSnapshotStore(max_entries=2)
+        tokens = [store.put(index) for index in range(3)]
+        assert [store.get(token) for token in tokens] == [None, 1, 2]
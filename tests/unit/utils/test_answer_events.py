@@ -0,0 +1,101 @@
+"""
+Unit tests for the append-only answer log and its compaction.
+"""
+import sqlite3
+import pytest
+from utils.quiz_stats import QuizStatsManager
+
+ANSWERS = [(1, True, 2.0), (1, False, 4.0), (2, True, 1.0), (31, True, 3.0), (45, False, 5.0)]
+
+
+@pytest.fixture
+def append_manager(stats_db_path):
+    return QuizStatsManager(stats_db_path, append_only=True)
+
+
+def _count(db_path, table):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def _aggregates(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return {
+            'daily': sorted(conn.execute("SELECT question_id, date, times_asked, times_correct, total_response_time FROM daily_question_stats").fetchall()),
+            'category': sorted(conn.execute("SELECT category_id, subcategory_id, date, questions_asked, questions_correct FROM daily_category_stats").fetchall()),
+            'usage': sorted(conn.execute("SELECT question_id, times_asked FROM question_usage_totals").fetchall()),
+            'sessions': sorted(conn.execute("SELECT session_id, question_id, is_correct, response_time FROM quiz_sessions").fetchall())
+        }
+
+
+def _record_all(manager, session_id=None, user_id=None):
+    for question_id, is_correct, response_time in ANSWERS:
+        manager.record_quiz_answer(question_id, is_correct, response_time, session_id=session_id, user_id=user_id)
+
+
+class TestAppendOnlyMode:
+    """Test that answers only touch the log until compacted."""
+
+    def test_answers_are_only_appended(self, append_manager, stats_db_path):
+        _record_all(append_manager, session_id='s1')
+        assert _count(stats_db_path, 'answer_events') == len(ANSWERS)
+        assert _count(stats_db_path, 'daily_question_stats') == 0
+        assert _count(stats_db_path, 'quiz_sessions') == 0
+
+    def test_compaction_matches_direct_writes(self, append_manager, stats_db_path, tmp_path):
+        direct_path = str(tmp_path / "direct.db")
+        with sqlite3.connect(stats_db_path) as source, sqlite3.connect(direct_path) as target:
+            source.backup(target)
+        _record_all(QuizStatsManager(direct_path), session_id='s1')
+
+        _record_all(append_manager, session_id='s1')
+        assert append_manager.compact_answer_events(batch_size=2) == len(ANSWERS)
+
+        assert _count(stats_db_path, 'answer_events') == 0
+        assert _aggregates(stats_db_path) == _aggregates(direct_path)
+        assert append_manager.compact_answer_events() == 0
+
+
+class TestReadsMergeTail:
+    """Test that reads include answers that are not compacted yet."""
+
+    def test_daily_stats_include_tail(self, append_manager, stats_db_path):
+        _record_all(append_manager)
+        append_manager.compact_answer_events()
+        _record_all(append_manager)
+
+        daily_stats = append_manager.get_daily_stats()
+        summary = daily_stats['summary']
+        assert summary['total_questions_asked'] == 2 * len(ANSWERS)
+        assert summary['total_correct_answers'] == 6
+        question_1 = next(stat for stat in daily_stats['question_stats'] if stat['question_id'] == 1)
+        assert question_1['times_asked'] == 4
+        assert question_1['accuracy_rate'] == 50.0
+        assert sum(stat['questions_asked'] for stat in daily_stats['category_stats']) == 2 * len(ANSWERS)
+
+        append_manager.compact_answer_events()
+        assert append_manager.get_daily_stats()['summary'] == summary
+
+    def test_seen_questions_include_tail(self, append_manager):
+        _record_all(append_manager, user_id='alice')
+        assert set(append_manager.get_seen_questions('alice')) == {1, 2, 31, 45}
+
+    def test_end_session_compacts(self, append_manager):
+        session_id = append_manager.start_quiz_session()
+        _record_all(append_manager, session_id=session_id)
+
+        result = append_manager.end_quiz_session(session_id)
+        assert result['total_questions'] == len(ANSWERS)
+        assert result['correct_answers'] == 3
+        assert append_manager.check_session_consistency(repair=False) == []
+
+
+class TestBackgroundCompaction:
+    """Test the compaction thread."""
+
+    def test_stop_compacts_remaining_events(self, append_manager, stats_db_path):
+        append_manager.start_compaction(interval=3600)
+        _record_all(append_manager)
+        append_manager.stop_compaction()
+        assert _count(stats_db_path, 'answer_events') == 0
+        assert _count(stats_db_path, 'daily_question_stats') == 4
@@ -0,0 +1,190 @@
+"""
+Unit tests for batched answer writes and the write-behind answer recorder.
+"""
+import sqlite3
+from unittest.mock import MagicMock
+import pytest
+from utils.answer_recorder import BufferedAnswerRecorder
+from utils.quiz_stats import AnswerEvent, QuizStatsManager
+
+
+@pytest.fixture
+def stats_manager(stats_db_path):
+    return QuizStatsManager(stats_db_path)
+
+
+def _table(db_path, query):
+    with sqlite3.connect(db_path) as conn:
+        return sorted(conn.execute(query).fetchall())
+
+
+def _snapshot(db_path):
+    return {
+        'daily': _table(db_path, "SELECT question_id, date, times_asked, times_correct, total_response_time FROM daily_question_stats"),
+        'usage': _table(db_path, "SELECT question_id, times_asked FROM question_usage_totals"),
+        'category': _table(db_path, "SELECT category_id, subcategory_id, date, questions_asked, questions_correct FROM daily_category_stats"),
+        'answers': _table(db_path, "SELECT session_id, question_id, user_answer, is_correct, response_time FROM quiz_sessions")
+    }
+
+
+ANSWERS = [
+    AnswerEvent(1, True, 1.5, session_id='s1', user_answer='a'),
+    AnswerEvent(1, False, 2.5, session_id='s1', user_answer='b'),
+    AnswerEvent(2, True, 1.0, session_id='s2', user_answer='c'),
+    AnswerEvent(31, True, 3.0, session_id='s2', user_answer='d'),
+]
+
+
+class TestBatchedWrites:
+    """Test that one batch writes the same statistics as answer-by-answer writes."""
+
+    def test_batch_matches_individual_writes(self, stats_db_path, tmp_path):
+        batch_manager = QuizStatsManager(stats_db_path)
+        batch_manager.record_quiz_answers(ANSWERS)
+
+        single_path = tmp_path / "single.db"
+        with sqlite3.connect(stats_db_path) as source, sqlite3.connect(single_path) as target:
+            source.backup(target)
+        with sqlite3.connect(single_path) as conn:
+            for table in ('daily_question_stats', 'question_usage_totals', 'daily_category_stats', 'quiz_sessions'):
+                conn.execute(f"DELETE FROM {table}")
+        single_manager = QuizStatsManager(str(single_path))
+        for answer in ANSWERS:
+            single_manager.record_quiz_answer(answer.question_id, answer.is_correct, answer.response_time,
+                                              answer.session_id, answer.user_answer)
+
+        assert _snapshot(stats_db_path) == _snapshot(str(single_path))
+        assert _table(stats_db_path, "SELECT question_id, accuracy_rate, avg_response_time FROM daily_question_stats") == \
+            [(1, 50.0, 2.0), (2, 100.0, 1.0), (31, 100.0, 3.0)]
+
+    def test_batch_marks_questions_seen(self, stats_manager):
+        stats_manager.record_quiz_answers([
+            AnswerEvent(1, True, 1.0, user_id='alice'),
+            AnswerEvent(2, True, 1.0, user_id='alice'),
+            AnswerEvent(3, True, 1.0, user_id='bob'),
+        ])
+        assert set(stats_manager.get_seen_questions('alice')) == {1, 2}
+        assert set(stats_manager.get_seen_questions('bob')) == {3}
+
+
+class TestBufferedAnswerRecorder:
+    """Test the write-behind queue and writer thread."""
+
+    def test_disabled_writes_synchronously(self, stats_manager, stats_db_path):
+        recorder = BufferedAnswerRecorder(stats_manager, enabled=False)
+        recorder.record('s1', 1, True, 1.0)
+        assert len(_snapshot(stats_db_path)['answers']) == 1
+        assert recorder.get_stats()['enqueued'] == 0
+
+    def test_flush_writes_queued_answers(self, stats_manager, stats_db_path):
+        recorder = BufferedAnswerRecorder(stats_manager, flush_interval=60)
+        session_id = stats_manager.start_quiz_session()
+        for question_id in range(1, 6):
+            recorder.record(session_id, question_id, question_id % 2 == 0, 1.0)
+
+        assert recorder.flush()
+        stats = recorder.get_stats()
+        assert stats['written'] == 5
+        assert stats['queue_depth'] == 0
+        assert stats['batches'] == 1
+        assert stats_manager.get_session_stats(session_id)['session_info']['total_questions'] == 5
+        recorder.shutdown()
+
+    def test_batches_are_bounded_by_size(self, stats_manager, stats_db_path):
+        recorder = BufferedAnswerRecorder(stats_manager, max_batch=2, flush_interval=60)
+        for question_id in range(1, 6):
+            recorder.record('s1', question_id, True, 1.0)
+
+        assert recorder.flush()
+        assert recorder.get_stats()['batches'] == 3
+        assert len(_snapshot(stats_db_path)['answers']) == 5
+        recorder.shutdown()
+
+    def test_shutdown_drains_queue(self, stats_manager, stats_db_path):
+        recorder = BufferedAnswerRecorder(stats_manager, flush_interval=60)
+        for question_id in range(1, 4):
+            recorder.record('s1', question_id, True, 1.0)
+
+        recorder.shutdown()
+        assert len(_snapshot(stats_db_path)['answers']) == 3
+
+        # Answers after shutdown are written synchronously
+        recorder.record('s1', 4, True, 1.0)
+        assert len(_snapshot(stats_db_path)['answers']) == 4
+
+    def test_failed_batches_are_counted(self):
+        stats_manager = MagicMock()
+        stats_manager.record_quiz_answers.side_effect = sqlite3.OperationalError("database is locked")
+        recorder = BufferedAnswerRecorder(stats_manager, flush_interval=60, max_attempts=2, retry_base_delay=0)
+        recorder.record('s1', 1, True, 1.0)
+
+        assert not recorder.flush()
+        stats = recorder.get_stats()
+        assert stats['failed'] == 1
+        assert stats['written'] == 0
+        assert stats_manager.record_quiz_answers.call_count == 2
+        recorder.shutdown()
+
+    def test_failed_batch_is_retried(self, stats_manager, stats_db_path):
+        failures = [sqlite3.OperationalError("database is locked")]
+
+        def record_quiz_answers(answers):
+            if failures:
+                raise failures.pop()
+            return stats_manager.record_quiz_answers(answers)
+
+        writer = MagicMock()
+        writer.record_quiz_answers.side_effect = record_quiz_answers
+        recorder = BufferedAnswerRecorder(writer, flush_interval=60, retry_base_delay=0.05)
+        recorder.record('s1', 1, True, 1.0)
+        recorder.record('s1', 2, True, 1.0)
+
+        assert recorder.flush()
+        stats = recorder.get_stats()
+        assert stats['written'] == 2
+        assert stats['failed'] == 0
+        assert stats['retries'] == 1
+        assert len(_snapshot(stats_db_path)['answers']) == 2
+        recorder.shutdown()
+
+
+class TestEndSession:
+    """Test that sessions are always ended, and finalized again once late answers are in."""
+
+    def test_session_is_ended_after_its_answers(self, stats_manager):
+        recorder = BufferedAnswerRecorder(stats_manager, flush_interval=60)
+        session_id = stats_manager.start_quiz_session()
+        for question_id in range(1, 4):
+            recorder.record(session_id, question_id, True, 1.0)
+
+        result = recorder.end_session(session_id)
+        assert result['status'] == 'completed'
+        assert result['total_questions'] == 3
+        recorder.shutdown()
+
+    def test_failed_flush_still_ends_session(self, stats_manager):
+        failures = [sqlite3.OperationalError("database is locked")]
+
+        def record_quiz_answers(answers):
+            if failures:
+                raise failures.pop()
+            return stats_manager.record_quiz_answers(answers)
+
+        writer = MagicMock()
+        writer.record_quiz_answers.side_effect = record_quiz_answers
+        writer.end_quiz_session.side_effect = stats_manager.end_quiz_session
+        recorder = BufferedAnswerRecorder(writer, flush_interval=60, max_attempts=10, retry_base_delay=60)
+        session_id = stats_manager.start_quiz_session()
+        recorder.record(session_id, 1, True, 1.0)
+
+        # The retry is a minute away, so the flush times out and the session is ended without its answer
+        result = recorder.end_session(session_id, timeout=0.2)
+        assert result['status'] == 'completed'
+        assert result['total_questions'] == 0
+        assert recorder.get_stats()['unsettled_sessions'] == 1
+
+        # The next flush retries at once and writes the answer, then finalizes the session again
+        assert recorder.flush()
+        assert recorder.get_stats()['unsettled_sessions'] == 0
+        assert stats_manager.get_session_stats(session_id)['session_info']['total_questions'] == 1
+        recorder.shutdown()
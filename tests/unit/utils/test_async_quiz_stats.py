@@ -0,0 +1,83 @@
+"""
+Unit tests for the asynchronous statistics facade.
+"""
+import threading
+from unittest.mock import MagicMock
+import pytest
+from utils.async_quiz_stats import AsyncQuizStatsManager
+from utils.quiz_stats import QuizStatsManager
+
+
+@pytest.fixture
+def async_stats(stats_db_path):
+    manager = AsyncQuizStatsManager(QuizStatsManager(stats_db_path), max_readers=2)
+    yield manager
+    manager.shutdown()
+
+
+class TestSessionStart:
+    """Test the synchronous session start."""
+
+    def test_session_exists_before_answers_from_other_writers(self, async_stats):
+        session_id = async_stats.start_quiz_session(session_name='Flags', user_id='bob')
+        recorder = QuizStatsManager(async_stats.stats_manager.db_path)
+        recorder.record_quiz_answer(31, True, 1.5, session_id=session_id)
+
+        # The running counters are only updated when the session row already exists
+        session_info = recorder.get_session_stats(session_id)['session_info']
+        assert session_info['session_name'] == 'Flags'
+        assert session_info['total_questions'] == 1
+
+
+class TestReads:
+    """Test reads on the reader pool."""
+
+    def test_reads_run_concurrently(self):
+        barrier = threading.Barrier(2, timeout=5)
+        stats_manager = MagicMock()
+        stats_manager.get_recent_sessions.side_effect = lambda **kwargs: barrier.wait() is not None
+        stats_manager.get_trending_questions.side_effect = lambda **kwargs: barrier.wait() is not None
+        async_stats = AsyncQuizStatsManager(stats_manager, max_readers=2)
+
+        # Each read waits for the other, so they only finish if both run at once
+        sessions = async_stats.get_recent_sessions(limit=5)
+        trending = async_stats.get_trending_questions(limit=5)
+        assert sessions.result(timeout=5) and trending.result(timeout=5)
+        async_stats.shutdown()
+
+    def test_reads_see_committed_writes(self, async_stats):
+        async_stats.stats_manager.record_quiz_answer(1, True, 2.0, session_id='s1')
+        daily_stats = async_stats.get_daily_stats().result(timeout=5)
+        assert daily_stats['summary']['total_questions_asked'] == 1
+
+    def test_failed_read_is_counted(self):
+        stats_manager = MagicMock()
+        stats_manager.get_daily_stats.side_effect = RuntimeError("no such table")
+        async_stats = AsyncQuizStatsManager(stats_manager)
+
+        future = async_stats.get_daily_stats()
+        with pytest.raises(RuntimeError):
+            future.result(timeout=5)
+        async_stats.shutdown()
+        assert async_stats.get_stats()['failed'] == 1
+
+    def test_full_pool_reads_synchronously(self):
+        release = threading.Event()
+        stats_manager = MagicMock()
+        stats_manager.get_recent_sessions.side_effect = lambda **kwargs: release.wait(5)
+        stats_manager.get_daily_stats.return_value = {'summary': {}}
+        async_stats = AsyncQuizStatsManager(stats_manager, max_readers=1, max_pending_reads=1)
+
+        blocked = async_stats.get_recent_sessions(limit=5)
+        overflow = async_stats.get_daily_stats()
+        assert overflow.done() and overflow.result() == {'summary': {}}
+        assert async_stats.get_stats()['overflow'] == 1
+        release.set()
+        assert blocked.result(timeout=5)
+        assert async_stats.get_stats()['pending_reads'] == 0
+        async_stats.shutdown()
+
+    def test_reads_after_shutdown_run_synchronously(self, stats_db_path):
+        async_stats = AsyncQuizStatsManager(QuizStatsManager(stats_db_path))
+        async_stats.shutdown()
+        assert async_stats.get_daily_stats().result()['summary']['total_questions_asked'] == 0
@@ -0,0 +1,76 @@
+"""
+Unit tests for the pooled SQLite connection layer.
+"""
+import sqlite3
+import threading
+import pytest
+from utils.database_utils import QuizDatabase
+from utils.db_connections import ConnectionManager
+
+
+@pytest.fixture
+def manager():
+    connection_manager = ConnectionManager(busy_timeout_ms=1234, cache_size_kib=4096, cached_statements=64)
+    yield connection_manager
+    connection_manager.close_all()
+
+
+def _connection_in_thread(manager, db_path, readonly=False):
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(conn=manager.get_connection(db_path, readonly)))
+    thread.start()
+    thread.join()
+    return result['conn']
+
+
+class TestConnectionPooling:
+    """Test per-thread reuse of connections."""
+
+    def test_same_thread_reuses_connection(self, manager, content_db_path):
+        assert manager.get_connection(content_db_path) is manager.get_connection(content_db_path)
+        assert manager.get_connection(content_db_path, readonly=True) is not manager.get_connection(content_db_path)
+        stats = manager.get_stats()
+        assert stats['opened'] == 2
+        assert stats['reused'] == 2
+        assert stats['readonly_connections'] == 1
+
+    def test_threads_get_their_own_connection(self, manager, content_db_path):
+        main_conn = manager.get_connection(content_db_path)
+        assert _connection_in_thread(manager, content_db_path) is not main_conn
+
+    def test_dead_thread_connections_are_closed(self, manager, content_db_path):
+        thread_conn = _connection_in_thread(manager, content_db_path)
+        manager.get_connection(content_db_path)
+        stats = manager.get_stats()
+        assert stats['open_connections'] == 1
+        assert stats['closed'] == 1
+        with pytest.raises(sqlite3.ProgrammingError, match="closed"):
+            thread_conn.execute("SELECT 1")
+
+    def test_close_all(self, manager, content_db_path):
+        conn = manager.get_connection(content_db_path)
+        manager.close_all()
+        assert manager.get_stats()['open_connections'] == 0
+        assert manager.get_connection(content_db_path) is not conn
+
+
+class TestConnectionSettings:
+    """Test pragmas and the read-only variant."""
+
+    def test_pragmas(self, manager, content_db_path):
+        conn = manager.get_connection(content_db_path)
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 1234
+        assert conn.execute("PRAGMA cache_size").fetchone()[0] == -4096
+
+    def test_readonly_connection_rejects_writes(self, manager, content_db_path):
+        conn = manager.get_connection(content_db_path, readonly=True)
+        assert conn.execute("SELECT COUNT(*) FROM categories").fetchone()[0] > 0
+        with pytest.raises(sqlite3.OperationalError, match="readonly"):
+            conn.execute("DELETE FROM categories")
+
+    def test_quiz_database_uses_pool(self, content_db_path):
+        quiz_db = QuizDatabase(content_db_path, readonly=True)
+        assert quiz_db.get_connection() is quiz_db.get_connection()
+        assert quiz_db.execute_query("SELECT name FROM categories WHERE name = ?", ('science',)) == [{'name': 'science'}]
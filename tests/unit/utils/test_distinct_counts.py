@@ -0,0 +1,73 @@
+"""
+Unit tests for the HyperLogLog distinct player and session counters.
+"""
+from datetime import date, datetime, timedelta, timezone
+import pytest
+from utils.distinct_counts import HyperLogLog, merge_counters
+from utils.quiz_stats import AnswerEvent, QuizStatsManager
+
+
+def _day(days_ago):
+    return (date.today() - timedelta(days=days_ago)).isoformat()
+
+
+class TestHyperLogLog:
+    """Test counter accuracy, merging and serialization."""
+
+    @pytest.mark.parametrize('distinct', [1, 7, 300, 5000, 50000])
+    def test_count_within_error(self, distinct):
+        counter = HyperLogLog()
+        counter.add_all(f"player-{index}" for index in range(distinct))
+        # Repeated values change nothing
+        assert not counter.add_all(f"player-{index}" for index in range(min(distinct, 100)))
+        assert counter.count() == pytest.approx(distinct, rel=0.05)
+
+    def test_merge_counts_overlap_once(self):
+        first, second = HyperLogLog(), HyperLogLog()
+        first.add_all(str(index) for index in range(3000))
+        second.add_all(str(index) for index in range(2000, 6000))
+        assert merge_counters([first, second]).count() == pytest.approx(6000, rel=0.05)
+        with pytest.raises(ValueError):
+            first.merge(HyperLogLog(precision=10))
+
+    def test_serialization_round_trip(self):
+        small, large = HyperLogLog(), HyperLogLog()
+        small.add_all(['alice', 'bob'])
+        large.add_all(str(index) for index in range(20000))
+        assert len(small.to_bytes()) < 16
+        assert len(large.to_bytes()) <= 4096 + 3
+        for counter in (small, large, HyperLogLog()):
+            assert HyperLogLog.from_bytes(counter.to_bytes()).registers == counter.registers
+
+
+class TestStoredCounters:
+    """Test counters maintained by QuizStatsManager."""
+
+    def test_sessions_and_players_per_quiz_type(self, stats_db_path):
+        manager = QuizStatsManager(stats_db_path)
+        for index in range(6):
+            session_id = manager.start_quiz_session('Capitals' if index < 4 else 'Flags', user_id=f"user-{index % 3}")
+            manager.record_quiz_answers([AnswerEvent(1, True, 2.0, session_id=session_id, user_id=f"user-{index % 3}")])
+
+        today = datetime.now(timezone.utc).date().isoformat()
+        assert manager.get_distinct_counts(today, today) == {'users': 3, 'sessions': 6}
+        assert manager.get_distinct_counts(today, today, quiz_type='Flags') == {'users': 2, 'sessions': 2}
+        since = datetime.now(timezone.utc) - timedelta(hours=1)
+        assert manager.get_distinct_counts_since(since, quiz_type='Capitals') == {'users': 3, 'sessions': 4}
+
+    def test_players_across_days_count_once(self, stats_db_path):
+        manager = QuizStatsManager(stats_db_path)
+        manager.record_quiz_answers([AnswerEvent(1, True, 2.0, user_id=f"user-{index % 5}", date=_day(index % 4))
+                                     for index in range(40)])
+        assert manager.get_distinct_counts(_day(3), _day(0))['users'] == 5
+        assert manager.get_distinct_counts(_day(10), _day(5)) == {'users': 0, 'sessions': 0}
+
+    def test_append_only_tail_is_included(self, stats_db_path):
+        manager = QuizStatsManager(stats_db_path, append_only=True)
+        manager.record_quiz_answers([AnswerEvent(1, True, 2.0, session_id=f"s-{index}", user_id=f"user-{index}")
+                                     for index in range(8)])
+        today = datetime.now(timezone.utc).date().isoformat()
+        before = manager.get_distinct_counts(today, today)
+
+        manager.compact_answer_events()
+        assert manager.get_distinct_counts(today, today) == before == {'users': 8, 'sessions': 8}
@@ -0,0 +1,75 @@
+"""
+Unit tests for the live analytics event stream.
+"""
+import threading
+import time
+import pytest
+from utils.live_stats import LiveStatsBroadcaster
+from utils.quiz_stats import QuizStatsManager
+
+
+@pytest.fixture
+def stats_manager(stats_db_path):
+    return QuizStatsManager(stats_db_path)
+
+
+def _broadcaster(stats_manager, **kwargs):
+    broadcaster = LiveStatsBroadcaster(stats_manager, check_interval=0.05, **kwargs)
+    stats_manager.add_write_listener(broadcaster.notify)
+    return broadcaster
+
+
+def _events(messages):
+    return [message for message in messages if 'event: stats' in message]
+
+
+class TestLiveStatsStream:
+    """Test change events, coalescing and stream limits."""
+
+    def test_sends_current_version_then_changes(self, stats_manager):
+        broadcaster = _broadcaster(stats_manager, max_updates_per_second=100)
+        stream = broadcaster.open_stream()
+        assert next(stream).startswith('retry:')
+        version = stats_manager.get_stats_version()
+        assert next(stream) == f'id: {version}\nevent: stats\ndata: {{"version": {version}}}\n\n'
+
+        threading.Timer(0.05, stats_manager.start_quiz_session).start()
+        assert f'id: {version + 1}\n' in next(stream)
+        stream.close()
+
+    def test_reconnect_skips_seen_version(self, stats_manager):
+        broadcaster = _broadcaster(stats_manager, heartbeat_interval=0.1)
+        stream = broadcaster.open_stream(last_version=str(stats_manager.get_stats_version()))
+        next(stream)
+        assert next(stream) == ': keep-alive\n\n'
+        stream.close()
+
+    def test_updates_are_coalesced(self, stats_manager):
+        broadcaster = _broadcaster(stats_manager, max_updates_per_second=4, max_stream_seconds=1.5)
+        writer = threading.Thread(target=lambda: [stats_manager.start_quiz_session() or time.sleep(0.01)
+                                                  for _ in range(30)])
+        writer.start()
+        messages = list(broadcaster.open_stream())
+        writer.join()
+
+        # Thirty writes reach the client as at most four events a second
+        assert 2 <= len(_events(messages)) <= 8
+        assert f'"version": {stats_manager.get_stats_version()}' in _events(messages)[-1]
+
+    def test_streams_are_limited(self, stats_manager):
+        broadcaster = _broadcaster(stats_manager, max_streams=1)
+        stream = broadcaster.open_stream()
+        assert broadcaster.open_stream() is None
+        # Closing frees the slot even if the stream was never read
+        stream.close()
+        assert broadcaster.open_stream() is not None
+        assert broadcaster.get_stats()['refused'] == 1
+
+        assert LiveStatsBroadcaster(stats_manager, enabled=False).open_stream() is None
+
+    def test_refused_on_single_threaded_server(self, stats_manager):
+        broadcaster = _broadcaster(stats_manager)
+        # A stream would block the only thread of a sync worker
+        assert broadcaster.open_stream(multithreaded=False) is None
+        assert broadcaster.get_stats()['refused'] == 1
+        assert broadcaster.open_stream(multithreaded=True) is not None
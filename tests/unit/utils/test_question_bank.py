@@ -0,0 +1,115 @@
+"""
+Unit tests for the in-memory question bank.
+"""
+import sqlite3
+import threading
+from unittest.mock import patch
+import pytest
+from utils.database_utils import QuizDatabase
+from utils.question_bank import QuestionBank
+from utils.quiz_generators import get_quiz_questions, generate_questions_by_category
+from tests.unit.conftest import add_question
+
+
+@pytest.fixture
+def bank(stats_db_path):
+    """Loaded question bank over the seeded test database."""
+    question_bank = QuestionBank(QuizDatabase(stats_db_path), check_interval=0)
+    assert question_bank.load()
+    return question_bank
+
+
+def _lookup_after_refresh(bank, category, subcategory):
+    """Look a group up once the background content check started by a first lookup has finished."""
+    bank.get_group(category, subcategory)
+    bank._refresh_thread.join(5)
+    return bank.get_group(category, subcategory)
+
+
+class TestQuestionBankLoading:
+    """Test loading and grouping of questions."""
+
+    def test_groups_by_category_and_subcategory(self, bank):
+        assert len(bank.get_group('geography', 'capital')) == 30
+        assert len(bank.get_group('geography', 'flag')) == 10
+        assert len(bank.get_group('science', 'biology')) == 20
+
+    def test_row_dict_matches_sql_shape(self, bank):
+        group = bank.get_group('geography', 'capital')
+        row = group.row_dict(0)
+        assert row['id'] == group.ids[0]
+        assert row['category_name'] == 'geography'
+        assert row['subcategory_name'] == 'capital'
+        assert row['correct_answer'] == 'right'
+
+    def test_unloaded_bank_misses(self, stats_db_path):
+        question_bank = QuestionBank(QuizDatabase(stats_db_path))
+        assert question_bank.get_group('geography', 'capital') is None
+        assert question_bank.get_stats()['misses'] == 1
+
+    def test_hit_and_miss_counters(self, bank):
+        bank.get_group('geography', 'capital')
+        bank.get_group('geography', 'unknown')
+        stats = bank.get_stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
+        assert stats['questions'] == 60
+
+
+class TestQuestionBankReload:
+    """Test reloading when content changes."""
+
+    def test_reloads_on_new_question(self, bank, stats_db_path):
+        add_question(stats_db_path, 'geography', 'flag', 'A brand new flag question')
+        assert len(_lookup_after_refresh(bank, 'geography', 'flag')) == 11
+        assert bank.get_stats()['reloads'] == 1
+
+    def test_reloads_on_deactivation(self, bank, stats_db_path):
+        with sqlite3.connect(stats_db_path) as conn:
+            conn.execute("UPDATE subcategories SET is_active = 0 WHERE name = 'flag'")
+        assert _lookup_after_refresh(bank, 'geography', 'flag') is None
+        assert bank.get_stats()['reloads'] == 1
+
+    def test_no_reload_without_changes(self, bank):
+        _lookup_after_refresh(bank, 'geography', 'capital')
+        assert bank.get_stats()['reloads'] == 0
+
+    def test_lookups_do_not_wait_for_the_content_check(self, bank, stats_db_path):
+        add_question(stats_db_path, 'geography', 'flag', 'A brand new flag question')
+        release = threading.Event()
+        with patch('utils.question_bank.read_content_fingerprint',
+                   side_effect=lambda db: release.wait(5) and ()):
+            # The check is stuck on the database, yet lookups return the current index at once
+            assert len(bank.get_group('geography', 'flag')) == 10
+            assert len(bank.get_group('geography', 'flag')) == 10
+            release.set()
+            bank._refresh_thread.join(5)
+        assert bank.get_stats()['hits'] == 2
+
+
+class TestServingFromBank:
+    """Test quiz generation served from the question bank."""
+
+    def test_get_quiz_questions_uses_bank(self, bank):
+        with patch('utils.quiz_generators.question_bank', bank), \
+             patch('utils.quiz_generators.quiz_db.execute_query') as mock_execute_query:
+            questions = get_quiz_questions('capital', num_questions=5)
+
+        assert len(questions) == 5
+        assert len({q['id'] for q in questions}) == 5
+        assert all(q['subcategory'] == 'capital' for q in questions)
+        mock_execute_query.assert_not_called()
+        assert bank.get_stats()['hits'] == 1
+
+    def test_generate_questions_by_category_uses_bank(self, bank):
+        with patch('utils.quiz_generators.question_bank', bank):
+            questions = generate_questions_by_category('science', 'biology', num_questions=3)
+        assert len(questions) == 3
+        assert all(q['category'] == 'science' for q in questions)
+
+    def test_exclude_ids(self, bank):
+        group = bank.get_group('geography', 'flag')
+        excluded = list(group.ids[:8])
+        with patch('utils.quiz_generators.question_bank', bank):
+            questions = get_quiz_questions('flag', num_questions=5, exclude_ids=excluded)
+        assert {q['id'] for q in questions} == set(group.ids[8:])
@@ -0,0 +1,97 @@
+"""
+Unit tests for the question metadata cache used when recording answers.
+"""
+import sqlite3
+import threading
+from unittest.mock import patch
+import pytest
+from utils.database_utils import QuizDatabase
+from utils.db_connections import connection_manager
+from utils.question_metadata import QuestionMetadataCache
+from utils.quiz_stats import QuizStatsManager
+from tests.unit.conftest import add_question
+
+
+@pytest.fixture
+def cache(content_db_path):
+    metadata_cache = QuestionMetadataCache(QuizDatabase(content_db_path), check_interval=0)
+    assert metadata_cache.load()
+    return metadata_cache
+
+
+def _category_ids(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return dict(conn.execute("SELECT name, id FROM categories").fetchall())
+
+
+class TestQuestionMetadataCache:
+    """Test loading, lookups and invalidation."""
+
+    def test_includes_inactive_questions(self, cache, content_db_path):
+        with sqlite3.connect(content_db_path) as conn:
+            conn.execute("UPDATE questions_normalized SET is_active = 0 WHERE id = 1")
+        cache.load()
+        assert cache.get(1).category_id == _category_ids(content_db_path)['geography']
+        assert cache.get_stats()['questions'] == 60
+
+    def test_unknown_question(self, cache):
+        assert cache.get(9999) is None
+        assert cache.get_stats()['misses'] == 1
+
+    def test_reloads_when_question_moves(self, cache, content_db_path):
+        science_id = _category_ids(content_db_path)['science']
+        with sqlite3.connect(content_db_path) as conn:
+            conn.execute("""
+                UPDATE questions_normalized SET category_id = ?, updated_at = '2999-01-01' WHERE id = 1
+            """, (science_id,))
+        # The lookup that notices the interval starts the check; later ones see the reload
+        cache.get(1)
+        cache._refresh_thread.join(5)
+        assert cache.get(1).category_id == science_id
+        assert cache.get_stats()['reloads'] == 1
+
+    def test_answer_path_does_not_wait_for_the_content_check(self, cache, content_db_path):
+        geography_id = _category_ids(content_db_path)['geography']
+        release = threading.Event()
+        with patch('utils.question_metadata.read_content_fingerprint',
+                   side_effect=lambda db: release.wait(5) and ()):
+            # The check is stuck on the database, yet lookups are served from the previous mapping
+            assert cache.get(1).category_id == geography_id
+            assert cache.get(2).category_id == geography_id
+            release.set()
+            cache._refresh_thread.join(5)
+        assert cache.get_stats()['hits'] == 2
+
+    def test_new_question_found_without_reload(self, content_db_path):
+        metadata_cache = QuestionMetadataCache(QuizDatabase(content_db_path), check_interval=3600)
+        metadata_cache.load()
+        question_id = add_question(content_db_path, 'science', 'biology', 'A new biology question')
+        assert metadata_cache.get(question_id) is not None
+        assert metadata_cache.get_stats()['reloads'] == 0
+
+    def test_many_missing_questions_are_looked_up_in_chunks(self, cache):
+        # Old SQLite builds accept at most 999 placeholders per statement
+        cache.db.get_connection().setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+        found = cache.get_many([1, 2] + list(range(10000, 12500)))
+        assert set(found) == {1, 2}
+        assert cache.get_stats()['misses'] == 2500
+
+
+class TestAnswerPath:
+    """Test that recording answers uses the cache instead of querying questions."""
+
+    def test_no_question_lookup_per_answer(self, stats_db_path):
+        stats_manager = QuizStatsManager(stats_db_path)
+        stats_manager.question_metadata.load()
+        statements = []
+        connection_manager.get_connection(stats_db_path).set_trace_callback(statements.append)
+        try:
+            stats_manager.record_quiz_answer(1, True, 1.0)
+            stats_manager.record_quiz_answer(31, False, 2.0)
+        finally:
+            connection_manager.get_connection(stats_db_path).set_trace_callback(None)
+
+        assert statements
+        assert not any('FROM questions_normalized' in statement for statement in statements)
+        with sqlite3.connect(stats_db_path) as conn:
+            assert conn.execute("SELECT SUM(questions_asked) FROM daily_category_stats").fetchone()[0] == 2
@@ -0,0 +1,180 @@
+"""
+Unit and statistical tests for the bucketed least-asked sampler.
+"""
+import random
+import threading
+import time
+from collections import Counter
+from unittest.mock import patch
+import pytest
+from utils import quiz_generators
+from utils.database_utils import QuizDatabase
+from utils.question_bank import QuestionBank
+from utils.question_sampler import BucketedSampler
+from utils.quiz_generators import _fetch_questions_from_db, _get_bank_sampler
+from utils.quiz_stats import QuizStatsManager
+
+# Chi-square critical values at p = 0.001 by degrees of freedom
+CHI_SQUARE_CRITICAL_P001 = {9: 27.877, 19: 43.820}
+
+
+def _chi_square(counts, expected):
+    return sum((observed - expected) ** 2 / expected for observed in counts)
+
+
+class TestBucketMaintenance:
+    """Test bucket bookkeeping."""
+
+    def test_buckets_follow_usage_counts(self):
+        sampler = BucketedSampler([(1, 0), (2, 0), (3, 2), (4, 5)])
+        assert sampler.bucket_sizes() == {0: 2, 2: 1, 5: 1}
+
+        sampler.increment(1)
+        sampler.increment(3, by=3)
+        assert sampler.bucket_sizes() == {0: 1, 1: 1, 5: 2}
+        assert sampler.usage(3) == 5
+
+    def test_remove_swaps_last_entry(self):
+        sampler = BucketedSampler([(1, 0), (2, 0), (3, 0)])
+        sampler.remove(1)
+        assert len(sampler) == 2
+        assert 1 not in sampler
+        sampler.remove(3)
+        sampler.remove(2)
+        assert sampler.bucket_sizes() == {}
+        assert sampler.sample(5) == []
+
+
+class TestLeastAskedPolicy:
+    """Test the least-asked-first ordering guarantee."""
+
+    def test_lower_buckets_are_exhausted_first(self):
+        usage = [(i, i % 3) for i in range(30)]
+        sampler = BucketedSampler(usage)
+        for _ in range(50):
+            drawn = sampler.sample(15)
+            levels = [times_asked for _, times_asked in drawn]
+            assert levels == sorted(levels)
+            assert levels.count(0) == 10
+            assert levels.count(1) == 5
+
+    def test_sample_more_than_available(self):
+        sampler = BucketedSampler([(1, 0), (2, 1)])
+        assert sorted(question_id for question_id, _ in sampler.sample(10)) == [1, 2]
+
+    def test_exclude_is_respected(self):
+        sampler = BucketedSampler((i, 0) for i in range(100))
+        excluded = set(range(95))
+        for _ in range(20):
+            drawn = {question_id for question_id, _ in sampler.sample(5, exclude=excluded)}
+            assert drawn == set(range(95, 100))
+
+
+class TestUniformityWithinBucket:
+    """Statistical tests that draws are uniform inside a bucket."""
+
+    TRIALS = 20000
+
+    def test_uniform_within_partially_drawn_bucket(self):
+        # 10 questions tie at the lowest count and only 3 are drawn each time
+        sampler = BucketedSampler([(i, 0) for i in range(10)] + [(100 + i, 4) for i in range(10)])
+        rng = random.Random(1234)
+        counts = Counter()
+        for _ in range(self.TRIALS):
+            counts.update(question_id for question_id, _ in sampler.sample(3, rng=rng))
+
+        assert set(counts) == set(range(10))
+        expected = self.TRIALS * 3 / 10
+        statistic = _chi_square([counts[i] for i in range(10)], expected)
+        assert statistic < CHI_SQUARE_CRITICAL_P001[9]
+
+    def test_uniform_in_next_bucket_after_exhausting_lower(self):
+        # 2 questions at count 0 are always taken, the remaining 3 come uniformly from 20 at count 1
+        sampler = BucketedSampler([(0, 0), (1, 0)] + [(10 + i, 1) for i in range(20)])
+        rng = random.Random(99)
+        counts = Counter()
+        for _ in range(self.TRIALS):
+            drawn = sampler.sample(5, rng=rng)
+            assert {question_id for question_id, level in drawn if level == 0} == {0, 1}
+            counts.update(question_id for question_id, level in drawn if level == 1)
+
+        expected = self.TRIALS * 3 / 20
+        statistic = _chi_square([counts[10 + i] for i in range(20)], expected)
+        assert statistic < CHI_SQUARE_CRITICAL_P001[19]
+
+    def test_uniform_with_exclusions(self):
+        sampler = BucketedSampler((i, 0) for i in range(40))
+        excluded = set(range(0, 40, 4)) | set(range(1, 40, 4)) | set(range(2, 40, 4))
+        allowed = sorted(set(range(40)) - excluded)
+        rng = random.Random(7)
+        counts = Counter()
+        for _ in range(self.TRIALS):
+            counts.update(question_id for question_id, _ in sampler.sample(2, exclude=excluded, rng=rng))
+
+        assert set(counts) == set(allowed)
+        expected = self.TRIALS * 2 / len(allowed)
+        statistic = _chi_square([counts[i] for i in allowed], expected)
+        assert statistic < CHI_SQUARE_CRITICAL_P001[9]
+
+
+class TestSQLiteSampling:
+    """Test the sampler on top of SQLite."""
+
+    def test_db_fetch_prefers_least_asked(self, stats_db_path):
+        stats_manager = QuizStatsManager(stats_db_path)
+        # Questions 1-25 of geography/capital have been asked, 26-30 have not
+        for question_id in range(1, 26):
+            stats_manager.record_quiz_answer(question_id, True, 1.0)
+
+        with patch('utils.quiz_generators.quiz_db', QuizDatabase(stats_db_path)):
+            question_rows = _fetch_questions_from_db('geography', 'capital', 8)
+
+        assert len(question_rows) == 8
+        assert {row['id'] for row in question_rows[:5]} == set(range(26, 31))
+        assert [row['total_times_asked'] for row in question_rows] == [0] * 5 + [1] * 3
+
+    def test_db_fetch_prefers_unseen_then_least_asked(self, stats_db_path):
+        stats_manager = QuizStatsManager(stats_db_path)
+        for question_id in range(1, 21):
+            stats_manager.record_quiz_answer(question_id, True, 1.0)
+
+        with patch('utils.quiz_generators.quiz_db', QuizDatabase(stats_db_path)):
+            question_rows = _fetch_questions_from_db('geography', 'capital', 8, exclude_ids=[21],
+                                                     seen=set(range(22, 31)))
+
+        # 22-30 are seen and 21 is excluded, so the unseen 1-20 fill the quiz despite being asked
+        assert {row['id'] for row in question_rows} <= set(range(1, 21))
+        assert len(question_rows) == 8
+
+
+class TestBankSamplerRefresh:
+    """Test that stale bank samplers are rebuilt off the request path."""
+
+    def test_stale_sampler_is_served_while_rebuilding(self, stats_db_path):
+        bank = QuestionBank(QuizDatabase(stats_db_path))
+        bank.load()
+        group = bank.get_group('geography', 'flag')
+        release = threading.Event()
+        rebuilt = threading.Event()
+        real_fetch = quiz_generators._fetch_usage_counts
+
+        def blocking_fetch(subcategory_id):
+            release.wait(5)
+            rebuilt.set()
+            return real_fetch(subcategory_id)
+
+        with patch('utils.quiz_generators.question_bank', bank), \
+                patch.dict(quiz_generators._bank_samplers, clear=True), \
+                patch.object(quiz_generators, 'USAGE_REFRESH_SECONDS', 0.0):
+            first = _get_bank_sampler(group)
+            with patch('utils.quiz_generators._fetch_usage_counts', blocking_fetch):
+                # The refresh is blocked, yet the stale sampler comes back at once
+                assert _get_bank_sampler(group) is first
+                assert _get_bank_sampler(group) is first
+                release.set()
+                assert rebuilt.wait(5)
+                for _ in range(100):
+                    if quiz_generators._bank_samplers[('geography', 'flag')][2] is not first:
+                        break
+                    time.sleep(0.01)
+            assert quiz_generators._bank_samplers[('geography', 'flag')][2] is not first
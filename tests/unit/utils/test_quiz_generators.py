@@ -48,6 +48,19 @@ MOCK_DB_DATA = [
 ]
 
 
+def _serve_rows(rows):
+    """Answer the usage histogram, usage ID and question row queries of the SQL fallback from rows."""
+    def execute_query(query, params=()):
+        if 'COUNT(*)' in query:
+            return [{'category_name': row['category_name'], 'subcategory_name': row['subcategory_name'],
+                     'level': 0, 'questions': 1} for row in rows]
+        if 'times_asked, 0) <=' in query:
+            return [{'id': row['id'], 'category_name': row['category_name'],
+                     'subcategory_name': row['subcategory_name'], 'level': 0} for row in rows]
+        return [row for row in rows if row['id'] in params]
+    return execute_query
+
+
 class TestQuizConfiguration:
     """Test quiz configuration constants."""
     
@@ -201,7 +214,7 @@ class TestDatabaseIntegration:
     @patch('utils.quiz_generators.quiz_db.execute_query')
     def test_get_quiz_questions_success(self, mock_execute_query):
         """Test successful quiz question retrieval."""
-        mock_execute_query.return_value = [MOCK_DB_DATA[0]]
+        mock_execute_query.side_effect = _serve_rows([MOCK_DB_DATA[0]])
         
         questions = get_quiz_questions('capital', num_questions=1)
         
@@ -210,13 +223,13 @@ class TestDatabaseIntegration:
         assert questions[0]['category'] == 'geography'
         assert questions[0]['subcategory'] == 'capital'
         
-        # Verify database was called
-        mock_execute_query.assert_called_once()
+        # Verify database was called: usage histogram, usage IDs, question rows
+        assert mock_execute_query.call_count == 3
     
     @patch('utils.quiz_generators.quiz_db.execute_query')
     def test_get_quiz_questions_with_images(self, mock_execute_query):
         """Test quiz questions with image configuration."""
-        mock_execute_query.return_value = [MOCK_DB_DATA[1]]
+        mock_execute_query.side_effect = _serve_rows([MOCK_DB_DATA[1]])
         
         questions = get_quiz_questions('flag', num_questions=1)
         
@@ -235,7 +248,7 @@ class TestDatabaseIntegration:
     @patch('utils.quiz_generators.quiz_db.execute_query')
     def test_generate_questions_by_category(self, mock_execute_query):
         """Test generating questions by category and subcategory."""
-        mock_execute_query.return_value = [MOCK_DB_DATA[0]]
+        mock_execute_query.side_effect = _serve_rows([MOCK_DB_DATA[0]])
         
         questions = generate_questions_by_category(
             category='geography',
@@ -247,12 +260,11 @@ class TestDatabaseIntegration:
         assert questions[0]['category'] == 'geography'
         assert questions[0]['subcategory'] == 'capital'
         
-        # Verify correct database call
-        mock_execute_query.assert_called_once()
-        call_args = mock_execute_query.call_args[0]
-        assert 'geography' in call_args[1]
-        assert 'capital' in call_args[1]
-        assert call_args[1][2] == 1  # num_questions
+        # Verify correct database calls: the histogram, then IDs up to the least asked level
+        assert mock_execute_query.call_count == 3
+        histogram_args, level_args, _ = (call[0] for call in mock_execute_query.call_args_list)
+        assert histogram_args[1] == ('geography', 'capital')
+        assert level_args[1] == ('geography', 'capital', 0)
     
     @patch('utils.quiz_generators.quiz_db.execute_query')
     def test_database_error_handling(self, mock_execute_query):
@@ -0,0 +1,148 @@
+"""
+Unit tests for batched and mixed-category question fetching.
+"""
+from unittest.mock import patch
+import pytest
+from utils.database_utils import QuizDatabase
+from utils.question_bank import QuestionBank
+from utils.quiz_stats import QuizStatsManager
+from utils.quiz_generators import get_quiz_questions_many, get_category_mix_questions
+
+
+@pytest.fixture
+def test_db(stats_db_path):
+    return QuizDatabase(stats_db_path)
+
+
+@pytest.fixture
+def empty_bank(test_db):
+    """Bank that was never loaded, so every lookup falls through to SQL."""
+    return QuestionBank(test_db, check_interval=0)
+
+
+@pytest.fixture
+def loaded_bank(test_db):
+    question_bank = QuestionBank(test_db, check_interval=0)
+    assert question_bank.load()
+    return question_bank
+
+
+class TestGetQuizQuestionsMany:
+    """Test fetching several quiz types at once."""
+
+    def test_batched_statements_on_bank_miss(self, test_db, empty_bank):
+        with patch('utils.quiz_generators.question_bank', empty_bank), \
+             patch('utils.quiz_generators.quiz_db', test_db), \
+             patch.object(test_db, 'execute_query', wraps=test_db.execute_query) as mock_execute_query:
+            questions = get_quiz_questions_many({'capital': 5, 'flag': 3, 'biology': 4})
+
+        # Usage histogram, usage IDs and question rows, each one statement for all subcategories
+        assert mock_execute_query.call_count == 3
+        assert {quiz_type: len(type_questions) for quiz_type, type_questions in questions.items()} == \
+            {'capital': 5, 'flag': 3, 'biology': 4}
+        assert all(question['category'] == 'geography' for question in questions['flag'])
+        assert all(question['subcategory'] == 'biology' for question in questions['biology'])
+
+    def test_served_from_bank_without_sql(self, loaded_bank):
+        with patch('utils.quiz_generators.question_bank', loaded_bank), \
+             patch('utils.quiz_generators.quiz_db.execute_query', return_value=[]) as mock_execute_query:
+            questions = get_quiz_questions_many({'capital': 5, 'flag': 3})
+
+        assert len(questions['capital']) == 5
+        assert len(questions['flag']) == 3
+        # Only the usage totals refresh may touch the database
+        for call in mock_execute_query.call_args_list:
+            assert 'question_usage_totals' in call[0][0]
+
+    def test_reads_only_the_least_asked_levels(self, test_db, empty_bank):
+        with test_db.get_connection() as conn:
+            conn.executemany("INSERT INTO question_usage_totals (question_id, times_asked) VALUES (?, ?)",
+                             [(question_id, 5) for question_id in range(1, 26)])
+            conn.commit()
+        with patch('utils.quiz_generators.question_bank', empty_bank), \
+             patch('utils.quiz_generators.quiz_db', test_db), \
+             patch.object(test_db, 'execute_query', wraps=test_db.execute_query) as mock_execute_query:
+            questions = get_quiz_questions_many({'capital': 5})
+
+        # Questions 26-30 were never asked, so the level 0 bucket covers the request
+        assert sorted(question['id'] for question in questions['capital']) == list(range(26, 31))
+        level_args = mock_execute_query.call_args_list[1][0]
+        assert level_args[1] == ('geography', 'capital', 0)
+
+    def test_seen_widening_is_capped(self, test_db, empty_bank):
+        # Every capital question at its own usage level, and the first 25 already seen
+        with test_db.get_connection() as conn:
+            conn.executemany("INSERT INTO question_usage_totals (question_id, times_asked) VALUES (?, ?)",
+                             [(question_id, question_id) for question_id in range(1, 31)])
+            conn.commit()
+        seen = set(range(1, 26))
+        with patch('utils.quiz_generators.question_bank', empty_bank), \
+             patch('utils.quiz_generators.quiz_db', test_db), \
+             patch.object(test_db, 'execute_query', wraps=test_db.execute_query) as mock_execute_query:
+            questions = get_quiz_questions_many({'capital': 2}, seen=seen)
+
+        # Two questions plus at most 2 * 4 seen ones: levels up to 10, all seen, fill the request
+        level_args = mock_execute_query.call_args_list[1][0]
+        assert level_args[1] == ('geography', 'capital', 10)
+        assert sorted(question['id'] for question in questions['capital']) == [1, 2]
+
+    def test_exclude_ids(self, test_db, empty_bank):
+        with patch('utils.quiz_generators.question_bank', empty_bank), \
+             patch('utils.quiz_generators.quiz_db', test_db):
+            questions = get_quiz_questions_many({'capital': 30}, exclude_ids=list(range(1, 21)))
+
+        assert sorted(question['id'] for question in questions['capital']) == list(range(21, 31))
+
+    def test_unknown_quiz_type(self):
+        with pytest.raises(ValueError, match="Unknown quiz type"):
+            get_quiz_questions_many({'capital': 5, 'nonexistent': 5})
+
+
+class TestFreshDatabase:
+    """Test question draws before anything created the statistics tables."""
+
+    def test_sql_fallback_creates_usage_totals(self, content_db_path):
+        content_db = QuizDatabase(content_db_path)
+        with patch('utils.quiz_generators.question_bank', QuestionBank(content_db)), \
+             patch('utils.quiz_generators.quiz_db', content_db), \
+             patch('utils.quiz_generators.quiz_stats', QuizStatsManager(content_db_path)):
+            questions = get_quiz_questions_many({'capital': 5})
+
+        assert len(questions['capital']) == 5
+
+    def test_bank_sampler_creates_usage_totals(self, content_db_path, caplog):
+        content_db = QuizDatabase(content_db_path)
+        bank = QuestionBank(content_db)
+        assert bank.load()
+        with patch('utils.quiz_generators.question_bank', bank), \
+             patch('utils.quiz_generators.quiz_stats', QuizStatsManager(content_db_path)):
+            questions = get_quiz_questions_many({'flag': 3})
+
+        assert len(questions['flag']) == 3
+        assert 'no such table' not in caplog.text
+
+
+class TestCategoryMix:
+    """Test random mixes across a whole category."""
+
+    def test_mix_is_stratified_and_topped_up(self, test_db, empty_bank):
+        # Only capital (30) and flag (10) are seeded among geography's quiz types
+        with patch('utils.quiz_generators.question_bank', empty_bank), \
+             patch('utils.quiz_generators.quiz_db', test_db):
+            questions = get_category_mix_questions('geography', 16)
+
+        assert len(questions) == 16
+        assert len({question['id'] for question in questions}) == 16
+        subcategories = {question['subcategory'] for question in questions}
+        assert subcategories == {'capital', 'flag'}
+
+    def test_mix_caps_at_available_questions(self, test_db, loaded_bank):
+        with patch('utils.quiz_generators.question_bank', loaded_bank), \
+             patch('utils.quiz_generators.quiz_db', test_db):
+            questions = get_category_mix_questions('science', 50)
+
+        assert len(questions) == 20
+        assert {question['subcategory'] for question in questions} == {'biology'}
+
+    def test_unknown_category(self):
+        assert get_category_mix_questions('nonexistent', 10) == []
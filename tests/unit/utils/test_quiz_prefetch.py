@@ -0,0 +1,78 @@
+"""
+Unit tests for the background quiz prefetcher.
+"""
+import time
+import pytest
+from utils.quiz_prefetch import QuizPrefetcher
+
+
+@pytest.fixture
+def prefetcher():
+    quiz_prefetcher = QuizPrefetcher(max_entries=3, ttl=60.0)
+    yield quiz_prefetcher
+    quiz_prefetcher.shutdown()
+
+
+def _loader(label):
+    return lambda: [{'id': label}]
+
+
+class TestQuizPrefetcher:
+    """Test prefetch, consumption and fallback."""
+
+    def test_prefetched_set_is_consumed_once(self, prefetcher):
+        prefetcher.prefetch('session-1', 'flag', _loader('prefetched'))
+
+        assert prefetcher.get_questions('session-1', 'flag', _loader('sync')) == [{'id': 'prefetched'}]
+        assert prefetcher.get_questions('session-1', 'flag', _loader('sync')) == [{'id': 'sync'}]
+        stats = prefetcher.get_stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
+        assert stats['hit_rate'] == 0.5
+
+    def test_keyed_by_session_and_quiz_type(self, prefetcher):
+        prefetcher.prefetch('session-1', 'flag', _loader('prefetched'))
+        assert prefetcher.get_questions('session-2', 'flag', _loader('sync')) == [{'id': 'sync'}]
+        assert prefetcher.get_questions('session-1', 'capital', _loader('sync')) == [{'id': 'sync'}]
+
+    def test_rejected_set_falls_back(self, prefetcher):
+        prefetcher.prefetch('session-1', 'flag', _loader('prefetched'))
+        questions = prefetcher.get_questions('session-1', 'flag', _loader('sync'),
+                                             accept=lambda questions: questions[0]['id'] != 'prefetched')
+        assert questions == [{'id': 'sync'}]
+        assert prefetcher.get_stats()['misses'] == 1
+
+    def test_expired_entries_fall_back(self):
+        prefetcher = QuizPrefetcher(ttl=0.01)
+        prefetcher.prefetch('session-1', 'flag', _loader('prefetched'))
+        time.sleep(0.05)
+        assert prefetcher.get_questions('session-1', 'flag', _loader('sync')) == [{'id': 'sync'}]
+        assert prefetcher.get_stats()['expired'] == 1
+        prefetcher.shutdown()
+
+    def test_abandoned_entries_expire_without_new_prefetches(self):
+        prefetcher = QuizPrefetcher(ttl=0.01)
+        prefetcher.prefetch('session-1', 'flag', _loader('abandoned'))
+        prefetcher.prefetch('session-2', 'flag', _loader('abandoned'))
+        time.sleep(0.05)
+        # Neither set is ever taken, yet metrics no longer count them as held
+        stats = prefetcher.get_stats()
+        assert stats['entries'] == 0
+        assert stats['expired'] == 2
+        prefetcher.shutdown()
+
+    def test_bounded_size_evicts_oldest(self, prefetcher):
+        for i in range(5):
+            prefetcher.prefetch(f'session-{i}', 'flag', _loader(i))
+        stats = prefetcher.get_stats()
+        assert stats['entries'] == 3
+        assert stats['evicted'] == 2
+        assert prefetcher.take('session-0', 'flag') is None
+        assert prefetcher.take('session-4', 'flag') == [{'id': 4}]
+
+    def test_failed_prefetch_falls_back(self, prefetcher):
+        def failing_loader():
+            raise RuntimeError("database is locked")
+
+        prefetcher.prefetch('session-1', 'flag', failing_loader)
+        assert prefetcher.get_questions('session-1', 'flag', _loader('sync')) == [{'id': 'sync'}]
@@ -0,0 +1,261 @@
+"""
+Unit tests for quiz_stats module.
+"""
+import sqlite3
+from datetime import date, timedelta
+from unittest.mock import patch
+import pytest
+from utils.quiz_stats import AnswerEvent, QuizStatsManager, answer_event_id
+
+
+@pytest.fixture
+def stats_manager(stats_db_path):
+    """Stats manager over the seeded test database."""
+    return QuizStatsManager(stats_db_path)
+
+
+def _usage_totals(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return dict(conn.execute("SELECT question_id, times_asked FROM question_usage_totals").fetchall())
+
+
+class TestUsageTotals:
+    """Test the incrementally maintained question usage totals."""
+
+    def test_record_answer_increments_total(self, stats_manager, stats_db_path):
+        stats_manager.record_quiz_answer(1, True, 2.0)
+        stats_manager.record_quiz_answer(1, False, 3.0)
+        stats_manager.record_quiz_answer(2, True, 1.0)
+        assert _usage_totals(stats_db_path) == {1: 2, 2: 1}
+
+    def test_rollover_subtracts_deleted_daily_rows(self, stats_manager, stats_db_path):
+        old_date = (date.today() - timedelta(days=45)).isoformat()
+        with sqlite3.connect(stats_db_path) as conn:
+            conn.execute("""
+                INSERT INTO daily_question_stats (question_id, date, times_asked, times_correct)
+                VALUES (1, ?, 5, 3), (2, ?, 4, 4)
+            """, (old_date, old_date))
+        stats_manager.rebuild_usage_totals()
+        stats_manager.record_quiz_answer(1, True, 2.0)
+        assert _usage_totals(stats_db_path) == {1: 6, 2: 4}
+
+        result = stats_manager.rollover_weekly_stats()
+
+        assert _usage_totals(stats_db_path) == {1: 1}
+        assert result['old_daily_stats_removed'] == 2
+        assert result['old_sessions_removed'] == 0
+
+    def test_rebuild_matches_daily_stats(self, stats_manager, stats_db_path):
+        for question_id in (1, 1, 3):
+            stats_manager.record_quiz_answer(question_id, True, 1.0)
+        with sqlite3.connect(stats_db_path) as conn:
+            conn.execute("UPDATE question_usage_totals SET times_asked = 99")
+
+        assert stats_manager.rebuild_usage_totals() == 2
+        assert _usage_totals(stats_db_path) == {1: 2, 3: 1}
+
+    def test_backfilled_when_table_is_created(self, stats_db_path):
+        with sqlite3.connect(stats_db_path) as conn:
+            conn.execute("DROP TABLE question_usage_totals")
+            conn.execute("""
+                INSERT INTO daily_question_stats (question_id, date, times_asked)
+                VALUES (7, '2025-01-01', 3), (7, '2025-01-02', 2)
+            """)
+        QuizStatsManager(stats_db_path).init_stats_tables()
+        assert _usage_totals(stats_db_path) == {7: 5}
+
+
+def _session_counters(db_path, session_id):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute("""
+            SELECT total_questions, correct_answers, accuracy_rate, total_time,
+                   avg_response_time, fastest_answer, slowest_answer
+            FROM session_stats WHERE session_id = ?
+        """, (session_id,)).fetchone()
+
+
+class TestSessionCounters:
+    """Test the running per-session counters and their repair path."""
+
+    def test_counters_follow_answers(self, stats_manager, stats_db_path):
+        session_id = stats_manager.start_quiz_session()
+        stats_manager.record_quiz_answer_with_session(session_id, 1, True, 2.0)
+        stats_manager.record_quiz_answer_with_session(session_id, 2, False, 4.0)
+        stats_manager.record_quiz_answer_with_session(session_id, 3, True, 1.0)
+
+        assert _session_counters(stats_db_path, session_id) == (3, 2, pytest.approx(200 / 3), 7.0,
+                                                                pytest.approx(7 / 3), 1.0, 4.0)
+
+    def test_counters_match_full_recompute(self, stats_manager, stats_db_path):
+        session_id = stats_manager.start_quiz_session()
+        for question_id, is_correct, response_time in [(1, True, 3.0), (2, True, 0.5), (3, False, 9.0)]:
+            stats_manager.record_quiz_answer_with_session(session_id, question_id, is_correct, response_time)
+        running = _session_counters(stats_db_path, session_id)
+
+        stats_manager.update_session_stats(session_id)
+        assert _session_counters(stats_db_path, session_id) == pytest.approx(running)
+        assert stats_manager.check_session_consistency() == []
+
+    def test_consistency_check_repairs_drift(self, stats_manager, stats_db_path):
+        session_id = stats_manager.start_quiz_session()
+        stats_manager.record_quiz_answer_with_session(session_id, 1, True, 2.0)
+        with sqlite3.connect(stats_db_path) as conn:
+            conn.execute("UPDATE session_stats SET total_questions = 5 WHERE session_id = ?", (session_id,))
+
+        assert stats_manager.check_session_consistency(repair=False) == [session_id]
+        assert stats_manager.check_session_consistency() == [session_id]
+        assert _session_counters(stats_db_path, session_id)[0] == 1
+        assert stats_manager.check_session_consistency() == []
+
+
+class TestIdempotentAnswers:
+    """Test deduplication of answers by event id and retries under contention."""
+
+    def test_repeated_event_is_recorded_once(self, stats_manager, stats_db_path):
+        session_id = stats_manager.start_quiz_session()
+        event_id = answer_event_id(session_id, 0)
+        assert stats_manager.record_quiz_answer_with_session(session_id, 1, True, 2.0, event_id=event_id)
+        assert not stats_manager.record_quiz_answer_with_session(session_id, 1, True, 2.0, event_id=event_id)
+
+        assert _usage_totals(stats_db_path) == {1: 1}
+        assert _session_counters(stats_db_path, session_id)[0] == 1
+        assert stats_manager.duplicate_answers == 1
+
+    def test_duplicates_within_a_batch(self, stats_manager, stats_db_path):
+        answers = [AnswerEvent(1, True, 1.0, session_id='s1', event_id='s1:0'),
+                   AnswerEvent(1, True, 1.0, session_id='s1', event_id='s1:0'),
+                   AnswerEvent(2, False, 1.0, session_id='s1', event_id='s1:1')]
+        assert stats_manager.record_quiz_answers(answers) == 2
+        assert _usage_totals(stats_db_path) == {1: 1, 2: 1}
+
+    def test_answers_without_event_id_are_not_deduplicated(self, stats_manager, stats_db_path):
+        stats_manager.record_quiz_answer(1, True, 1.0, session_id='s1')
+        stats_manager.record_quiz_answer(1, True, 1.0, session_id='s1')
+        assert _usage_totals(stats_db_path) == {1: 2}
+
+    def test_append_only_log_deduplicates(self, stats_db_path):
+        stats_manager = QuizStatsManager(stats_db_path, append_only=True)
+        assert stats_manager.record_quiz_answer(1, True, 1.0, session_id='s1', event_id='s1:0')
+        assert not stats_manager.record_quiz_answer(1, True, 1.0, session_id='s1', event_id='s1:0')
+        stats_manager.compact_answer_events()
+        # A retry after compaction is caught against the recorded answers
+        assert stats_manager.record_quiz_answer(1, True, 1.0, session_id='s1', event_id='s1:0')
+        stats_manager.compact_answer_events()
+        assert _usage_totals(stats_db_path) == {1: 1}
+
+    def test_locked_database_is_retried(self, stats_db_path):
+        stats_manager = QuizStatsManager(stats_db_path, retry_base_delay=0.001)
+        apply_answers = stats_manager._apply_answers
+        attempts = []
+
+        def locked_once(cursor, answers):
+            attempts.append(len(answers))
+            if len(attempts) == 1:
+                raise sqlite3.OperationalError("database is locked")
+            return apply_answers(cursor, answers)
+
+        with patch.object(stats_manager, '_apply_answers', side_effect=locked_once):
+            assert stats_manager.record_quiz_answer(1, True, 1.0, event_id='s1:0')
+
+        assert stats_manager.write_retries == 1
+        assert _usage_totals(stats_db_path) == {1: 1}
+
+    def test_other_errors_are_not_retried(self, stats_db_path):
+        stats_manager = QuizStatsManager(stats_db_path)
+        with patch.object(stats_manager, '_apply_answers', side_effect=sqlite3.OperationalError("no such table: x")):
+            with pytest.raises(sqlite3.OperationalError):
+                stats_manager.record_quiz_answer(1, True, 1.0)
+        assert stats_manager.write_retries == 0
+
+    def test_event_id_column_added_to_existing_table(self, stats_db_path):
+        with sqlite3.connect(stats_db_path) as conn:
+            conn.execute("DROP INDEX idx_quiz_sessions_event_id")
+            conn.execute("ALTER TABLE quiz_sessions DROP COLUMN event_id")
+            conn.execute("DROP TABLE schema_version")
+        stats_manager = QuizStatsManager(stats_db_path)
+        stats_manager.record_quiz_answer(1, True, 1.0, session_id='s1', event_id='s1:0')
+        stats_manager.record_quiz_answer(1, True, 1.0, session_id='s1', event_id='s1:0')
+        assert _usage_totals(stats_db_path) == {1: 1}
+
+
+class TestDailyStatsRange:
+    """Test the single-pass date-range statistics used by the dashboard."""
+
+    DAYS = [(date(2024, 3, 1) + timedelta(days=offset)).isoformat() for offset in range(5)]
+
+    def _record_days(self, manager):
+        # No answers on the third day
+        answers = []
+        for offset, day in enumerate(self.DAYS):
+            if offset == 2:
+                continue
+            answers += [AnswerEvent(1, True, 2.0, date=day), AnswerEvent(31, offset % 2 == 0, 4.0, date=day),
+                        AnswerEvent(45, False, 1.0 + offset, date=day)]
+        manager.record_quiz_answers(answers)
+
+    def _per_day(self, manager):
+        per_day = []
+        for day in self.DAYS:
+            daily_stats = manager.get_daily_stats(day)
+            if daily_stats['summary']['total_questions_asked'] > 0:
+                categories = sorted((stat['category_id'], stat['subcategory_id'], stat['questions_asked'],
+                                     stat['questions_correct']) for stat in daily_stats['category_stats'])
+                per_day.append((day, daily_stats['summary'], categories))
+        return per_day
+
+    def _range(self, manager, start, end):
+        return [(day['date'], day['summary'],
+                 sorted((stat['category_id'], stat['subcategory_id'], stat['questions_asked'],
+                         stat['questions_correct']) for stat in day['category_stats']))
+                for day in manager.get_daily_stats_range(start, end)]
+
+    def test_matches_per_day_stats(self, stats_manager):
+        self._record_days(stats_manager)
+        range_stats = self._range(stats_manager, self.DAYS[0], self.DAYS[-1])
+
+        assert [day for day, _, _ in range_stats] == [self.DAYS[0], self.DAYS[1], self.DAYS[3], self.DAYS[4]]
+        assert range_stats == self._per_day(stats_manager)
+
+        first_day = stats_manager.get_daily_stats_range(self.DAYS[0], self.DAYS[0])[0]
+        assert {stat['category'] for stat in first_day['category_stats']} == {'Geography', 'Science'}
+        assert all('accuracy_rate' in stat for stat in first_day['category_stats'])
+
+    def test_includes_append_only_tail(self, stats_db_path):
+        manager = QuizStatsManager(stats_db_path, append_only=True)
+        self._record_days(manager)
+        manager.compact_answer_events(batch_size=4)
+        manager.record_quiz_answers([AnswerEvent(2, True, 3.0, date=self.DAYS[1]),
+                                     AnswerEvent(46, True, 3.0, date=self.DAYS[2])])
+
+        range_stats = self._range(manager, self.DAYS[0], self.DAYS[-1])
+        assert len(range_stats) == 5
+        assert range_stats == self._per_day(manager)
+
+    def test_empty_range(self, stats_manager):
+        self._record_days(stats_manager)
+        assert stats_manager.get_daily_stats_range('2023-01-01', '2023-01-31') == []
+
+
+class TestStatsVersion:
+    """Test the change watermark advanced by statistics writes."""
+
+    def test_writes_advance_version(self, stats_manager):
+        version = stats_manager.get_stats_version()
+        session_id = stats_manager.start_quiz_session('Capitals')
+        stats_manager.record_quiz_answer(1, True, 1.0, session_id=session_id, event_id=f"{session_id}:0")
+        stats_manager.end_quiz_session(session_id)
+        assert stats_manager.get_stats_version() == version + 3
+
+        # A duplicate answer records nothing and leaves the version alone
+        stats_manager.record_quiz_answer(1, True, 1.0, session_id=session_id, event_id=f"{session_id}:0")
+        assert stats_manager.get_stats_version() == version + 3
+
+    def test_version_is_shared_across_managers(self, stats_manager, stats_db_path):
+        append_manager = QuizStatsManager(stats_db_path, append_only=True)
+        version = stats_manager.get_stats_version()
+
+        append_manager.record_quiz_answers([AnswerEvent(1, True, 2.0), AnswerEvent(2, False, 3.0)])
+        assert stats_manager.get_stats_version() == version + 1
+        # Compaction moves answers without changing any reported numbers
+        append_manager.compact_answer_events()
+        assert stats_manager.get_stats_version() == version + 1
@@ -0,0 +1,67 @@
+"""
+Unit tests for per-user seen question bitmaps.
+"""
+from unittest.mock import patch
+from utils.database_utils import QuizDatabase
+from utils.question_bank import QuestionBank
+from utils.quiz_generators import get_quiz_questions
+from utils.quiz_stats import QuizStatsManager
+from utils.seen_questions import SeenQuestionSet
+
+
+class TestSeenQuestionSet:
+    """Test the bitmap-backed set."""
+
+    def test_membership_and_length(self):
+        seen = SeenQuestionSet()
+        seen.update([0, 7, 8, 2226])
+        assert 7 in seen and 8 in seen and 2226 in seen
+        assert 1 not in seen and 5000 not in seen
+        assert len(seen) == 4
+        assert sorted(seen) == [0, 7, 8, 2226]
+
+    def test_blob_roundtrip_is_compact(self):
+        seen = SeenQuestionSet()
+        seen.update(range(1, 5000, 2))
+        blob = seen.to_blob()
+        assert len(blob) < 200
+        restored = SeenQuestionSet.from_blob(blob)
+        assert len(restored) == 2500
+        assert 4999 in restored and 5000 not in restored
+
+    def test_empty_blob(self):
+        assert len(SeenQuestionSet.from_blob(None)) == 0
+
+
+class TestSeenTracking:
+    """Test seen tracking in the stats manager and quiz generation."""
+
+    def test_answers_mark_questions_seen(self, stats_db_path):
+        stats_manager = QuizStatsManager(stats_db_path)
+        stats_manager.record_quiz_answer_with_session('s1', 3, True, 1.0, user_id='alice')
+        stats_manager.record_quiz_answer_with_session('s1', 5, False, 1.0, user_id='alice')
+        stats_manager.record_quiz_answer_with_session('s2', 9, False, 1.0, user_id='bob')
+
+        assert sorted(stats_manager.get_seen_questions('alice')) == [3, 5]
+        assert sorted(stats_manager.get_seen_questions('bob')) == [9]
+        assert len(stats_manager.get_seen_questions('carol')) == 0
+
+    def test_anonymous_user_is_not_tracked(self, stats_db_path):
+        stats_manager = QuizStatsManager(stats_db_path)
+        stats_manager.record_quiz_answer(3, True, 1.0, user_id='anonymous_user')
+        assert len(stats_manager.get_seen_questions('anonymous_user')) == 0
+
+    def test_unseen_questions_are_preferred(self, stats_db_path):
+        stats_manager = QuizStatsManager(stats_db_path)
+        bank = QuestionBank(QuizDatabase(stats_db_path))
+        bank.load()
+        flag_ids = list(bank.get_group('geography', 'flag').ids)
+        stats_manager.mark_questions_seen('alice', flag_ids[:7])
+        seen = stats_manager.get_seen_questions('alice')
+
+        with patch('utils.quiz_generators.question_bank', bank):
+            questions = get_quiz_questions('flag', num_questions=5, seen=seen)
+
+        question_ids = [q['id'] for q in questions]
+        assert set(question_ids[:3]) == set(flag_ids[7:])
+        assert len(set(question_ids)) == 5
@@ -0,0 +1,107 @@
+"""
+Unit tests for the precomputed session leaderboards.
+"""
+import sqlite3
+from datetime import date, timedelta
+import pytest
+from utils import session_leaderboard
+from utils.quiz_stats import AnswerEvent, QuizStatsManager
+
+
+@pytest.fixture
+def stats_manager(stats_db_path, monkeypatch):
+    # Small boards so trimming and refilling are exercised
+    monkeypatch.setattr(session_leaderboard, 'LEADERBOARD_SIZE', 3)
+    return QuizStatsManager(stats_db_path)
+
+
+def _play(manager, name, correct, total=5, response_time=2.0, days_ago=0):
+    """Complete a session with `correct` of `total` answers right, started `days_ago` days ago"""
+    session_id = manager.start_quiz_session(session_name=name, user_id='alice')
+    if days_ago:
+        started_at = (date.today() - timedelta(days=days_ago)).isoformat() + " 12:00:00"
+        with manager.get_connection() as conn:
+            conn.execute("UPDATE session_stats SET started_at = ? WHERE session_id = ?", (started_at, session_id))
+            conn.commit()
+    manager.record_quiz_answers([AnswerEvent(index + 1, index < correct, response_time, session_id=session_id)
+                                 for index in range(total)])
+    manager.end_quiz_session(session_id)
+    return session_id
+
+
+def _ids(rows):
+    return [row['session_id'] for row in rows]
+
+
+def _board_size(db_path, period, quiz_type=''):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM session_leaderboard WHERE period = ? AND quiz_type = ?",
+                            (period, quiz_type)).fetchone()[0]
+
+
+class TestLeaderboardBoards:
+    """Test boards maintained when sessions end."""
+
+    def test_boards_match_full_ranking(self, stats_manager, stats_db_path):
+        for correct in (5, 2, 4, 3, 1):
+            _play(stats_manager, 'Capitals', correct, days_ago=correct * 5)
+        _play(stats_manager, 'Flags', 5, response_time=1.0)
+
+        for period_days in (7, 30, None):
+            board = stats_manager.get_session_leaderboard(period_days=period_days, limit=3)
+            # Longer than a board, so ranked from session_stats
+            full = stats_manager.get_session_leaderboard(period_days=period_days, limit=10)
+            assert _ids(board) == _ids(full)[:3]
+        assert _board_size(stats_db_path, 'all') == 3
+
+    def test_boards_per_quiz_type(self, stats_manager):
+        capitals = [_play(stats_manager, 'Capitals', correct) for correct in (3, 5)]
+        flags = _play(stats_manager, 'Flags', 4)
+
+        assert _ids(stats_manager.get_session_leaderboard(quiz_type='Capitals')) == [capitals[1], capitals[0]]
+        assert _ids(stats_manager.get_session_leaderboard(quiz_type='Flags')) == [flags]
+        assert _ids(stats_manager.get_session_leaderboard()) == [capitals[1], flags, capitals[0]]
+
+    def test_short_sessions_do_not_qualify(self, stats_manager, stats_db_path):
+        _play(stats_manager, 'Capitals', 4, total=4)
+        assert stats_manager.get_session_leaderboard() == []
+        assert _board_size(stats_db_path, '7d') == 0
+
+    def test_expired_entries_are_replaced(self, stats_manager, stats_db_path):
+        recent = [_play(stats_manager, 'Capitals', correct, days_ago=1) for correct in (1, 2)]
+        aging = [_play(stats_manager, 'Capitals', 5, days_ago=6), _play(stats_manager, 'Capitals', 4, days_ago=6)]
+        assert _ids(stats_manager.get_session_leaderboard(period_days=7, limit=3)) == aging + [recent[1]]
+
+        # Two days later the aging sessions leave the 7-day window; the session trimmed off earlier returns
+        with stats_manager.get_connection() as conn:
+            for table in ('session_stats', 'session_leaderboard'):
+                conn.execute(f"UPDATE {table} SET started_at = DATETIME(started_at, '-2 days')")
+            conn.commit()
+        assert _ids(stats_manager.get_session_leaderboard(period_days=7, limit=3)) == [recent[1], recent[0]]
+        assert _ids(stats_manager.get_session_leaderboard(period_days=30, limit=3)) == aging + [recent[1]]
+
+    def test_consistency_repair_refills_boards(self, stats_manager, stats_db_path):
+        drifted = _play(stats_manager, 'Capitals', 5)
+        others = [_play(stats_manager, 'Capitals', correct) for correct in (4, 3)]
+        flags = _play(stats_manager, 'Flags', 2)
+        assert _ids(stats_manager.get_session_leaderboard(quiz_type='Capitals', limit=3)) == [drifted] + others
+
+        # The drifted session's recorded answers say 1 of 5, while its counters and board entries say 5 of 5
+        with sqlite3.connect(stats_db_path) as conn:
+            conn.execute("UPDATE quiz_sessions SET is_correct = 0 WHERE session_id = ? AND question_id > 1",
+                         (drifted,))
+        version = stats_manager.get_stats_version()
+        assert stats_manager.check_session_consistency() == [drifted]
+
+        assert _ids(stats_manager.get_session_leaderboard(quiz_type='Capitals', limit=3)) == others + [drifted]
+        assert _ids(stats_manager.get_session_leaderboard(limit=3)) == others + [flags]
+        assert stats_manager.get_stats_version() > version
+
+    def test_rebuild_matches_incremental_boards(self, stats_manager, stats_db_path):
+        for correct in (5, 2, 4, 3):
+            _play(stats_manager, 'Capitals' if correct % 2 else 'Flags', correct, days_ago=correct * 4)
+        with sqlite3.connect(stats_db_path) as conn:
+            incremental = sorted(conn.execute("SELECT * FROM session_leaderboard").fetchall())
+        assert stats_manager.rebuild_leaderboards() == len(incremental)
+        with sqlite3.connect(stats_db_path) as conn:
+            assert sorted(conn.execute("SELECT * FROM session_leaderboard").fetchall()) == incremental
@@ -0,0 +1,90 @@
+"""
+Unit tests for the response-time quantile sketches.
+"""
+import random
+import sqlite3
+from datetime import date, timedelta
+import pytest
+from utils.quiz_stats import AnswerEvent, QuizStatsManager
+from utils.sketches import DDSketch
+
+
+def _exact_quantile(values, q):
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+def _day(days_ago):
+    return (date.today() - timedelta(days=days_ago)).isoformat()
+
+
+class TestDDSketch:
+    """Test sketch accuracy, merging and serialization."""
+
+    def test_quantiles_within_relative_accuracy(self):
+        rng = random.Random(7)
+        values = [rng.lognormvariate(1.0, 0.8) for _ in range(20000)]
+        sketch = DDSketch().add_all(values)
+        for q in (0.01, 0.5, 0.9, 0.99, 1.0):
+            exact = _exact_quantile(values, q)
+            assert abs(sketch.quantile(q) - exact) <= 0.0101 * exact
+        assert DDSketch().quantile(0.5) is None
+
+    def test_merge_matches_single_sketch(self):
+        rng = random.Random(3)
+        days = [[rng.expovariate(0.3) for _ in range(500)] for _ in range(10)]
+        merged = DDSketch()
+        for values in days:
+            merged.merge(DDSketch().add_all(values))
+        single = DDSketch().add_all(value for values in days for value in values)
+        assert merged.count == single.count == 5000
+        assert merged.quantiles((0.5, 0.9, 0.99)) == single.quantiles((0.5, 0.9, 0.99))
+        with pytest.raises(ValueError):
+            merged.merge(DDSketch(relative_accuracy=0.02))
+
+    def test_serialization_round_trip_is_compact(self):
+        rng = random.Random(11)
+        sketch = DDSketch().add_all([0.0] + [rng.uniform(0.5, 60.0) for _ in range(100000)])
+        data = sketch.to_bytes()
+        assert len(data) < 1024
+        restored = DDSketch.from_bytes(data)
+        assert (restored.count, restored.zero_count, restored.min, restored.max) == \
+            (sketch.count, sketch.zero_count, sketch.min, sketch.max)
+        assert restored.quantiles((0.5, 0.99)) == sketch.quantiles((0.5, 0.99))
+        assert DDSketch.from_bytes(DDSketch().to_bytes()).count == 0
+
+
+class TestStoredSketches:
+    """Test sketches maintained by QuizStatsManager."""
+
+    def test_range_percentiles_per_scope(self, stats_db_path):
+        manager = QuizStatsManager(stats_db_path)
+        times = {day: [1.0 + day + index * 0.1 for index in range(20)] for day in range(5)}
+        manager.record_quiz_answers([AnswerEvent(1 + index % 3, True, value, date=_day(day))
+                                     for day, values in times.items() for index, value in enumerate(values)])
+        manager.record_quiz_answers([AnswerEvent(45, False, 9.0, date=_day(0))])
+
+        overall = manager.get_response_time_percentiles(_day(4), _day(1))[0]
+        values = [value for day in range(1, 5) for value in times[day]]
+        assert overall['count'] == len(values)
+        for q, key in ((0.5, 'p50'), (0.9, 'p90'), (0.99, 'p99')):
+            assert overall[key] == pytest.approx(_exact_quantile(values, q), rel=0.011)
+
+        subcategories = manager.get_response_time_percentiles(_day(0), _day(0), scope='subcategory')
+        assert sorted(stat['count'] for stat in subcategories.values()) == [1, 20]
+        assert {stat['category'] for stat in subcategories.values()} == {'Geography', 'Science'}
+
+        questions = manager.get_response_time_percentiles(_day(4), _day(0), scope='question', scope_ids=[45])
+        assert questions == {45: {'count': 1, 'p50': 9.0, 'p90': 9.0, 'p99': 9.0}}
+
+    def test_append_only_tail_is_included(self, stats_db_path):
+        manager = QuizStatsManager(stats_db_path, append_only=True)
+        manager.record_quiz_answers([AnswerEvent(1, True, float(value), date=_day(value % 3))
+                                     for value in range(1, 31)])
+        before = manager.get_response_time_percentiles(_day(7), _day(0))
+
+        manager.compact_answer_events()
+        assert manager.get_response_time_percentiles(_day(7), _day(0)) == before
+        assert before[0]['count'] == 30
+        with sqlite3.connect(stats_db_path) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM response_time_sketches WHERE scope = 'all'").fetchone()[0] == 3
@@ -0,0 +1,215 @@
+"""
+Unit tests for the cross-process stats aggregator and its client.
+"""
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import pytest
+from utils.answer_recorder import BufferedAnswerRecorder
+from utils.quiz_stats import AnswerEvent, QuizStatsManager
+from utils.stats_aggregator import AggregatorClient, StatsAggregator
+
+
+@pytest.fixture
+def socket_path():
+    # Unix socket paths are limited to ~100 characters, so avoid deep pytest tmp dirs
+    directory = tempfile.mkdtemp(prefix='qs-')
+    yield os.path.join(directory, 'stats.sock')
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+@pytest.fixture
+def stats_manager(stats_db_path):
+    return QuizStatsManager(stats_db_path)
+
+
+@pytest.fixture
+def aggregator(stats_manager, socket_path):
+    server = StatsAggregator(stats_manager, socket_path, max_batch=1000, flush_interval=60)
+    server.bind()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.stop()
+    thread.join(5)
+
+
+def _answer_count(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM quiz_sessions").fetchone()[0]
+
+
+class TestAggregator:
+    """Test answers sent over the socket."""
+
+    def test_flush_commits_sent_answers(self, aggregator, stats_manager, stats_db_path, socket_path):
+        # The worker's own manager, separate from the one the aggregator commits with
+        worker_manager = QuizStatsManager(stats_db_path)
+        client = AggregatorClient(socket_path, worker_manager)
+        notified = []
+        worker_manager.add_write_listener(lambda: notified.append(_answer_count(stats_db_path)))
+        assert client.record_quiz_answers([AnswerEvent(1, True, 1.0, session_id='s1'),
+                                           AnswerEvent(2, False, 2.0, session_id='s1')]) == 2
+        client.record_quiz_answers([AnswerEvent(3, True, 1.5, session_id='s2', user_id='alice')])
+        assert notified == []
+
+        assert client.flush()
+        # Local listeners run once the aggregator has committed
+        assert notified == [3]
+        assert _answer_count(stats_db_path) == 3
+        assert set(stats_manager.get_seen_questions('alice')) == {3}
+        assert client.get_stats()['sent'] == 3
+        assert aggregator.get_stats()['batches'] == 1
+
+    def test_batches_across_clients(self, aggregator, stats_manager, stats_db_path, socket_path):
+        clients = [AggregatorClient(socket_path, stats_manager) for _ in range(3)]
+        for index, client in enumerate(clients):
+            client.record_quiz_answers([AnswerEvent(index + 1, True, 1.0, session_id='s1')])
+        for client in clients:
+            assert client.flush()
+        assert _answer_count(stats_db_path) == 3
+
+    def test_malformed_messages_are_ignored(self, aggregator, stats_manager, stats_db_path, socket_path):
+        client = AggregatorClient(socket_path, stats_manager)
+        client.record_quiz_answers([AnswerEvent(1, True, 1.0, session_id='s1')])
+        client._sock.sendall(b'not json\n[1, 2]\n{"answers": [{"bogus": 1}]}\n')
+
+        assert client.flush()
+        assert _answer_count(stats_db_path) == 1
+
+
+class _FailingWriter:
+    """Stands in for the stats manager and fails the first `failures` commits"""
+
+    def __init__(self, stats_manager, failures):
+        self.stats_manager = stats_manager
+        self.failures = failures
+
+    def record_quiz_answers(self, answers):
+        if self.failures:
+            self.failures -= 1
+            raise sqlite3.OperationalError("database is locked")
+        return self.stats_manager.record_quiz_answers(answers)
+
+
+class TestFailedCommits:
+    """Test that answers survive failed commits."""
+
+    def test_failed_commit_is_retried(self, stats_manager, stats_db_path, socket_path):
+        server = StatsAggregator(_FailingWriter(stats_manager, 1), socket_path, retry_base_delay=0)
+        server._pending = [AnswerEvent(1, True, 1.0, session_id='s1')]
+
+        assert not server._flush()
+        assert server.get_stats()['pending'] == 1
+        assert server._flush()
+        assert _answer_count(stats_db_path) == 1
+        assert server.get_stats()['failed'] == 1
+
+    def test_flush_reply_fails_and_answers_are_spilled(self, stats_manager, stats_db_path, socket_path):
+        writer = _FailingWriter(stats_manager, 2)
+        server = StatsAggregator(writer, socket_path, flush_interval=60, max_attempts=2, retry_base_delay=0)
+        server.bind()
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            client = AggregatorClient(socket_path, stats_manager)
+            client.record_quiz_answers([AnswerEvent(1, True, 1.0, session_id='s1', event_id='s1:0')])
+            assert not client.flush()
+            assert not client.flush()
+            assert os.path.exists(server.spill_path)
+            assert server.get_stats()['spilled'] == 1
+
+            # The next successful commit replays the spill file
+            client.record_quiz_answers([AnswerEvent(2, True, 1.0, session_id='s1', event_id='s1:1')])
+            assert client.flush()
+        finally:
+            server.stop()
+            thread.join(5)
+
+        assert _answer_count(stats_db_path) == 2
+        assert not os.path.exists(server.spill_path)
+
+
+class _PoisonWriter:
+    """Stands in for the stats manager and rejects every commit that contains question 999"""
+
+    def __init__(self, stats_manager):
+        self.stats_manager = stats_manager
+
+    def record_quiz_answers(self, answers):
+        if any(answer.question_id == 999 for answer in answers):
+            raise sqlite3.IntegrityError("CHECK constraint failed")
+        return self.stats_manager.record_quiz_answers(answers)
+
+
+class TestPoisonedBatches:
+    """Test that one bad answer does not hold back the rest of its batch."""
+
+    def test_batch_is_split_and_bad_answer_dead_lettered(self, stats_manager, stats_db_path, socket_path):
+        server = StatsAggregator(_PoisonWriter(stats_manager), socket_path)
+        server._pending = [AnswerEvent(1, True, 1.0, session_id='s1'),
+                           AnswerEvent(999, True, 1.0, session_id='s1'),
+                           AnswerEvent(2, False, 2.0, session_id='s1')]
+
+        assert server._flush()
+        assert _answer_count(stats_db_path) == 2
+        stats = server.get_stats()
+        assert stats['pending'] == 0
+        assert stats['written'] == 2
+        assert stats['dead_lettered'] == 1
+        assert not os.path.exists(server.spill_path)
+        with open(server.dead_letter_path) as dead:
+            assert [line for line in dead if '"question_id": 999' in line]
+
+    def test_spill_replay_dead_letters_bad_answer(self, stats_manager, stats_db_path, socket_path):
+        server = StatsAggregator(_PoisonWriter(stats_manager), socket_path)
+        server._pending = [AnswerEvent(1, True, 1.0, session_id='s1', event_id='s1:0'),
+                           AnswerEvent(999, True, 1.0, session_id='s1', event_id='s1:1')]
+        server._spill()
+
+        server._replay_spill()
+        assert not os.path.exists(server.spill_path)
+        assert _answer_count(stats_db_path) == 1
+        assert server.get_stats()['dead_lettered'] == 1
+
+
+class TestClientFallback:
+    """Test direct writes when the aggregator cannot be reached."""
+
+    def test_writes_directly_without_aggregator(self, stats_manager, stats_db_path, socket_path):
+        client = AggregatorClient(socket_path, stats_manager)
+        assert client.record_quiz_answers([AnswerEvent(1, True, 1.0, session_id='s1')]) == 1
+
+        assert _answer_count(stats_db_path) == 1
+        assert client.get_stats()['fallbacks'] == 1
+        assert client.flush()
+
+    def test_reconnects_after_restart(self, stats_manager, stats_db_path, socket_path):
+        client = AggregatorClient(socket_path, stats_manager, retry_interval=0)
+        client.record_quiz_answers([AnswerEvent(1, True, 1.0, session_id='s1')])
+
+        server = StatsAggregator(stats_manager, socket_path, flush_interval=60)
+        server.bind()
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            client.record_quiz_answers([AnswerEvent(2, True, 1.0, session_id='s1')])
+            assert client.flush()
+        finally:
+            server.stop()
+            thread.join(5)
+
+        assert _answer_count(stats_db_path) == 2
+        assert client.get_stats() == {'socket': socket_path, 'connected': True, 'sent': 1, 'fallbacks': 1}
+
+    def test_recorder_flush_reaches_aggregator(self, aggregator, stats_manager, stats_db_path, socket_path):
+        recorder = BufferedAnswerRecorder(AggregatorClient(socket_path, stats_manager), flush_interval=60)
+        for question_id in range(1, 4):
+            recorder.record('s1', question_id, True, 1.0)
+
+        assert recorder.flush()
+        assert _answer_count(stats_db_path) == 3
+        assert recorder.get_stats()['aggregator']['sent'] == 3
+        recorder.shutdown()
@@ -0,0 +1,193 @@
+"""
+Unit tests for stats schema migrations and the query plans of hot statistics queries.
+"""
+import re
+import sqlite3
+from datetime import date, datetime, timedelta, timezone
+import pytest
+from utils import session_leaderboard, stats_rollups
+from utils.db_connections import connection_manager
+from utils.distinct_counts import HyperLogLog
+from utils.quiz_stats import AnswerEvent, QuizStatsManager
+from utils.sketches import DDSketch
+from utils.stats_migrations import (MIGRATIONS, SCHEMA_VERSION, Migration, _hll_v1_blob, _sketch_v1_blob,
+                                    apply_migrations)
+
+STATS_TABLES = {
+    'daily_question_stats', 'daily_category_stats', 'historical_question_stats', 'question_usage_totals',
+    'quiz_sessions', 'session_stats', 'answer_events', 'user_seen_questions', 'session_leaderboard',
+    'rollup_question_stats', 'rollup_category_stats', 'rollup_session_stats', 'response_time_sketches',
+    'distinct_counts'
+}
+
+
+def _indexes(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+
+def _versions(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return [row[0] for row in conn.execute("SELECT version FROM schema_version ORDER BY version")]
+
+
+class TestMigrations:
+    """Test versioned migration bookkeeping."""
+
+    def test_new_database_is_at_latest_version(self, stats_db_path):
+        assert _versions(stats_db_path) == [migration.version for migration in MIGRATIONS]
+        assert {'idx_session_stats_status_started_at', 'idx_quiz_sessions_timestamp'} <= _indexes(stats_db_path)
+
+    def test_migrations_apply_once(self, stats_db_path):
+        QuizStatsManager(stats_db_path)
+        with sqlite3.connect(stats_db_path) as conn:
+            assert apply_migrations(conn) == []
+        assert len(_versions(stats_db_path)) == SCHEMA_VERSION
+
+    def test_upgrades_database_without_migrations(self, stats_db_path):
+        # Schema as created before migrations were introduced
+        with sqlite3.connect(stats_db_path) as conn:
+            conn.execute("DROP TABLE schema_version")
+            for index in _indexes(stats_db_path):
+                if index.startswith(('idx_session_stats', 'idx_quiz_sessions', 'idx_daily', 'idx_answer_events_user')):
+                    conn.execute(f"DROP INDEX {index}")
+            conn.execute("CREATE INDEX idx_quiz_sessions_session_id ON quiz_sessions(session_id)")
+            conn.execute("INSERT INTO quiz_sessions (session_id, question_id, is_correct, response_time) VALUES ('s1', 1, 1, 2.0)")
+
+        QuizStatsManager(stats_db_path).init_stats_tables()
+        assert _versions(stats_db_path) == list(range(1, SCHEMA_VERSION + 1))
+        with sqlite3.connect(stats_db_path) as conn:
+            columns = [row[2] for row in conn.execute("PRAGMA index_info(idx_quiz_sessions_session_id)")]
+            assert columns == ['session_id', 'is_correct', 'response_time']
+            assert conn.execute("SELECT COUNT(*) FROM quiz_sessions").fetchone()[0] == 1
+
+    def test_failed_migration_rolls_back(self, stats_db_path):
+        def broken(cursor):
+            cursor.execute("CREATE INDEX idx_broken_first ON session_stats(user_id)")
+            raise sqlite3.OperationalError("boom")
+
+        steps = MIGRATIONS + [Migration(SCHEMA_VERSION + 1, 'first', lambda cursor: None),
+                              Migration(SCHEMA_VERSION + 2, 'broken', broken)]
+        with sqlite3.connect(stats_db_path) as conn:
+            with pytest.raises(sqlite3.OperationalError):
+                apply_migrations(conn, steps)
+        assert len(_versions(stats_db_path)) == SCHEMA_VERSION
+        assert 'idx_broken_first' not in _indexes(stats_db_path)
+
+
+def _full_scans(conn, statement):
+    """Return the stats tables a statement reads by scanning them in full"""
+    plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {statement}")]
+    if re.search(r'\bORDER BY\b.*\bLIMIT\b', statement, re.S) and \
+            not any(detail.startswith('USE TEMP B-TREE FOR ORDER BY') for detail in plan):
+        # Scanning in the requested order stops after LIMIT rows
+        return []
+    scans = []
+    for detail in plan:
+        match = re.match(r'SCAN (\w+)', detail)
+        if match is None:
+            continue
+        table = match.group(1)
+        # Resolve aliases like "dqs" through the FROM/JOIN clauses
+        alias = re.search(rf'\b(\w+)\s+(?:AS\s+)?{table}\b', statement)
+        if table not in STATS_TABLES and alias and alias.group(1) in STATS_TABLES:
+            table = alias.group(1)
+        if table in STATS_TABLES:
+            scans.append(f"{detail} in: {' '.join(statement.split())[:120]}")
+    return scans
+
+
+class TestFrozenSeeds:
+    """Released steps seed with frozen logic; it must still agree with the current code."""
+
+    def test_seeds_match_current_rebuilds(self, stats_db_path):
+        manager = QuizStatsManager(stats_db_path)
+        for index in range(4):
+            session_id = manager.start_quiz_session('Capitals' if index % 2 else 'Flags', user_id=f"user-{index}")
+            manager.record_quiz_answers([AnswerEvent(question_id, question_id % (index + 2) == 0, 1.0 + index,
+                                                     session_id=session_id)
+                                         for question_id in range(1 + index, 8 + index)])
+            manager.end_quiz_session(session_id)
+
+        steps = {migration.version: migration for migration in MIGRATIONS}
+        tables = ('session_leaderboard', 'rollup_question_stats', 'rollup_category_stats', 'rollup_session_stats')
+        with sqlite3.connect(stats_db_path) as conn:
+            cursor = conn.cursor()
+            for table in tables:
+                cursor.execute(f"DELETE FROM {table}")
+            steps[6].apply(cursor)
+            steps[8].apply(cursor)
+            seeded = {table: sorted(cursor.execute(f"SELECT * FROM {table}").fetchall()) for table in tables}
+            session_leaderboard.rebuild(cursor)
+            stats_rollups.rebuild(cursor)
+            for table in tables:
+                assert sorted(cursor.execute(f"SELECT * FROM {table}").fetchall()) == seeded[table]
+
+    def test_frozen_blobs_match_current_encoders(self):
+        values = [0.0, 0.0005, 0.4, 1.0, 2.5, 2.5, 17.0, 300.0]
+        assert _sketch_v1_blob(values) == DDSketch().add_all(values).to_bytes()
+        for count in (3, 5000):
+            members = [f"user-{index}" for index in range(count)]
+            counter = HyperLogLog()
+            counter.add_all(members)
+            assert _hll_v1_blob(members) == counter.to_bytes()
+
+
+class TestHotQueryPlans:
+    """Fail if a query on the answer or dashboard path falls back to a full table scan."""
+
+    def test_hot_queries_use_indexes(self, stats_db_path):
+        manager = QuizStatsManager(stats_db_path)
+        append_manager = QuizStatsManager(stats_db_path, append_only=True)
+        today = date.today()
+
+        # Enough rows that a scan would not look free to the planner
+        answers = [AnswerEvent(question_id, question_id % 3 == 0, 2.0, session_id=f"seed-{question_id % 7}",
+                               user_id='alice', date=(today - timedelta(days=question_id % 40)).isoformat())
+                   for question_id in range(1, 61)]
+        manager.record_quiz_answers(answers)
+
+        statements = []
+        conn = connection_manager.get_connection(stats_db_path)
+        conn.set_trace_callback(statements.append)
+        try:
+            session_id = manager.start_quiz_session('Capitals', user_id='alice')
+            manager.record_quiz_answer(1, True, 1.5, session_id=session_id, user_id='alice',
+                                       event_id=f"{session_id}:0")
+            append_manager.record_quiz_answer(2, False, 3.0, session_id=session_id, user_id='alice')
+            manager.record_quiz_answers([AnswerEvent(question_id, True, 2.0, session_id=session_id)
+                                         for question_id in range(3, 7)])
+            manager.get_seen_questions('alice')
+            manager.get_stats_version()
+            manager.get_daily_stats()
+            manager.get_daily_stats_range((today - timedelta(days=30)).isoformat(), today.isoformat())
+            manager.get_rollup_series((today - timedelta(days=30)).isoformat(), today.isoformat())
+            manager.get_rollup_totals((today - timedelta(days=400)).isoformat(), today.isoformat())
+            manager.get_response_time_percentiles((today - timedelta(days=30)).isoformat(), today.isoformat())
+            manager.get_response_time_percentiles((today - timedelta(days=7)).isoformat(), today.isoformat(),
+                                                  scope='question', scope_ids=[1, 2, 3])
+            manager.get_distinct_counts((today - timedelta(days=30)).isoformat(), today.isoformat(), 'Capitals')
+            manager.get_distinct_counts_since(datetime.now(timezone.utc) - timedelta(hours=20))
+            manager.get_recent_sessions(limit=20)
+            manager.get_recent_sessions(limit=20, user_id='alice')
+            manager.get_trending_questions(limit=15, period_days=7)
+            manager.get_session_leaderboard(period_days=30, limit=15)
+            manager.get_session_leaderboard(period_days=None, quiz_type='Capitals')
+            manager.get_session_leaderboard(period_days=14)
+            manager.get_question_performance(1)
+            append_manager.end_quiz_session(session_id)
+            manager.get_session_stats(session_id)
+            manager.rollover_weekly_stats()
+        finally:
+            conn.set_trace_callback(None)
+
+        queries = [statement for statement in statements
+                   if statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE', 'INSERT'))]
+        assert len(queries) > 20
+        scans = [scan for statement in queries for scan in _full_scans(conn, statement)]
+        assert not scans, "Full table scans:\n" + "\n".join(scans)
+
+        # Wrapping an indexed column in a function hides it from the index, even when an
+        # equality on another column still makes the plan a SEARCH
+        wrapped = [statement for statement in queries if re.search(r'\bDATE\(\s*\w+\s*\)', statement)]
+        assert not wrapped, "Non-sargable predicates:\n" + "\n".join(wrapped)
@@ -0,0 +1,131 @@
+"""
+Unit tests for the hourly, daily, weekly and monthly stats rollups.
+"""
+import sqlite3
+from datetime import date, datetime, timedelta, timezone
+import pytest
+from utils import stats_rollups
+from utils.quiz_stats import AnswerEvent, QuizStatsManager
+
+
+@pytest.fixture
+def stats_manager(stats_db_path):
+    return QuizStatsManager(stats_db_path)
+
+
+def _days_covered(buckets):
+    days = []
+    for granularity, keys in buckets.items():
+        for key in keys:
+            first = date.fromisoformat(key)
+            last = {'day': first, 'week': first + timedelta(days=6),
+                    'month': stats_rollups._next_month(first) - timedelta(days=1)}[granularity]
+            days += [first + timedelta(days=offset) for offset in range((last - first).days + 1)]
+    return sorted(days)
+
+
+def _day(days_ago):
+    return (date.today() - timedelta(days=days_ago)).isoformat()
+
+
+class TestCover:
+    """Test splitting a range into whole months, weeks and days."""
+
+    @pytest.mark.parametrize('start, end', [
+        (date(2023, 1, 1), date(2023, 12, 31)),
+        (date(2024, 1, 15), date(2024, 3, 20)),
+        (date(2024, 2, 26), date(2024, 4, 2)),
+        (date(2024, 3, 5), date(2024, 3, 5)),
+    ])
+    def test_buckets_cover_range_exactly(self, start, end):
+        buckets = stats_rollups.cover(start, end)
+        assert _days_covered(buckets) == [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+    def test_long_ranges_read_few_buckets(self):
+        assert stats_rollups.cover(date(2023, 1, 1), date(2023, 12, 31))['month'] == \
+            [date(2023, month, 1).isoformat() for month in range(1, 13)]
+        for years in (1, 2, 5):
+            buckets = stats_rollups.cover(date(2020, 1, 17), date(2020 + years, 1, 16))
+            assert sum(len(keys) for keys in buckets.values()) < 12 * years + 20
+
+
+class TestRollups:
+    """Test rollups maintained as answers and sessions are recorded."""
+
+    def test_totals_match_daily_stats(self, stats_manager):
+        stats_manager.record_quiz_answers([
+            AnswerEvent(question_id, question_id % 3 == 0, 1.0 + question_id % 4, date=_day(question_id % 20))
+            for question_id in range(1, 60)])
+        start, end = _day(19), _day(0)
+
+        totals = stats_manager.get_rollup_totals(start, end)
+        days = stats_manager.get_daily_stats_range(start, end)
+        asked = sum(day['summary']['total_questions_asked'] for day in days)
+        correct = sum(day['summary']['total_correct_answers'] for day in days)
+        assert (totals['summary']['total_questions_asked'], totals['summary']['total_correct_answers']) == \
+            (asked, correct)
+
+        categories = {}
+        for day in days:
+            for stat in day['category_stats']:
+                key = (stat['category_id'], stat['subcategory_id'])
+                categories[key] = categories.get(key, 0) + stat['questions_asked']
+        assert {(stat['category_id'], stat['subcategory_id']): stat['questions_asked']
+                for stat in totals['category_stats']} == categories
+        assert {stat['category'] for stat in totals['category_stats']} == {'Geography', 'Science'}
+
+    def test_history_outlives_daily_tables(self, stats_manager):
+        stats_manager.record_quiz_answers([AnswerEvent(1, True, 2.0, date=_day(200)),
+                                           AnswerEvent(1, False, 4.0, date=_day(100)),
+                                           AnswerEvent(2, True, 2.0, date=_day(0))])
+        stats_manager.rollover_weekly_stats()
+        assert stats_manager.get_daily_stats_range(_day(365), _day(0))[0]['date'] == _day(0)
+
+        totals = stats_manager.get_rollup_totals(_day(365), _day(0))
+        assert totals['summary']['total_questions_asked'] == 3
+        assert totals['question_stats'][0] == {'question_id': 1, 'times_asked': 2, 'times_correct': 1,
+                                               'accuracy_rate': 50.0, 'avg_response_time': 3.0}
+        assert stats_manager.get_rollup_totals(_day(150), _day(50))['summary']['total_questions_asked'] == 1
+
+    def test_hourly_series_counts_answers_and_sessions(self, stats_manager):
+        session_id = stats_manager.start_quiz_session('Capitals')
+        stats_manager.record_quiz_answers([AnswerEvent(question_id, True, 2.0, session_id=session_id)
+                                           for question_id in range(1, 4)])
+        stats_manager.end_quiz_session(session_id)
+        stats_manager.end_quiz_session(session_id)
+
+        today = datetime.now(timezone.utc).date().isoformat()
+        series = stats_manager.get_rollup_series(today, today)
+        assert series['granularity'] == 'hour'
+        assert sum(bucket['answers'] for bucket in series['buckets']) == 3
+        assert sum(bucket['sessions_started'] for bucket in series['buckets']) == 1
+        assert sum(bucket['sessions_completed'] for bucket in series['buckets']) == 1
+
+        monthly = stats_manager.get_rollup_series(today, today, granularity='month')['buckets']
+        assert [(bucket['bucket_start'], bucket['answers']) for bucket in monthly] == [(today[:8] + '01', 3)]
+
+    def test_append_only_tail_is_included(self, stats_db_path):
+        manager = QuizStatsManager(stats_db_path, append_only=True)
+        manager.record_quiz_answers([AnswerEvent(1, True, 2.0, date=_day(3)), AnswerEvent(45, False, 1.0)])
+        before = manager.get_rollup_totals(_day(7), _day(0))
+        before_series = manager.get_rollup_series(_day(7), _day(0))
+
+        manager.compact_answer_events()
+        assert manager.get_rollup_totals(_day(7), _day(0)) == before
+        assert manager.get_rollup_series(_day(7), _day(0)) == before_series
+        assert before['summary']['total_questions_asked'] == 2
+
+    def test_rebuild_matches_incremental_rollups(self, stats_manager, stats_db_path):
+        stats_manager.record_quiz_answers([
+            AnswerEvent(question_id, question_id % 2 == 0, 1.5, date=_day(question_id % 25))
+            for question_id in range(1, 50)])
+        stats_manager.end_quiz_session(stats_manager.start_quiz_session('Capitals'))
+
+        query = "SELECT * FROM {} WHERE granularity != 'hour' ORDER BY 1, 2, 3"
+        with sqlite3.connect(stats_db_path) as conn:
+            incremental = {table: conn.execute(query.format(table)).fetchall()
+                           for table in ('rollup_question_stats', 'rollup_category_stats', 'rollup_session_stats')}
+        stats_manager.rebuild_rollups()
+        with sqlite3.connect(stats_db_path) as conn:
+            for table, rows in incremental.items():
+                assert conn.execute(query.format(table)).fetchall() == rows
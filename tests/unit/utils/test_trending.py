@@ -0,0 +1,86 @@
+"""
+Unit tests for the sliding-window trending questions engine.
+"""
+from datetime import date, timedelta
+import pytest
+from utils.quiz_stats import AnswerEvent, QuizStatsManager
+from utils.trending import ORDER_BY_DIFFICULTY, ORDER_BY_VOLUME
+
+
+@pytest.fixture
+def stats_manager(stats_db_path):
+    return QuizStatsManager(stats_db_path)
+
+
+def _answers(question_id, asked, correct, days_ago=0, response_time=2.0):
+    day = (date.today() - timedelta(days=days_ago)).isoformat()
+    return [AnswerEvent(question_id, index < correct, response_time, date=day) for index in range(asked)]
+
+
+def _ids(rows):
+    return [row['question_id'] for row in rows]
+
+
+class TestTrendingEngine:
+    """Test rankings served from the in-memory day buckets."""
+
+    def test_accuracy_is_weighted_by_volume(self, stats_manager):
+        stats_manager.record_quiz_answers(_answers(1, 10, 10, days_ago=1, response_time=1.0) +
+                                          _answers(1, 1, 0, response_time=12.0))
+
+        trending = stats_manager.get_trending_questions(limit=5)
+        assert _ids(trending) == [1]
+        assert trending[0]['total_asked'] == 11
+        assert trending[0]['avg_accuracy'] == pytest.approx(1000 / 11)
+        assert trending[0]['avg_response_time'] == pytest.approx(2.0)
+        assert trending[0]['category'] == 'Geography'
+
+    def test_matches_database_ranking(self, stats_manager):
+        for question_id in range(1, 25):
+            stats_manager.record_quiz_answers(_answers(question_id, question_id % 6 + 1, question_id % 4,
+                                                       days_ago=question_id % 9))
+
+        for order_by in (ORDER_BY_VOLUME, ORDER_BY_DIFFICULTY):
+            for period_days in (1, 7, 30):
+                expected = stats_manager._query_trending_questions(8, period_days, order_by)
+                trending = stats_manager.get_trending_questions(limit=8, period_days=period_days, order_by=order_by)
+                assert [(row['question_id'], row['total_asked'], row['total_correct']) for row in trending] == \
+                    [(row['question_id'], row['total_asked'], row['total_correct']) for row in expected]
+
+    def test_new_answers_are_counted(self, stats_manager):
+        stats_manager.record_quiz_answers(_answers(1, 3, 3))
+        assert _ids(stats_manager.get_trending_questions()) == [1]
+
+        stats_manager.record_quiz_answers(_answers(2, 4, 0))
+        append_manager = QuizStatsManager(stats_manager.db_path, append_only=True)
+        append_manager.record_quiz_answers(_answers(1, 2, 2))
+        # Answers from another writer show up once the recent buckets are re-read
+        stats_manager.trending.invalidate()
+
+        trending = stats_manager.get_trending_questions()
+        assert [(row['question_id'], row['total_asked']) for row in trending] == [(1, 5), (2, 4)]
+        assert _ids(stats_manager.get_trending_questions(order_by=ORDER_BY_DIFFICULTY)) == [2, 1]
+
+    def test_old_buckets_leave_the_window(self, stats_manager, monkeypatch):
+        stats_manager.record_quiz_answers(_answers(1, 5, 5, days_ago=5) + _answers(2, 3, 1))
+        engine = stats_manager.trending
+        assert _ids(engine.top(period_days=7)) == [1, 2]
+
+        # Three days later question 1's bucket is outside the 7-day period and its ring slot
+        # comes back around for a new day after window_days
+        monkeypatch.setattr(engine, '_today', lambda: date.today() + timedelta(days=3))
+        engine.invalidate()
+        assert _ids(engine.top(period_days=7)) == [2]
+        assert _ids(engine.top(period_days=30)) == [1, 2]
+
+        monkeypatch.setattr(engine, '_today', lambda: date.today() + timedelta(days=engine.window_days + 5))
+        engine.invalidate()
+        assert engine.top(period_days=30) == []
+        assert engine.get_stats()['loads'] == 1
+
+    def test_long_periods_use_database(self, stats_manager):
+        stats_manager.record_quiz_answers(_answers(1, 3, 1, days_ago=40))
+        assert stats_manager.get_trending_questions(period_days=7) == []
+        assert _ids(stats_manager.get_trending_questions(period_days=60)) == [1]
+        with pytest.raises(ValueError):
+            stats_manager.trending.top(period_days=60)
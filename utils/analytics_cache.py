@@ -0,0 +1,203 @@
+"""
+Shared cache of analytics dashboard snapshots.
+
+Every open analytics tab refreshes on a timer, and the data it shows is the same
+for everyone looking at the same date range. Snapshots are cached per key (the date
+range and query parameters) for ``ttl`` seconds. Concurrent refreshes of a key that
+is not cached share a single computation. Callers put the stats version in the key,
+so a write from any process moves readers to a new key at once; snapshots of older
+versions simply age out.
+
+Computed snapshots are also published to an AnalyticsSnapshotStore under a random
+token. The page keeps only that token in the browser, and each chart and table
+callback looks up its own section of the snapshot on the server.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, NamedTuple, Optional, Tuple
+
+
+class _Snapshot(NamedTuple):
+    value: Any
+    created: float
+    generation: int
+
+
+class AnalyticsSnapshotCache:
+    """
+    TTL-bounded, single-flight cache of computed analytics snapshots
+    """
+
+    def __init__(self, ttl: float = 30.0, max_entries: int = 64):
+        """
+        Args:
+            ttl: Seconds a snapshot is served before it is recomputed
+            max_entries: Maximum number of cached keys; the oldest snapshot is evicted first
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._snapshots: Dict[Hashable, _Snapshot] = {}
+        self._in_flight: Dict[Hashable, Future] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evicted = 0
+
+    def get(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        Get the snapshot for a key, computing it if it is missing or expired
+
+        If another thread is already computing the key, wait for its result instead
+        of computing it again. Failed computations are not cached.
+
+        Args:
+            key: Hashable cache key, e.g. (start_date, end_date, today)
+            compute: Function returning a fresh snapshot
+
+        Returns:
+            The cached or freshly computed snapshot
+        """
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+            if (snapshot is not None and snapshot.generation == self._generation
+                    and time.monotonic() - snapshot.created < self.ttl):
+                self.hits += 1
+                return snapshot.value
+
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                self.misses += 1
+                future = self._in_flight[key] = Future()
+                generation = self._generation
+            else:
+                self.shared += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._in_flight.pop(key, None)
+            # A snapshot computed across an invalidation may miss that write: serve it, don't keep it
+            if generation == self._generation:
+                self._snapshots.pop(key, None)
+                if len(self._snapshots) >= self.max_entries:
+                    oldest = min(self._snapshots, key=lambda k: self._snapshots[k].created)
+                    del self._snapshots[oldest]
+                    self.evicted += 1
+                self._snapshots[key] = _Snapshot(value, time.monotonic(), generation)
+        future.set_result(value)
+        return value
+
+    def invalidate(self):
+        """Drop every snapshot, e.g. after statistics were written"""
+        with self._lock:
+            self._generation += 1
+            self._snapshots.clear()
+            self.invalidations += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit ratio and snapshot age for monitoring"""
+        with self._lock:
+            now = time.monotonic()
+            ages = [now - snapshot.created for snapshot in self._snapshots.values()]
+            lookups = self.hits + self.shared + self.misses
+            return {
+                'entries': len(self._snapshots),
+                'in_flight': len(self._in_flight),
+                'hits': self.hits,
+                'shared': self.shared,
+                'misses': self.misses,
+                'hit_rate': ((self.hits + self.shared) / lookups) if lookups > 0 else 0.0,
+                'invalidations': self.invalidations,
+                'evicted': self.evicted,
+                'oldest_age_seconds': round(max(ages), 3) if ages else None,
+                'newest_age_seconds': round(min(ages), 3) if ages else None,
+                'ttl_seconds': self.ttl
+            }
+
+
+class AnalyticsSnapshotStore:
+    """
+    Token-addressed store of published snapshots, kept for a retention period
+    """
+
+    def __init__(self, retention: float = 300.0, max_entries: int = 128):
+        """
+        Args:
+            retention: Seconds a published snapshot stays readable by its token
+            max_entries: Maximum number of published snapshots; the oldest is dropped first
+        """
+        self.retention = retention
+        self.max_entries = max_entries
+        self._snapshots: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.published = 0
+        self.hits = 0
+        self.misses = 0
+
+    def put(self, snapshot: Any) -> str:
+        """
+        Publish a snapshot
+
+        Returns:
+            Token to read the snapshot back with
+        """
+        token = uuid.uuid4().hex
+        with self._lock:
+            self._expire(time.monotonic())
+            while len(self._snapshots) >= self.max_entries:
+                self._snapshots.popitem(last=False)
+            self._snapshots[token] = (snapshot, time.monotonic())
+            self.published += 1
+        return token
+
+    def get(self, token: Optional[str]) -> Optional[Any]:
+        """Get a published snapshot, or None if the token is unknown or has expired"""
+        with self._lock:
+            self._expire(time.monotonic())
+            entry = self._snapshots.get(token) if token else None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[0]
+
+    def _expire(self, now: float):
+        # Entries are in publication order, so expired ones are at the front
+        while self._snapshots:
+            token, (_, created) = next(iter(self._snapshots.items()))
+            if now - created < self.retention:
+                break
+            del self._snapshots[token]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get publication and lookup counters for monitoring"""
+        with self._lock:
+            return {
+                'entries': len(self._snapshots),
+                'published': self.published,
+                'hits': self.hits,
+                'misses': self.misses,
+                'retention_seconds': self.retention
+            }
+
+
+# Initialize default snapshot cache, refreshed on the dashboard's 30 second interval
+analytics_cache = AnalyticsSnapshotCache(ttl=30.0)
+# Published snapshots outlive the cache so a page can finish reading the one it was given
+analytics_store = AnalyticsSnapshotStore(retention=300.0)
@@ -0,0 +1,295 @@
+"""
+Write-behind recording of quiz answers.
+
+With write-behind enabled (QUIZ_STATS_WRITE_BEHIND=1), answer clicks only put an
+AnswerEvent on an in-process queue. A background writer thread drains the queue
+and writes the answers in batches of one transaction each, flushing when a batch
+is full or when the oldest queued answer has waited flush_interval seconds.
+Without it, answers are written synchronously as before.
+
+A batch that fails to write stays with the writer thread and is retried, together
+with the answers queued in the meantime, with exponential backoff. It is given up
+(and counted as failed) after max_attempts failed writes.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set
+from .quiz_stats import AnswerEvent, QuizStatsManager, quiz_stats
+from .stats_aggregator import AggregatorClient, aggregator_socket_path
+
+# Queue markers handled by the writer thread
+_FLUSH = object()
+_STOP = object()
+
+
+def write_behind_enabled() -> bool:
+    """Whether write-behind answer recording is switched on in the environment"""
+    return os.environ.get('QUIZ_STATS_WRITE_BEHIND', '').lower() in ('1', 'true', 'yes', 'on')
+
+
+class BufferedAnswerRecorder:
+    """
+    Records quiz answers either synchronously or through a batching writer thread
+    """
+
+    def __init__(self, stats_manager: QuizStatsManager, enabled: bool = True, max_batch: int = 100,
+                 flush_interval: float = 0.5, max_queue: int = 10000, max_attempts: int = 5,
+                 retry_base_delay: float = 0.5):
+        """
+        Args:
+            stats_manager: Statistics manager the answers are written with, or an
+                AggregatorClient forwarding them to the stats aggregator
+            enabled: Queue answers for the writer thread instead of writing them synchronously
+            max_batch: Maximum number of answers written per transaction
+            flush_interval: Seconds an answer may wait in the queue before its batch is written
+            max_queue: Queue size above which answers are written synchronously instead
+            max_attempts: Failed writes after which a batch is given up
+            retry_base_delay: Seconds before the first retry of a failed batch, doubled per failure
+        """
+        self.stats_manager = stats_manager
+        self.enabled = enabled
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self._queue: 'queue.Queue' = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._done = threading.Condition(self._lock)
+        self._stopped = False
+        # Sessions ended before their answers were all written, re-ended by the next good flush
+        self._unsettled_sessions: Set[str] = set()
+        self.enqueued = 0
+        self.written = 0
+        self.failed = 0
+        self.retries = 0
+        self.overflow = 0
+        self.batches = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    def _ensure_started(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='answer-writer', daemon=True)
+            self._thread.start()
+
+    def record(self, session_id: str, question_id: int, is_correct: bool, response_time: float,
+               user_answer: str = None, user_id: str = None, event_id: str = None):
+        """
+        Record an answer and its session statistics
+
+        Args:
+            session_id: Session identifier
+            question_id: ID of the question answered
+            is_correct: Whether the answer was correct
+            response_time: Time taken to answer in seconds
+            user_answer: The answer provided by the user
+            user_id: Optional username whose seen questions should be updated
+            event_id: Optional idempotency key, see quiz_stats.answer_event_id
+        """
+        answer = AnswerEvent(
+            question_id=question_id,
+            is_correct=is_correct,
+            response_time=response_time,
+            session_id=session_id,
+            user_answer=user_answer,
+            user_id=user_id,
+            event_id=event_id
+        )
+        with self._lock:
+            queued = self.enabled and not self._stopped
+            if queued:
+                self._ensure_started()
+                try:
+                    self._queue.put_nowait(answer)
+                    self.enqueued += 1
+                except queue.Full:
+                    self.overflow += 1
+                    queued = False
+        if not queued:
+            self._write([answer])
+
+    def _run(self):
+        """Writer thread: collect answers into batches and write them, retrying failed batches"""
+        batch: List[AnswerEvent] = []
+        attempts = 0
+        # When the batch is written: flush_interval after its first answer, or the next retry
+        deadline: Optional[float] = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            stop = item is _STOP
+            if isinstance(item, AnswerEvent):
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                # While a retry is due, answers keep joining the batch until the retry
+                if (attempts or len(batch) < self.max_batch) and time.monotonic() < deadline:
+                    continue
+            # A flush retries a failed batch at once: the caller is waiting to end a session
+            deadline = None
+            if batch:
+                if self._write(batch):
+                    self._settle(written=len(batch))
+                    batch = []
+                    attempts = 0
+                else:
+                    attempts += 1
+                    if attempts >= self.max_attempts or stop:
+                        logging.error("Giving up on %d quiz answers after %d failed writes", len(batch), attempts)
+                        self._settle(failed=len(batch))
+                        batch = []
+                        attempts = 0
+                    else:
+                        delay = self.retry_base_delay * (2 ** (attempts - 1))
+                        deadline = time.monotonic() + delay
+                        self.retries += 1
+                        logging.warning("Retrying %d quiz answers in %.1fs", len(batch), delay)
+            if stop:
+                return
+
+    def _settle(self, written: int = 0, failed: int = 0):
+        """Count answers the writer thread is done with and wake flush() callers"""
+        with self._done:
+            self.written += written
+            self.failed += failed
+            self._done.notify_all()
+
+    def _write(self, answers: List[AnswerEvent]) -> bool:
+        """Write answers and their session counters in one transaction"""
+        start = time.perf_counter()
+        try:
+            self.stats_manager.record_quiz_answers(answers)
+        except Exception as e:
+            logging.error("Failed to write %d quiz answers: %s", len(answers), e)
+            return False
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.batches += 1
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        self._total_flush_ms += elapsed_ms
+        return True
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """
+        Write every answer queued so far, e.g. before a session is ended
+
+        Args:
+            timeout: Maximum seconds to wait
+
+        Returns:
+            True if all queued answers were written within the timeout
+        """
+        with self._done:
+            target = self.enqueued
+            failed = self.failed
+            drained = self.written + self.failed >= target
+            if not drained:
+                try:
+                    self._queue.put_nowait(_FLUSH)
+                except queue.Full:
+                    pass
+                drained = self._done.wait_for(lambda: self.written + self.failed >= target, timeout)
+            drained = drained and self.failed == failed
+        
+        # Answers handed to the stats aggregator must be committed there as well
+        if isinstance(self.stats_manager, AggregatorClient):
+            drained = self.stats_manager.flush(timeout) and drained
+        if drained:
+            self._settle_sessions()
+        return drained
+
+    def _sessions_manager(self) -> QuizStatsManager:
+        """Statistics manager that ends sessions: the aggregator client's direct writer if one is used"""
+        if isinstance(self.stats_manager, AggregatorClient):
+            return self.stats_manager.fallback
+        return self.stats_manager
+
+    def end_session(self, session_id: str, timeout: float = 5.0) -> Optional[Dict]:
+        """
+        Write the session's queued answers and end the session
+
+        The session is ended even if its answers could not all be written in time, so it
+        never stays active. Its statistics and leaderboard places are then recomputed by
+        the next flush that writes everything, once the late answers are in.
+
+        Args:
+            session_id: Session identifier to end
+            timeout: Maximum seconds to wait for the session's answers
+
+        Returns:
+            Final session statistics, as returned by end_quiz_session
+        """
+        if not self.flush(timeout):
+            logging.warning("Ending quiz session %s before all its answers are written; "
+                            "it is finalized again after the next complete flush", session_id)
+            with self._lock:
+                self._unsettled_sessions.add(session_id)
+        return self._sessions_manager().end_quiz_session(session_id)
+
+    def _settle_sessions(self):
+        """Re-end sessions that were ended before all their answers were written"""
+        with self._lock:
+            sessions = list(self._unsettled_sessions)
+            self._unsettled_sessions.clear()
+        for session_id in sessions:
+            try:
+                self._sessions_manager().end_quiz_session(session_id)
+            except Exception as e:
+                logging.error("Failed to finalize quiz session %s: %s", session_id, e)
+                with self._lock:
+                    self._unsettled_sessions.add(session_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get queue depth and flush latency metrics for monitoring"""
+        return {
+            'enabled': self.enabled,
+            'queue_depth': self.enqueued - self.written - self.failed,
+            'enqueued': self.enqueued,
+            'written': self.written,
+            'failed': self.failed,
+            'retries': self.retries,
+            'unsettled_sessions': len(self._unsettled_sessions),
+            'overflow': self.overflow,
+            'batches': self.batches,
+            'last_flush_ms': round(self.last_flush_ms, 3),
+            'avg_flush_ms': round(self._total_flush_ms / self.batches, 3) if self.batches else 0.0,
+            'max_flush_ms': round(self.max_flush_ms, 3),
+            'aggregator': (self.stats_manager.get_stats()
+                           if isinstance(self.stats_manager, AggregatorClient) else None)
+        }
+
+    def shutdown(self, timeout: float = 10.0):
+        """Drain the queue and stop the writer thread"""
+        with self._lock:
+            if self._stopped:
+                return
+            self._stopped = True
+            thread = self._thread
+        if thread is not None:
+            try:
+                self._queue.put(_STOP, timeout=timeout)
+            except queue.Full:
+                logging.error("Answer queue still full at shutdown; %d answers not written",
+                              self.enqueued - self.written - self.failed)
+                return
+            thread.join(timeout)
+
+
+def _default_writer():
+    """Send answers to the stats aggregator when one is configured, else write directly"""
+    socket_path = aggregator_socket_path()
+    return AggregatorClient(socket_path, quiz_stats) if socket_path else quiz_stats
+
+
+# Initialize default recorder
+answer_recorder = BufferedAnswerRecorder(_default_writer(), enabled=write_behind_enabled())
+atexit.register(answer_recorder.shutdown)
@@ -0,0 +1,217 @@
+"""
+Non-blocking access to quiz statistics for Dash callbacks.
+
+AsyncQuizStatsManager runs QuizStatsManager reads on a small pool of reader
+threads, each with its own pooled WAL connection, and returns
+concurrent.futures.Future objects, so independent analytics queries run
+concurrently:
+
+    today = async_quiz_stats.get_daily_stats()
+    sessions = async_quiz_stats.get_recent_sessions(limit=20)
+    today.result(), sessions.result()
+
+From asyncio code, wrap a future with asyncio.wrap_future() to await it.
+
+Reads beyond max_pending_reads queued or running at once run on the calling thread
+instead of piling up in the pool's queue. Answer writes and session ends do not go
+through this facade: the answer recorder (utils.answer_recorder) batches them and
+routes them to the stats aggregator when one runs. start_quiz_session is the one
+write here, and it commits before returning.
+"""
+import atexit
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+from .quiz_stats import QuizStatsManager, quiz_stats
+
+
+class AsyncQuizStatsManager:
+    """
+    Runs statistics reads on a bounded reader pool
+    """
+
+    def __init__(self, stats_manager: QuizStatsManager, max_readers: int = 4, max_pending_reads: int = 64):
+        """
+        Args:
+            stats_manager: Statistics manager the operations are run on
+            max_readers: Maximum number of reads running at once
+            max_pending_reads: Queued and running reads above which reads run synchronously instead
+        """
+        self.stats_manager = stats_manager
+        self.max_readers = max_readers
+        self.max_pending_reads = max_pending_reads
+        self._readers = ThreadPoolExecutor(max_workers=max_readers, thread_name_prefix='stats-reader')
+        self._read_slots = threading.BoundedSemaphore(max_pending_reads)
+        self._lock = threading.Lock()
+        self._stopped = False
+        self._pending_reads = 0
+        self.reads = 0
+        self.failed = 0
+        self.overflow = 0
+
+    def submit_read(self, method: str, *args, **kwargs) -> Future:
+        """
+        Run a QuizStatsManager read method on the reader pool
+
+        Args:
+            method: Name of the QuizStatsManager method to call
+            *args, **kwargs: Arguments passed to the method
+
+        Returns:
+            Future resolving to the method's return value
+        """
+        function = getattr(self.stats_manager, method)
+        with self._lock:
+            stopped = self._stopped
+        if stopped or not self._read_slots.acquire(blocking=False):
+            # Pool backed up or shutting down: read on the calling thread rather than queue without bound
+            if not stopped:
+                self.overflow += 1
+            return self._run_now(method, function, args, kwargs)
+
+        def run():
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self._release_read_slot()
+
+        with self._lock:
+            self._pending_reads += 1
+        try:
+            future = self._readers.submit(run)
+        except RuntimeError:
+            # The executor was shut down after the check above
+            self._release_read_slot()
+            return self._run_now(method, function, args, kwargs)
+        self.reads += 1
+        future.add_done_callback(lambda done: self._log_failure(method, done))
+        return future
+
+    def _release_read_slot(self):
+        with self._lock:
+            self._pending_reads -= 1
+        self._read_slots.release()
+
+    def _run_now(self, method: str, function: Callable, args: tuple, kwargs: dict) -> Future:
+        """Run an operation on the calling thread and return its outcome as a completed future"""
+        future: Future = Future()
+        try:
+            future.set_result(function(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+            self._log_failure(method, future)
+        return future
+
+    def _log_failure(self, method: str, future: Future):
+        if not future.cancelled() and future.exception() is not None:
+            self.failed += 1
+            logging.error("Stats operation %s failed: %s", method, future.exception())
+
+    # Writes
+
+    def start_quiz_session(self, session_name: str = None, user_id: str = None,
+                           category_filter: str = None) -> str:
+        """
+        Start a quiz session on the calling thread and return its ID
+
+        The session row is committed before the ID is returned, because answers for the
+        session reach the database through other writers (the answer recorder or the
+        stats aggregator).
+
+        Returns:
+            String session ID
+        """
+        return self.stats_manager.start_quiz_session(session_name=session_name, user_id=user_id,
+                                                     category_filter=category_filter)
+
+    # Reads
+
+    def get_stats_version(self) -> Future:
+        """Run QuizStatsManager.get_stats_version on the reader pool"""
+        return self.submit_read('get_stats_version')
+
+    def get_daily_stats(self, date_str: str = None) -> Future:
+        """Run QuizStatsManager.get_daily_stats on the reader pool"""
+        return self.submit_read('get_daily_stats', date_str)
+
+    def get_daily_stats_range(self, start_date: str, end_date: str) -> Future:
+        """Run QuizStatsManager.get_daily_stats_range on the reader pool"""
+        return self.submit_read('get_daily_stats_range', start_date, end_date)
+
+    def get_rollup_series(self, start_date: str, end_date: str, granularity: str = None) -> Future:
+        """Run QuizStatsManager.get_rollup_series on the reader pool"""
+        return self.submit_read('get_rollup_series', start_date, end_date, granularity=granularity)
+
+    def get_rollup_totals(self, start_date: str, end_date: str) -> Future:
+        """Run QuizStatsManager.get_rollup_totals on the reader pool"""
+        return self.submit_read('get_rollup_totals', start_date, end_date)
+
+    def get_response_time_percentiles(self, start_date: str, end_date: str, scope: str = 'all',
+                                      scope_ids: Optional[List[int]] = None) -> Future:
+        """Run QuizStatsManager.get_response_time_percentiles on the reader pool"""
+        return self.submit_read('get_response_time_percentiles', start_date, end_date,
+                                scope=scope, scope_ids=scope_ids)
+
+    def get_distinct_counts(self, start_date: str, end_date: str, quiz_type: str = None) -> Future:
+        """Run QuizStatsManager.get_distinct_counts on the reader pool"""
+        return self.submit_read('get_distinct_counts', start_date, end_date, quiz_type=quiz_type)
+
+    def get_distinct_counts_since(self, since: datetime, quiz_type: str = None) -> Future:
+        """Run QuizStatsManager.get_distinct_counts_since on the reader pool"""
+        return self.submit_read('get_distinct_counts_since', since, quiz_type=quiz_type)
+
+    def get_recent_sessions(self, limit: int = 10, user_id: str = None) -> Future:
+        """Run QuizStatsManager.get_recent_sessions on the reader pool"""
+        return self.submit_read('get_recent_sessions', limit=limit, user_id=user_id)
+
+    def get_trending_questions(self, limit: int = 10, period_days: int = 7,
+                               order_by: str = 'volume') -> Future:
+        """Run QuizStatsManager.get_trending_questions on the reader pool"""
+        return self.submit_read('get_trending_questions', limit=limit, period_days=period_days,
+                                order_by=order_by)
+
+    def get_session_leaderboard(self, period_days: int = 7, limit: int = 10, quiz_type: str = None) -> Future:
+        """Run QuizStatsManager.get_session_leaderboard on the reader pool"""
+        return self.submit_read('get_session_leaderboard', period_days=period_days, limit=limit,
+                                quiz_type=quiz_type)
+
+    def get_session_stats(self, session_id: str) -> Future:
+        """Run QuizStatsManager.get_session_stats on the reader pool"""
+        return self.submit_read('get_session_stats', session_id)
+
+    def get_question_performance(self, question_id: int, days: int = 7) -> Future:
+        """Run QuizStatsManager.get_question_performance on the reader pool"""
+        return self.submit_read('get_question_performance', question_id, days=days)
+
+    def get_seen_questions(self, user_id: str) -> Future:
+        """Run QuizStatsManager.get_seen_questions on the reader pool"""
+        return self.submit_read('get_seen_questions', user_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get queue and failure counters for monitoring"""
+        return {
+            'pending_reads': self._pending_reads,
+            'reads': self.reads,
+            'failed': self.failed,
+            'overflow': self.overflow,
+            'max_readers': self.max_readers
+        }
+
+    def shutdown(self, wait: bool = True):
+        """
+        Stop accepting queued reads and, by default, finish the queued ones
+
+        Reads submitted after shutdown run synchronously on the calling thread.
+        """
+        with self._lock:
+            if self._stopped:
+                return
+            self._stopped = True
+        self._readers.shutdown(wait=wait)
+
+
+# Initialize default async facade over the shared statistics manager
+async_quiz_stats = AsyncQuizStatsManager(quiz_stats)
+atexit.register(async_quiz_stats.shutdown)
@@ -1,19 +1,34 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Iterator
+import os
 import sqlite3
+from .db_connections import connection_manager
+
+# Database used by the module-level instances; QUIZ_DB_PATH points them elsewhere (e.g. in tests)
+DEFAULT_DB_PATH = os.environ.get('QUIZ_DB_PATH', "data/quiz_database.db")
+
+# Largest number of "?" placeholders used in one IN (...) lookup (SQLite's historical limit is 999)
+MAX_SQL_VARIABLES = 900
+
+
+def chunked(values: Iterable, size: int = MAX_SQL_VARIABLES) -> Iterator[list]:
+    """Split values into lists small enough for one IN (...) lookup each"""
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
 
 class QuizDatabase:
     """
     Simple utility class for interacting with the quiz SQLite database
     """
     
-    def __init__(self, db_path: str = "data/quiz_database.db"):
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, readonly: bool = False):
         self.db_path = db_path
+        self.readonly = readonly
     
     def get_connection(self) -> sqlite3.Connection:
-        """Get a database connection"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row  # Enable dict-like access to rows
-        return conn
+        """Get this thread's pooled database connection"""
+        return connection_manager.get_connection(self.db_path, readonly=self.readonly)
     
     def execute_query(self, query: str, params: tuple = ()) -> List[Dict[str, Any]]:
         """
@@ -25,5 +40,5 @@ class QuizDatabase:
             rows = cursor.fetchall()
             return [dict(row) for row in rows]
 
-# Initialize default database instance
-quiz_db = QuizDatabase()
+# Initialize default database instance (content queries only, so read-only)
+quiz_db = QuizDatabase(readonly=True)
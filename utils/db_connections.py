@@ -0,0 +1,150 @@
+"""
+Shared SQLite connection layer.
+
+Connections are opened once per thread, database and mode, and reused for every
+later query on that thread instead of reconnecting each time. Read-write
+connections switch the database to WAL so readers never block the stats writer;
+read-only connections are opened through a ``mode=ro`` URI for content queries.
+"""
+import atexit
+import logging
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Tuple
+from urllib.parse import quote
+
+# Milliseconds a statement waits on a locked database before failing
+BUSY_TIMEOUT_MS = 5000
+# Page cache per connection in KiB (negative cache_size is interpreted as KiB)
+CACHE_SIZE_KIB = 16384
+# Prepared statement cache per connection; covers the fixed stats and content
+# queries plus the IN (...) variants generated for different batch sizes
+CACHED_STATEMENTS = 256
+
+
+class ConnectionManager:
+    """
+    Per-thread pool of configured SQLite connections
+    """
+
+    def __init__(self, busy_timeout_ms: int = BUSY_TIMEOUT_MS, cache_size_kib: int = CACHE_SIZE_KIB,
+                 cached_statements: int = CACHED_STATEMENTS):
+        """
+        Args:
+            busy_timeout_ms: Milliseconds to wait on a locked database
+            cache_size_kib: Page cache size per connection in KiB
+            cached_statements: Number of prepared statements cached per connection
+        """
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cache_size_kib = cache_size_kib
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: Dict[Tuple[int, str, bool], sqlite3.Connection] = {}
+        self._pid = os.getpid()
+        self.opened = 0
+        self.reused = 0
+        self.closed = 0
+
+    def get_connection(self, db_path: str, readonly: bool = False) -> sqlite3.Connection:
+        """
+        Get this thread's connection to a database, opening it on first use
+
+        Args:
+            db_path: Path to the SQLite database
+            readonly: Open the database read-only
+
+        Returns:
+            Connection with sqlite3.Row rows; use it as a context manager to commit or roll back
+        """
+        if os.getpid() != self._pid:
+            self._reset_after_fork()
+
+        key = (os.path.abspath(db_path), readonly)
+        connections = getattr(self._local, 'connections', None)
+        if connections is None:
+            connections = self._local.connections = {}
+        conn = connections.get(key)
+        if conn is not None:
+            self.reused += 1
+            return conn
+
+        conn = self._connect(key[0], readonly)
+        connections[key] = conn
+        with self._lock:
+            self.opened += 1
+            self._close_dead_threads()
+            previous = self._connections.get((threading.get_ident(),) + key)
+            if previous is not None:
+                self._close(previous)
+            self._connections[(threading.get_ident(),) + key] = conn
+        return conn
+
+    def _connect(self, db_path: str, readonly: bool) -> sqlite3.Connection:
+        # Each connection is only used by its owning thread; the same-thread check is
+        # disabled so the pool can close connections of exited threads and at shutdown
+        options = dict(timeout=self.busy_timeout_ms / 1000, cached_statements=self.cached_statements,
+                       check_same_thread=False)
+        if readonly:
+            conn = sqlite3.connect(f"file:{quote(db_path)}?mode=ro", uri=True, **options)
+        else:
+            conn = sqlite3.connect(db_path, **options)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        conn.execute(f"PRAGMA cache_size = {-int(self.cache_size_kib)}")
+        if not readonly:
+            journal_mode = conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+            if journal_mode.lower() != 'wal':
+                logging.warning("Could not enable WAL for %s (journal_mode=%s)", db_path, journal_mode)
+            conn.execute("PRAGMA synchronous = NORMAL")
+        logging.debug("Opened %s SQLite connection to %s", "read-only" if readonly else "read-write", db_path)
+        return conn
+
+    def _close(self, conn: sqlite3.Connection):
+        try:
+            conn.close()
+        except sqlite3.Error as e:
+            logging.warning("Failed to close SQLite connection: %s", e)
+        self.closed += 1
+
+    def _close_dead_threads(self):
+        """Close connections owned by threads that have exited (caller holds the lock)"""
+        alive = {thread.ident for thread in threading.enumerate()}
+        for key in [key for key in self._connections if key[0] not in alive]:
+            self._close(self._connections.pop(key))
+
+    def _reset_after_fork(self):
+        """Forget connections inherited from the parent process; they must not be shared"""
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = {}
+        self._pid = os.getpid()
+
+    def close_all(self):
+        """Close every pooled connection, e.g. at shutdown or after replacing a database file"""
+        with self._lock:
+            for conn in self._connections.values():
+                self._close(conn)
+            self._connections.clear()
+        self._local = threading.local()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get pool counters for monitoring"""
+        with self._lock:
+            open_connections = len(self._connections)
+            readonly = sum(1 for key in self._connections if key[2])
+            threads = len({key[0] for key in self._connections})
+        return {
+            'open_connections': open_connections,
+            'readonly_connections': readonly,
+            'threads': threads,
+            'opened': self.opened,
+            'reused': self.reused,
+            'closed': self.closed
+        }
+
+
+# Initialize default connection manager
+connection_manager = ConnectionManager()
+atexit.register(connection_manager.close_all)
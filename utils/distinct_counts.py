@@ -0,0 +1,211 @@
+"""
+HyperLogLog counters of distinct players and sessions.
+
+A HyperLogLog estimates how many distinct values it has seen from the longest run
+of leading zero bits in their hashes, kept in 2^precision small registers. Two
+counters merge by taking the larger of each register, so hourly and daily
+counters combine into any range without counting a player twice. With the
+default precision of 12 the estimate is within about 1.6% (one standard error)
+and a counter takes at most 4 KB; counters of a few values are stored sparsely
+in a few bytes.
+
+The distinct_counts table keeps one counter per kind ('users' or 'sessions'),
+granularity ('hour' or 'day'), quiz type and UTC bucket. Every value is also
+added to the ALL_QUIZ_TYPES counter of its bucket, so totals need no merge over
+quiz types. Hourly counters follow the hourly rollup retention, daily ones the
+daily rollup retention.
+"""
+import hashlib
+import math
+import sqlite3
+import struct
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from .sketches import read_varint, write_varint
+from .session_leaderboard import ALL_QUIZ_TYPES
+from .stats_rollups import DAILY_RETENTION_DAYS, HOURLY_RETENTION_DAYS, bucket_start
+
+HLL_FORMAT_VERSION = 1
+DEFAULT_PRECISION = 12
+DISTINCT_KINDS = ('users', 'sessions')
+DISTINCT_GRANULARITIES = ('hour', 'day')
+
+_DENSE = 0
+_SPARSE = 1
+# 2^-rank for every possible register value
+_INVERSE_POWERS = [2.0 ** -rank for rank in range(65)]
+
+
+def _hash(value: str) -> int:
+    # Stable across processes, unlike hash()
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class HyperLogLog:
+    """
+    Mergeable estimator of the number of distinct strings added
+    """
+
+    def __init__(self, precision: int = DEFAULT_PRECISION):
+        """
+        Args:
+            precision: log2 of the number of registers (4 to 16)
+        """
+        if not 4 <= precision <= 16:
+            raise ValueError("HyperLogLog precision must be between 4 and 16")
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, value: str) -> bool:
+        """
+        Add a value
+
+        Returns:
+            Whether a register changed, i.e. whether the counter needs to be stored again
+        """
+        hashed = _hash(value)
+        index = hashed >> (64 - self.precision)
+        remaining = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = 64 - self.precision - remaining.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            return True
+        return False
+
+    def add_all(self, values: Iterable[str]) -> bool:
+        changed = False
+        for value in values:
+            changed = self.add(value) or changed
+        return changed
+
+    def merge(self, other: 'HyperLogLog'):
+        """Add every value of another counter with the same precision"""
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog counters with different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        """Estimate the number of distinct values added"""
+        size = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / size)
+        estimate = alpha * size * size / sum(_INVERSE_POWERS[rank] for rank in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * size and zeros:
+            # Linear counting is more accurate while many registers are still empty
+            estimate = size * math.log(size / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self) -> bytes:
+        """Serialize the counter, sparsely while most registers are empty"""
+        nonzero = [(index, rank) for index, rank in enumerate(self.registers) if rank]
+        if len(nonzero) * 3 >= len(self.registers):
+            return struct.pack('<BBB', HLL_FORMAT_VERSION, self.precision, _DENSE) + bytes(self.registers)
+        out = bytearray(struct.pack('<BBB', HLL_FORMAT_VERSION, self.precision, _SPARSE))
+        write_varint(out, len(nonzero))
+        previous = 0
+        for index, rank in nonzero:
+            # Delta-encoded register indexes
+            write_varint(out, index - previous)
+            out.append(rank)
+            previous = index
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'HyperLogLog':
+        """Deserialize a counter written by to_bytes"""
+        version, precision, encoding = struct.unpack_from('<BBB', data)
+        if version != HLL_FORMAT_VERSION:
+            raise ValueError(f"Unsupported HyperLogLog format version: {version}")
+        counter = cls(precision)
+        offset = struct.calcsize('<BBB')
+        if encoding == _DENSE:
+            counter.registers = bytearray(data[offset:offset + len(counter.registers)])
+            return counter
+        size, offset = read_varint(data, offset)
+        index = 0
+        for _ in range(size):
+            delta, offset = read_varint(data, offset)
+            index += delta
+            counter.registers[index] = data[offset]
+            offset += 1
+        return counter
+
+
+def counter_keys(quiz_type: Optional[str], day: date, hour: int) -> List[Tuple[str, str, str]]:
+    """(granularity, quiz type, bucket) keys of the counters a value seen at a UTC hour is added to"""
+    quiz_types = {ALL_QUIZ_TYPES, quiz_type or ALL_QUIZ_TYPES}
+    return [(granularity, each_type, bucket_start(granularity, day, hour))
+            for granularity in DISTINCT_GRANULARITIES for each_type in quiz_types]
+
+
+def add_values(cursor: sqlite3.Cursor, values: Dict[Tuple[str, str, str, str], Set[str]]):
+    """
+    Add values to the stored counters, inside the caller's write transaction
+
+    Counters whose registers don't change (a player already counted in the bucket)
+    are not written again.
+
+    Args:
+        cursor: Cursor of a transaction that already holds the write lock
+        values: (kind, granularity, quiz type, bucket) -> values to add
+    """
+    by_counter_group: Dict[Tuple[str, str, str], List[str]] = {}
+    for kind, granularity, quiz_type, bucket in values:
+        by_counter_group.setdefault((kind, granularity, quiz_type), []).append(bucket)
+
+    counters: Dict[Tuple[str, str, str, str], HyperLogLog] = {}
+    for (kind, granularity, quiz_type), buckets in by_counter_group.items():
+        cursor.execute(f"""
+            SELECT bucket_start, registers FROM distinct_counts
+            WHERE kind = ? AND granularity = ? AND quiz_type = ?
+              AND bucket_start IN ({','.join('?' for _ in buckets)})
+        """, [kind, granularity, quiz_type] + buckets)
+        for bucket, blob in cursor.fetchall():
+            counters[(kind, granularity, quiz_type, bucket)] = HyperLogLog.from_bytes(blob)
+
+    rows = []
+    for key, new_values in values.items():
+        counter = counters.get(key)
+        if counter is None:
+            counter = HyperLogLog()
+            counter.add_all(new_values)
+        elif not counter.add_all(new_values):
+            continue
+        rows.append(key + (counter.to_bytes(),))
+    cursor.executemany("""
+        INSERT OR REPLACE INTO distinct_counts (kind, granularity, quiz_type, bucket_start, registers)
+        VALUES (?, ?, ?, ?, ?)
+    """, rows)
+
+
+def read_counters(cursor: sqlite3.Cursor, kind: str, granularity: str, quiz_type: str,
+                  first_bucket: str, last_bucket: str) -> Dict[str, HyperLogLog]:
+    """Get the stored counters of a bucket range, per bucket"""
+    cursor.execute("""
+        SELECT bucket_start, registers FROM distinct_counts
+        WHERE kind = ? AND granularity = ? AND quiz_type = ? AND bucket_start BETWEEN ? AND ?
+    """, (kind, granularity, quiz_type, first_bucket, last_bucket))
+    return {bucket: HyperLogLog.from_bytes(blob) for bucket, blob in cursor.fetchall()}
+
+
+def merge_counters(counters: Iterable[HyperLogLog]) -> HyperLogLog:
+    """Merge counters into a new one"""
+    merged = HyperLogLog()
+    for counter in counters:
+        merged.merge(counter)
+    return merged
+
+
+def hour_buckets(since: datetime, until: datetime) -> Tuple[str, str]:
+    """First and last hourly bucket keys of a UTC time range"""
+    return (bucket_start('hour', since.date(), since.hour), bucket_start('hour', until.date(), until.hour))
+
+
+def prune(cursor: sqlite3.Cursor, today: date = None):
+    """Delete hourly and daily counters older than the rollup retention"""
+    today = today or date.today()
+    for granularity, days in (('hour', HOURLY_RETENTION_DAYS), ('day', DAILY_RETENTION_DAYS)):
+        cutoff = bucket_start(granularity, today - timedelta(days=days))
+        for kind in DISTINCT_KINDS:
+            cursor.execute("DELETE FROM distinct_counts WHERE kind = ? AND granularity = ? AND bucket_start < ?",
+                           (kind, granularity, cutoff))
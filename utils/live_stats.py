@@ -0,0 +1,175 @@
+"""
+Server-Sent Events stream of statistics changes for the live analytics mode.
+
+Each open stream waits for a statistics write, reads the stats version (see
+QuizStatsManager.get_stats_version) and sends it as a 'stats' event; the
+dashboard then refreshes through its usual callbacks. Writes made through this
+process wake the streams immediately, writes from other processes are noticed
+within ``check_interval`` seconds. Events are coalesced to at most
+``max_updates_per_second`` per stream.
+
+A stream holds a server thread for as long as it is open, so live mode is opt-in
+(QUIZ_ANALYTICS_LIVE=1) and the number of concurrent streams is capped. With live
+mode on, gunicorn.conf.py switches to threaded workers and caps the streams at half
+of each worker's threads. Streams are refused on servers that don't handle requests
+on several threads (e.g. gunicorn sync workers), so they can't block other requests. Streams end after ``max_stream_seconds``; browsers
+reconnect on their own, sending the last version they saw. Refused streams get a
+503 and the page falls back to polling.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional
+from .quiz_stats import quiz_stats
+
+
+class _EventStream:
+    """Iterable of a stream's messages that frees its slot once, when closed or exhausted"""
+
+    def __init__(self, messages: Iterator[str], release):
+        self._messages = messages
+        self._release = release
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        try:
+            return next(self._messages)
+        except StopIteration:
+            self.close()
+            raise
+
+    def close(self):
+        # WSGI servers call close() when the client goes away, even if iteration never started
+        self._messages.close()
+        release, self._release = self._release, None
+        if release is not None:
+            release()
+
+
+def live_updates_enabled() -> bool:
+    """Whether the live analytics stream is served, per the environment"""
+    return os.environ.get('QUIZ_ANALYTICS_LIVE', '').lower() in ('1', 'true', 'yes', 'on')
+
+
+def live_stream_limit() -> int:
+    """Most streams open at once per process, per the environment (set by gunicorn.conf.py)"""
+    return int(os.environ.get('QUIZ_ANALYTICS_LIVE_STREAMS', 8))
+
+
+class LiveStatsBroadcaster:
+    """
+    Fans statistics changes out to Server-Sent Events streams
+    """
+
+    def __init__(self, stats_manager, enabled: bool = True, max_updates_per_second: float = 1.0,
+                 check_interval: float = 5.0, heartbeat_interval: float = 15.0,
+                 max_streams: int = 8, max_stream_seconds: float = 300.0):
+        """
+        Args:
+            stats_manager: QuizStatsManager whose stats version is streamed
+            enabled: Whether streams are served at all
+            max_updates_per_second: Most events sent per stream per second
+            check_interval: Seconds between version checks without a local write
+            heartbeat_interval: Seconds of silence before a keep-alive comment is sent
+            max_streams: Most streams open at once in this process
+            max_stream_seconds: Seconds after which a stream ends and the browser reconnects
+        """
+        self.stats_manager = stats_manager
+        self.enabled = enabled
+        self.min_update_interval = 1.0 / max_updates_per_second
+        self.check_interval = check_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.max_streams = max_streams
+        self.max_stream_seconds = max_stream_seconds
+        self._changed = threading.Condition()
+        self._writes = 0
+        self._open_streams = 0
+        self.events_sent = 0
+        self.refused = 0
+        self._warned_single_threaded = False
+
+    def notify(self):
+        """Wake the open streams after a statistics write"""
+        with self._changed:
+            self._writes += 1
+            self._changed.notify_all()
+
+    def open_stream(self, last_version: Optional[str] = None,
+                    multithreaded: bool = True) -> Optional[_EventStream]:
+        """
+        Open an event stream
+
+        Args:
+            last_version: Last stats version the client saw (its Last-Event-ID header)
+            multithreaded: Whether the server handles other requests on other threads
+                of this process meanwhile (the WSGI wsgi.multithread flag)
+
+        Returns:
+            Iterator of Server-Sent Events messages, to be closed when the client goes
+            away, or None if live mode is disabled, the server is single-threaded or
+            too many streams are open
+        """
+        with self._changed:
+            if self.enabled and not multithreaded and not self._warned_single_threaded:
+                self._warned_single_threaded = True
+                logging.warning("Live analytics needs a threaded worker class; pages fall back to polling")
+            if not self.enabled or not multithreaded or self._open_streams >= self.max_streams:
+                self.refused += 1
+                return None
+            self._open_streams += 1
+        try:
+            version = int(last_version) if last_version else None
+        except ValueError:
+            version = None
+        return _EventStream(self._stream(version), self._release_stream)
+
+    def _release_stream(self):
+        with self._changed:
+            self._open_streams -= 1
+
+    def _stream(self, version: Optional[int]) -> Iterator[str]:
+        try:
+            # Browsers wait this long before reconnecting after the stream ends
+            yield "retry: 3000\n\n"
+            deadline = time.monotonic() + self.max_stream_seconds
+            last_message = time.monotonic()
+            seen_writes = None
+            while time.monotonic() < deadline:
+                with self._changed:
+                    if seen_writes == self._writes:
+                        self._changed.wait(min(self.check_interval, self.heartbeat_interval,
+                                               max(deadline - time.monotonic(), 0)))
+                    seen_writes = self._writes
+
+                current = self.stats_manager.get_stats_version()
+                if current != version:
+                    version = current
+                    self.events_sent += 1
+                    last_message = time.monotonic()
+                    yield f"id: {current}\nevent: stats\ndata: {json.dumps({'version': current})}\n\n"
+                    # Writes during the pause are coalesced into the next event
+                    time.sleep(self.min_update_interval)
+                elif time.monotonic() - last_message >= self.heartbeat_interval:
+                    last_message = time.monotonic()
+                    yield ": keep-alive\n\n"
+        except Exception as e:
+            logging.error("Live stats stream failed: %s", e)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get stream counters for monitoring"""
+        return {
+            'enabled': self.enabled,
+            'open_streams': self._open_streams,
+            'max_streams': self.max_streams,
+            'events_sent': self.events_sent,
+            'refused': self.refused
+        }
+
+
+# Initialize default broadcaster; local writes wake the streams at once
+live_stats = LiveStatsBroadcaster(quiz_stats, enabled=live_updates_enabled(), max_streams=live_stream_limit())
+quiz_stats.add_write_listener(live_stats.notify)
@@ -0,0 +1,211 @@
+"""
+In-memory question bank for serving quiz questions without querying SQLite.
+
+The bank loads every active question once into compact per-(category, subcategory)
+groups and is shared by the whole process. It re-checks a cheap content fingerprint
+at most every ``check_interval`` seconds and reloads itself when questions,
+categories or subcategories change. The check and the reload run on a background
+thread; lookups keep serving the current index until the new one is swapped in.
+"""
+import logging
+import threading
+import time
+from array import array
+from typing import Dict, List, Any, Optional, Tuple
+
+from .database_utils import QuizDatabase, quiz_db
+
+# Column order of the row tuples kept in each group
+QUESTION_COLUMNS = (
+    'id', 'question', 'correct_answer', 'option1', 'option2', 'option3',
+    'fun_fact', 'image', 'difficulty', 'points', 'category_id', 'subcategory_id'
+)
+
+LOAD_QUERY = f"""
+    SELECT {', '.join('q.' + column for column in QUESTION_COLUMNS)},
+           c.name as category_name, s.name as subcategory_name
+    FROM questions_normalized q
+    JOIN categories c ON q.category_id = c.id
+    JOIN subcategories s ON q.subcategory_id = s.id
+    WHERE q.is_active = 1 AND c.is_active = 1 AND s.is_active = 1
+    ORDER BY q.id
+"""
+
+FINGERPRINT_QUERY = """
+    SELECT
+        (SELECT COUNT(*) FROM questions_normalized) as question_count,
+        (SELECT COALESCE(MAX(id), 0) FROM questions_normalized) as max_question_id,
+        (SELECT COALESCE(MAX(updated_at), '') FROM questions_normalized) as last_question_update,
+        (SELECT COALESCE(SUM(is_active), 0) FROM questions_normalized) as active_questions,
+        (SELECT COUNT(*) || ':' || COALESCE(SUM(is_active), 0) FROM categories) as categories,
+        (SELECT COUNT(*) || ':' || COALESCE(SUM(is_active), 0) FROM subcategories) as subcategories
+"""
+
+
+def read_content_fingerprint(db: QuizDatabase) -> tuple:
+    """Read the content fingerprint that changes whenever questions, categories or subcategories change"""
+    rows = db.execute_query(FINGERPRINT_QUERY)
+    return tuple(rows[0].values()) if rows else ()
+
+
+class QuestionGroup:
+    """Questions of a single (category, subcategory) pair stored as parallel arrays"""
+
+    __slots__ = ('category', 'subcategory', 'category_id', 'subcategory_id', 'ids', 'rows', 'positions')
+
+    def __init__(self, category: str, subcategory: str, category_id: int, subcategory_id: int):
+        self.category = category
+        self.subcategory = subcategory
+        self.category_id = category_id
+        self.subcategory_id = subcategory_id
+        self.ids = array('q')
+        self.rows: List[tuple] = []
+        self.positions: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def row_dict(self, index: int) -> Dict[str, Any]:
+        """Expand a stored row into the dict shape returned by the SQL fetch path"""
+        row = dict(zip(QUESTION_COLUMNS, self.rows[index]))
+        row['category_name'] = self.category
+        row['subcategory_name'] = self.subcategory
+        return row
+
+
+class QuestionBank:
+    """
+    Read-only, process-wide cache of active questions grouped by (category, subcategory)
+    """
+
+    def __init__(self, db: QuizDatabase = quiz_db, check_interval: float = 30.0):
+        self.db = db
+        self.check_interval = check_interval
+        self._groups: Dict[Tuple[str, str], QuestionGroup] = {}
+        self._fingerprint = None
+        self._loaded_at = None
+        self._last_check = 0.0
+        self._reload_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._refresh_thread: Optional[threading.Thread] = None
+        # Lookups run on many request threads at once
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._fingerprint is not None
+
+    def load(self) -> bool:
+        """
+        Load (or reload) all active questions from the database
+
+        Returns:
+            True if the bank was loaded successfully
+        """
+        with self._reload_lock:
+            try:
+                fingerprint = read_content_fingerprint(self.db)
+                question_rows = self.db.execute_query(LOAD_QUERY)
+            except Exception as e:
+                logging.error("Failed to load question bank: %s", e)
+                return False
+
+            groups: Dict[Tuple[str, str], QuestionGroup] = {}
+            for question_row in question_rows:
+                key = (question_row['category_name'], question_row['subcategory_name'])
+                group = groups.get(key)
+                if group is None:
+                    group = groups[key] = QuestionGroup(
+                        key[0], key[1], question_row['category_id'], question_row['subcategory_id']
+                    )
+                group.positions[question_row['id']] = len(group.ids)
+                group.ids.append(question_row['id'])
+                group.rows.append(tuple(question_row[column] for column in QUESTION_COLUMNS))
+
+            # Swap in the new index atomically so readers never see a partial load
+            was_loaded = self.is_loaded
+            self._groups = groups
+            self._fingerprint = fingerprint
+            self._loaded_at = time.time()
+            self._last_check = time.monotonic()
+            if was_loaded:
+                self.reloads += 1
+
+            logging.info("Question bank loaded %d questions in %d groups", len(question_rows), len(groups))
+            return True
+
+    def invalidate(self):
+        """Force a content check on the next lookup"""
+        self._last_check = 0.0
+
+    def _reload_if_changed(self):
+        """Start a background content check once check_interval has passed since the last one"""
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        with self._refresh_lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            self._last_check = now
+            self._refresh_thread = threading.Thread(target=self._check_content, name='question-bank-refresh',
+                                                    daemon=True)
+            self._refresh_thread.start()
+
+    def _check_content(self):
+        """Reload the bank if its content fingerprint changed; run on a background thread"""
+        try:
+            fingerprint = read_content_fingerprint(self.db)
+        except Exception as e:
+            logging.error("Failed to check question bank fingerprint: %s", e)
+            return
+        if fingerprint != self._fingerprint:
+            logging.info("Question content changed, reloading question bank")
+            self.load()
+
+    def get_group(self, category: str, subcategory: str) -> Optional[QuestionGroup]:
+        """
+        Get the cached questions for a category and subcategory
+
+        Args:
+            category: Category name
+            subcategory: Subcategory name
+
+        Returns:
+            QuestionGroup, or None if the bank is not loaded or has no such group
+        """
+        if not self.is_loaded:
+            with self._stats_lock:
+                self.misses += 1
+            return None
+
+        self._reload_if_changed()
+        group = self._groups.get((category, subcategory))
+        with self._stats_lock:
+            if group is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return group
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss and reload counters for monitoring"""
+        with self._stats_lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            'loaded': self.is_loaded,
+            'loaded_at': self._loaded_at,
+            'groups': len(self._groups),
+            'questions': sum(len(group) for group in self._groups.values()),
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': (hits / lookups) if lookups > 0 else 0.0,
+            'reloads': self.reloads
+        }
+
+
+# Initialize default question bank (loaded at application startup)
+question_bank = QuestionBank()
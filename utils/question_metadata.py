@@ -0,0 +1,173 @@
+"""
+In-process cache of per-question metadata used when recording answers.
+
+Recording an answer needs the question's category and subcategory to update the
+daily category stats. The mapping is loaded for every question in one query and
+re-checked against the question bank's content fingerprint at most every
+``check_interval`` seconds, so the answer path no longer looks it up per answer.
+The check and the reload run on a background thread; answers keep using the
+previous mapping until the new one is swapped in.
+"""
+import logging
+import threading
+import time
+from typing import Any, Dict, Iterable, NamedTuple, Optional
+
+from .database_utils import QuizDatabase, chunked
+from .question_bank import read_content_fingerprint
+
+METADATA_QUERY = """
+    SELECT id, category_id, subcategory_id, difficulty, points
+    FROM questions_normalized
+"""
+
+
+class QuestionMetadata(NamedTuple):
+    """Category placement and scoring of a question"""
+    category_id: int
+    subcategory_id: int
+    difficulty: Any
+    points: Any
+
+
+class QuestionMetadataCache:
+    """
+    Question ID to QuestionMetadata mapping for all questions, active or not
+    """
+
+    def __init__(self, db: QuizDatabase, check_interval: float = 30.0):
+        """
+        Args:
+            db: Database the questions are read from
+            check_interval: Seconds between content fingerprint checks
+        """
+        self.db = db
+        self.check_interval = check_interval
+        self._metadata: Dict[int, QuestionMetadata] = {}
+        self._fingerprint = None
+        self._last_check = 0.0
+        self._load_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._refresh_thread: Optional[threading.Thread] = None
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._fingerprint is not None
+
+    def load(self) -> bool:
+        """
+        Load (or reload) metadata for every question
+
+        Returns:
+            True if the cache was loaded successfully
+        """
+        with self._load_lock:
+            try:
+                fingerprint = read_content_fingerprint(self.db)
+                rows = self.db.execute_query(METADATA_QUERY)
+            except Exception as e:
+                logging.error("Failed to load question metadata: %s", e)
+                return False
+
+            was_loaded = self.is_loaded
+            self._metadata = {
+                row['id']: QuestionMetadata(row['category_id'], row['subcategory_id'], row['difficulty'], row['points'])
+                for row in rows
+            }
+            self._fingerprint = fingerprint
+            self._last_check = time.monotonic()
+            if was_loaded:
+                self.reloads += 1
+            logging.info("Question metadata loaded for %d questions", len(rows))
+            return True
+
+    def invalidate(self):
+        """Force a content check on the next lookup"""
+        self._last_check = 0.0
+
+    def _reload_if_changed(self):
+        """Start a background content check once check_interval has passed since the last one"""
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        with self._refresh_lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            self._last_check = now
+            self._refresh_thread = threading.Thread(target=self._check_content, name='question-metadata-refresh',
+                                                    daemon=True)
+            self._refresh_thread.start()
+
+    def _check_content(self):
+        """Reload the metadata if the content fingerprint changed; run on a background thread"""
+        try:
+            fingerprint = read_content_fingerprint(self.db)
+        except Exception as e:
+            logging.error("Failed to check question metadata fingerprint: %s", e)
+            return
+        if fingerprint != self._fingerprint:
+            logging.info("Question content changed, reloading question metadata")
+            self.load()
+
+    def get_many(self, question_ids: Iterable[int]) -> Dict[int, QuestionMetadata]:
+        """
+        Get metadata for several questions
+
+        Questions missing from the cache (e.g. added since the last load) are looked
+        up directly and cached; unknown IDs are left out of the result.
+
+        Args:
+            question_ids: Question IDs to look up
+
+        Returns:
+            Mapping of question ID to QuestionMetadata
+        """
+        if not self.is_loaded:
+            self.load()
+        else:
+            self._reload_if_changed()
+
+        metadata = self._metadata
+        found = {}
+        missing = []
+        for question_id in question_ids:
+            entry = metadata.get(question_id)
+            if entry is None:
+                missing.append(question_id)
+            else:
+                found[question_id] = entry
+        with self._stats_lock:
+            self.hits += len(found)
+            self.misses += len(missing)
+
+        if missing:
+            for chunk in chunked(missing):
+                placeholders = ','.join(['?' for _ in chunk])
+                rows = self.db.execute_query(f"{METADATA_QUERY} WHERE id IN ({placeholders})", tuple(chunk))
+                for row in rows:
+                    entry = QuestionMetadata(row['category_id'], row['subcategory_id'], row['difficulty'], row['points'])
+                    metadata[row['id']] = entry
+                    found[row['id']] = entry
+        return found
+
+    def get(self, question_id: int) -> QuestionMetadata:
+        """Get metadata for a single question, or None if it does not exist"""
+        return self.get_many([question_id]).get(question_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss and reload counters for monitoring"""
+        with self._stats_lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            'loaded': self.is_loaded,
+            'questions': len(self._metadata),
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': (hits / lookups) if lookups > 0 else 0.0,
+            'reloads': self.reloads
+        }
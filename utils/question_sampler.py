@@ -0,0 +1,149 @@
+"""
+Least-asked-first question sampling without sorting or ORDER BY RANDOM().
+
+Questions are kept in buckets keyed by how often they have been asked. Drawing k
+questions walks the buckets from the least asked upwards and picks uniformly at
+random inside a bucket, so a draw costs O(k) expected time instead of a full sort.
+"""
+import random
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Tuple, Container
+
+
+class BucketedSampler:
+    """
+    Questions grouped into buckets by usage count for least-asked-first sampling
+    """
+
+    def __init__(self, usage_counts: Iterable[Tuple[int, int]] = ()):
+        """
+        Args:
+            usage_counts: Iterable of (question_id, times_asked) pairs
+        """
+        self._buckets: Dict[int, List[int]] = {}
+        self._positions: Dict[int, Tuple[int, int]] = {}
+        self._levels: List[int] = []
+        for question_id, times_asked in usage_counts:
+            self.add(question_id, times_asked)
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, question_id: int) -> bool:
+        return question_id in self._positions
+
+    def usage(self, question_id: int) -> int:
+        """Get the usage count of a question"""
+        return self._positions[question_id][0]
+
+    def bucket_sizes(self) -> Dict[int, int]:
+        """Get the number of questions per usage count"""
+        return {level: len(self._buckets[level]) for level in self._levels}
+
+    def add(self, question_id: int, times_asked: int = 0):
+        """Add a question, or move it if it is already present"""
+        if question_id in self._positions:
+            self.remove(question_id)
+        bucket = self._buckets.get(times_asked)
+        if bucket is None:
+            bucket = self._buckets[times_asked] = []
+            insort(self._levels, times_asked)
+        self._positions[question_id] = (times_asked, len(bucket))
+        bucket.append(question_id)
+
+    def remove(self, question_id: int):
+        """Remove a question in O(1) by swapping it with the last bucket entry"""
+        times_asked, index = self._positions.pop(question_id)
+        bucket = self._buckets[times_asked]
+        last = bucket.pop()
+        if last != question_id:
+            bucket[index] = last
+            self._positions[last] = (times_asked, index)
+        if not bucket:
+            del self._buckets[times_asked]
+            del self._levels[bisect_left(self._levels, times_asked)]
+
+    def increment(self, question_id: int, by: int = 1):
+        """Move a question to the bucket for its new usage count"""
+        self.add(question_id, self.usage(question_id) + by)
+
+    def sample(self, k: int, exclude: Optional[Container[int]] = None,
+               avoid: Optional[Container[int]] = None,
+               rng: Optional[random.Random] = None) -> List[Tuple[int, int]]:
+        """
+        Draw up to k questions, least asked first and uniformly random within a bucket
+
+        Args:
+            k: Number of questions to draw
+            exclude: Optional container of question IDs that must not be drawn
+            avoid: Optional container of question IDs (e.g. already seen) that are only
+                drawn when there are not enough other questions
+            rng: Optional random generator (defaults to the module generator)
+
+        Returns:
+            List of (question_id, times_asked) pairs ordered by usage count
+        """
+        rng = rng or random
+        if avoid is not None:
+            drawn = self.sample(k, exclude=_Union(exclude, avoid), rng=rng)
+            if len(drawn) < k:
+                taken = {question_id for question_id, _ in drawn}
+                drawn.extend(self.sample(k - len(drawn), exclude=_Union(exclude, taken), rng=rng))
+            return drawn
+
+        drawn: List[Tuple[int, int]] = []
+        for level in self._levels:
+            need = k - len(drawn)
+            if need <= 0:
+                break
+            chosen = _draw_from_bucket(self._buckets[level], need, exclude, rng)
+            drawn.extend((question_id, level) for question_id in chosen)
+        return drawn
+
+
+class _Union:
+    """Membership test across several containers without copying them"""
+
+    __slots__ = ('_containers',)
+
+    def __init__(self, *containers: Optional[Container[int]]):
+        self._containers = [container for container in containers if container is not None]
+
+    def __contains__(self, question_id: int) -> bool:
+        return any(question_id in container for container in self._containers)
+
+
+def _draw_from_bucket(bucket: List[int], need: int, exclude: Optional[Container[int]],
+                      rng: random.Random) -> List[int]:
+    """Draw up to `need` distinct, non-excluded questions uniformly from a bucket."""
+    size = len(bucket)
+    if exclude is None:
+        if need >= size:
+            chosen = list(bucket)
+            rng.shuffle(chosen)
+            return chosen
+        return rng.sample(bucket, need)
+
+    # Rejection sampling over random positions keeps the draw O(need) while few are excluded
+    chosen: List[int] = []
+    visited = set()
+    max_attempts = 4 * need + 16
+    attempts = 0
+    while len(chosen) < need and attempts < max_attempts and len(visited) < size:
+        attempts += 1
+        index = rng.randrange(size)
+        if index in visited:
+            continue
+        visited.add(index)
+        question_id = bucket[index]
+        if question_id not in exclude:
+            chosen.append(question_id)
+
+    # Mostly excluded bucket: finish with a filtered scan of the positions not visited yet
+    if len(chosen) < need and len(visited) < size:
+        remaining = [
+            question_id for index, question_id in enumerate(bucket)
+            if index not in visited and question_id not in exclude
+        ]
+        chosen.extend(rng.sample(remaining, min(need - len(chosen), len(remaining))))
+    return chosen
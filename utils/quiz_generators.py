@@ -3,8 +3,13 @@ Quiz generators for different types of country trivia questions.
 """
 import logging
 import random
-from typing import List, Dict, Any, Optional
-from .database_utils import quiz_db
+import threading
+import time
+from typing import List, Dict, Any, Optional, Tuple, Container
+from .database_utils import chunked, quiz_db
+from .question_bank import QuestionGroup, question_bank
+from .question_sampler import BucketedSampler
+from .quiz_stats import quiz_stats
 
 
 # Quiz type configuration - single source of truth
@@ -32,6 +37,12 @@ QUIZ_CONFIG = {
     'world_history':{'category': 'history', 'subcategory': 'world_history'}
 }
 
+# Bank usage samplers older than this are rebuilt from question_usage_totals on a background thread
+USAGE_REFRESH_SECONDS = 5.0
+_bank_samplers: Dict[Tuple[str, str], Tuple[QuestionGroup, float, BucketedSampler]] = {}
+_refreshing = set()
+_refresh_lock = threading.Lock()
+
 # Display labels for quiz types
 QUIZ_TYPE_LABEL = {
     "currency": "Currencies",
@@ -101,57 +112,240 @@ def _format_questions_normalized(question_rows: List[Dict], quiz_config: Dict) -
     return questions
 
 
-def _fetch_questions_from_db(category: str, subcategory: str, num_questions: int, exclude_ids: List[int] = None) -> List[Dict]:
-    """Fetch questions from database by category and subcategory, excluding specified IDs and prioritizing least asked questions."""
-    # Build the base query with LEFT JOIN to question stats to get usage counts
+# Seen questions widen the usage levels the SQL fallback reads by at most this many per question
+# requested; past that, seen questions at those levels fill up instead of unseen ones further up
+SEEN_WIDENING_PER_QUESTION = 4
+
+# Active questions of the requested subcategories with their usage counts; {filters} is an OR of per-subcategory conditions
+_USAGE_SOURCE = """
+    FROM questions_normalized q
+    JOIN categories c ON q.category_id = c.id
+    JOIN subcategories s ON q.subcategory_id = s.id
+    LEFT JOIN question_usage_totals u ON u.question_id = q.id
+    WHERE q.is_active = 1 AND c.is_active = 1 AND s.is_active = 1 AND ({filters})
+"""
+
+
+def _ensure_usage_totals():
+    """Create the statistics tables, question_usage_totals among them, if a fresh database lacks them."""
+    try:
+        # Runs once; afterwards only takes an uncontended lock
+        quiz_stats.init_stats_tables()
+    except Exception as e:
+        logging.error("Failed to create the statistics tables: %s", e)
+
+
+def _fetch_usage_histograms(keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], List[Tuple[int, int]]]:
+    """Fetch how many active questions of each subcategory have been asked how often, least asked first."""
     query = """
-        SELECT q.*, c.name as category_name, s.name as subcategory_name,
-               COALESCE(SUM(dqs.times_asked), 0) as total_times_asked
-        FROM questions_normalized q
-        JOIN categories c ON q.category_id = c.id
-        JOIN subcategories s ON q.subcategory_id = s.id
-        LEFT JOIN daily_question_stats dqs ON q.id = dqs.question_id
-        WHERE c.name = ? AND s.name = ? AND q.is_active = 1 AND c.is_active = 1 AND s.is_active = 1
+        SELECT c.name as category_name, s.name as subcategory_name,
+               COALESCE(u.times_asked, 0) as level, COUNT(*) as questions
+    """ + _USAGE_SOURCE.format(filters=" OR ".join("(c.name = ? AND s.name = ?)" for _ in keys)) + """
+        GROUP BY c.name, s.name, level
+        ORDER BY level
     """
-    
-    params = [category, subcategory]
-    
-    # Add exclusion clause if we have IDs to exclude
-    if exclude_ids and len(exclude_ids) > 0:
-        placeholders = ','.join(['?' for _ in exclude_ids])
-        query += f" AND q.id NOT IN ({placeholders})"
-        params.extend(exclude_ids)
-    
-    # Group by question and order by least asked first, then randomize within same usage count
-    query += """ 
-        GROUP BY q.id, q.question, q.correct_answer, q.option1, q.option2, q.option3, 
-                 q.fun_fact, q.category_id, q.subcategory_id, q.difficulty, q.points, 
-                 q.image, q.is_active, c.name, s.name
-        ORDER BY total_times_asked ASC, RANDOM() 
-        LIMIT ?
+    params = [value for key in keys for value in key]
+    histograms: Dict[Tuple[str, str], List[Tuple[int, int]]] = {key: [] for key in keys}
+    for row in quiz_db.execute_query(query, tuple(params)):
+        histograms[(row['category_name'], row['subcategory_name'])].append((row['level'], row['questions']))
+    return histograms
+
+
+def _fetch_usage_samplers(max_levels: Dict[Tuple[str, str], int]) -> Dict[Tuple[str, str], BucketedSampler]:
+    """Fetch the IDs of each subcategory's questions asked at most max_levels[key] times into usage samplers."""
+    query = """
+        SELECT q.id, c.name as category_name, s.name as subcategory_name,
+               COALESCE(u.times_asked, 0) as level
+    """ + _USAGE_SOURCE.format(filters=" OR ".join(
+        "(c.name = ? AND s.name = ? AND COALESCE(u.times_asked, 0) <= ?)" for _ in max_levels))
+    params = [value for key, max_level in max_levels.items() for value in (*key, max_level)]
+    samplers = {key: BucketedSampler() for key in max_levels}
+    for row in quiz_db.execute_query(query, tuple(params)):
+        samplers[(row['category_name'], row['subcategory_name'])].add(row['id'], row['level'])
+    return samplers
+
+
+def _fetch_question_rows(question_ids: List[int]) -> Dict[int, Dict]:
+    """Fetch full question rows with their category and subcategory names by ID."""
+    rows = {}
+    for chunk in chunked(question_ids):
+        query = f"""
+            SELECT q.*, c.name as category_name, s.name as subcategory_name
+            FROM questions_normalized q
+            JOIN categories c ON q.category_id = c.id
+            JOIN subcategories s ON q.subcategory_id = s.id
+            WHERE q.id IN ({', '.join('?' for _ in chunk)})
+        """
+        for row in quiz_db.execute_query(query, tuple(chunk)):
+            rows[row['id']] = row
+    return rows
+
+
+def _fetch_questions_from_db_many(requests: Dict[Tuple[str, str], int], exclude_ids: List[int] = None,
+                                  seen: Optional[Container[int]] = None) -> Dict[Tuple[str, str], List[Dict]]:
+    """Fetch questions for several (category, subcategory) pairs, prioritizing unseen, least asked questions.
+
+    Draws like the question bank, with a BucketedSampler, but only over the least asked usage
+    levels: the per-level histogram picks the lowest levels holding enough questions, only
+    the IDs at those levels are read into the sampler, and full rows are fetched for the
+    questions drawn. Each step is one statement for all subcategories.
     """
-    params.append(num_questions)
+    if not requests:
+        return {}
+    
+    _ensure_usage_totals()
+    excluded = set(exclude_ids) if exclude_ids else None
+    seen_count = len(seen) if seen else 0
     
     try:
-        question_rows = quiz_db.execute_query(query, tuple(params))
-        logging.debug(
-            "Querying for category=%s, subcategory=%s. Found %d questions (excluding %d previously asked), prioritizing least asked",
-            category, subcategory, len(question_rows), len(exclude_ids) if exclude_ids else 0
-        )
+        histograms = _fetch_usage_histograms(list(requests))
+        max_levels = {}
+        for key, num_questions in requests.items():
+            # Excluded and seen questions may sit in the lowest levels, so read enough levels to skip
+            # them; a user's seen set spans the whole catalogue, so its share is capped
+            target = (num_questions + (len(excluded) if excluded else 0) +
+                      min(seen_count, num_questions * SEEN_WIDENING_PER_QUESTION))
+            covered = 0
+            for level, questions in histograms[key]:
+                max_levels[key] = level
+                covered += questions
+                if covered >= target:
+                    break
+        samplers = _fetch_usage_samplers(max_levels) if max_levels else {}
         
-        # Log usage statistics for debugging
-        if question_rows:
-            usage_counts = [row.get('total_times_asked', 0) for row in question_rows]
-            logging.debug("Question usage counts: min=%d, max=%d, avg=%.1f", 
-                         min(usage_counts), max(usage_counts), sum(usage_counts)/len(usage_counts))
+        drawn = {
+            key: samplers[key].sample(num_questions, exclude=excluded, avoid=seen) if key in samplers else []
+            for key, num_questions in requests.items()
+        }
+        rows = _fetch_question_rows([question_id for picks in drawn.values() for question_id, _ in picks])
         
-        return question_rows
+        results = {}
+        for (category, subcategory), picks in drawn.items():
+            question_rows = []
+            for question_id, times_asked in picks:
+                question_row = dict(rows[question_id])
+                question_row['total_times_asked'] = times_asked
+                question_rows.append(question_row)
+            
+            logging.debug(
+                "Querying for category=%s, subcategory=%s. Found %d questions (excluding %d previously asked), prioritizing least asked",
+                category, subcategory, len(question_rows), len(exclude_ids) if exclude_ids else 0
+            )
+            
+            # Log usage statistics for debugging
+            if question_rows:
+                usage_counts = [row.get('total_times_asked', 0) for row in question_rows]
+                logging.debug("Question usage counts: min=%d, max=%d, avg=%.1f", 
+                             min(usage_counts), max(usage_counts), sum(usage_counts)/len(usage_counts))
+            
+            results[(category, subcategory)] = question_rows
+        return results
     except Exception as e:
-        logging.error(
-            "Failed to fetch questions for category=%s, subcategory=%s: %s",
-            category, subcategory, e
-        )
-        return []
+        logging.error("Failed to fetch questions for %s: %s", list(requests), e)
+        return {key: [] for key in requests}
+
+
+def _fetch_questions_from_db(category: str, subcategory: str, num_questions: int, exclude_ids: List[int] = None,
+                             seen: Optional[Container[int]] = None) -> List[Dict]:
+    """Fetch questions from database by category and subcategory, excluding specified IDs and prioritizing unseen, least asked questions."""
+    results = _fetch_questions_from_db_many({(category, subcategory): num_questions}, exclude_ids, seen)
+    return results.get((category, subcategory), [])
+
+
+def _fetch_usage_counts(subcategory_id: int) -> Dict[int, int]:
+    """Fetch how often each question of a subcategory has been asked."""
+    query = """
+        SELECT u.question_id, u.times_asked
+        FROM questions_normalized q
+        JOIN question_usage_totals u ON u.question_id = q.id
+        WHERE q.subcategory_id = ?
+    """
+    rows = question_bank.db.execute_query(query, (subcategory_id,))
+    return {row['question_id']: row['times_asked'] for row in rows}
+
+
+def _build_bank_sampler(group: QuestionGroup) -> BucketedSampler:
+    """Build the usage sampler of a bank group from the current usage totals."""
+    _ensure_usage_totals()
+    usage_counts = _fetch_usage_counts(group.subcategory_id)
+    return BucketedSampler((question_id, usage_counts.get(question_id, 0)) for question_id in group.ids)
+
+
+def _refresh_bank_sampler(group: QuestionGroup):
+    """Rebuild a bank group's usage sampler; run on a background thread."""
+    key = (group.category, group.subcategory)
+    try:
+        _bank_samplers[key] = (group, time.monotonic(), _build_bank_sampler(group))
+    except Exception as e:
+        logging.error("Failed to refresh usage counts for category=%s, subcategory=%s: %s",
+                      group.category, group.subcategory, e)
+    finally:
+        with _refresh_lock:
+            _refreshing.discard(key)
+
+
+def _get_bank_sampler(group: QuestionGroup) -> BucketedSampler:
+    """Get the usage sampler for a bank group, refreshing stale usage counts in the background.
+
+    Only the first draw from a group (or from a reloaded group) builds the sampler inline;
+    afterwards a stale sampler keeps serving while a background thread rebuilds it.
+    """
+    key = (group.category, group.subcategory)
+    cached = _bank_samplers.get(key)
+    if cached is not None and cached[0] is group:
+        _, built_at, sampler = cached
+        if time.monotonic() - built_at >= USAGE_REFRESH_SECONDS:
+            with _refresh_lock:
+                start_refresh = key not in _refreshing
+                _refreshing.add(key)
+            if start_refresh:
+                threading.Thread(target=_refresh_bank_sampler, args=(group,),
+                                 name="bank-sampler-refresh", daemon=True).start()
+        return sampler
+    
+    try:
+        sampler = _build_bank_sampler(group)
+    except Exception as e:
+        logging.error("Failed to fetch usage counts for category=%s, subcategory=%s: %s",
+                      group.category, group.subcategory, e)
+        sampler = BucketedSampler((question_id, 0) for question_id in group.ids)
+    _bank_samplers[key] = (group, time.monotonic(), sampler)
+    return sampler
+
+
+def _fetch_questions_from_bank(category: str, subcategory: str, num_questions: int, exclude_ids: List[int] = None,
+                               seen: Optional[Container[int]] = None) -> Optional[List[Dict]]:
+    """Select questions from the in-memory question bank, prioritizing least asked questions.
+
+    Returns None when the bank cannot serve the request so callers can fall back to the database.
+    """
+    group = question_bank.get_group(category, subcategory)
+    if group is None:
+        return None
+    
+    sampler = _get_bank_sampler(group)
+    excluded = set(exclude_ids) if exclude_ids else None
+    
+    question_rows = []
+    for question_id, times_asked in sampler.sample(num_questions, exclude=excluded, avoid=seen):
+        question_row = group.row_dict(group.positions[question_id])
+        question_row['total_times_asked'] = times_asked
+        question_rows.append(question_row)
+    
+    logging.debug(
+        "Question bank served %d questions for category=%s, subcategory=%s",
+        len(question_rows), category, subcategory
+    )
+    return question_rows
+
+
+def _fetch_questions(category: str, subcategory: str, num_questions: int, exclude_ids: List[int] = None,
+                     seen: Optional[Container[int]] = None) -> List[Dict]:
+    """Fetch questions from the question bank, falling back to the database on a miss."""
+    question_rows = _fetch_questions_from_bank(category, subcategory, num_questions, exclude_ids, seen)
+    if question_rows is None:
+        question_rows = _fetch_questions_from_db(category, subcategory, num_questions, exclude_ids, seen)
+    return question_rows
 
 
 def generate_questions_by_category(
@@ -160,7 +354,7 @@ def generate_questions_by_category(
     num_questions: int = 10
 ) -> List[Dict[str, Any]]:
     """
-    Generate questions from SQLite database by category.
+    Generate questions by category, served from the question bank when loaded.
     
     Args:
         category: Category name
@@ -172,8 +366,8 @@ def generate_questions_by_category(
     """
     logging.debug("Generating questions for category=%s, subcategory=%s", category, subcategory)
     
-    # Fetch from database
-    question_rows = _fetch_questions_from_db(category, subcategory, num_questions)
+    # Fetch from the question bank or database
+    question_rows = _fetch_questions(category, subcategory, num_questions)
     
     # Create config for formatting
     quiz_config = {'category': category, 'subcategory': subcategory}
@@ -181,7 +375,8 @@ def generate_questions_by_category(
     return _format_questions_normalized(question_rows, quiz_config)
 
 
-def get_quiz_questions(quiz_type: str, num_questions: int = 10, exclude_ids: List[int] = None) -> List[Dict[str, Any]]:
+def get_quiz_questions(quiz_type: str, num_questions: int = 10, exclude_ids: List[int] = None,
+                       seen: Optional[Container[int]] = None) -> List[Dict[str, Any]]:
     """
     Get questions for a specific quiz type.
     
@@ -189,6 +384,8 @@ def get_quiz_questions(quiz_type: str, num_questions: int = 10, exclude_ids: Lis
         quiz_type: Type of quiz (e.g., 'currency', 'capital', 'flag', etc.)
         num_questions: Number of questions to generate
         exclude_ids: List of question IDs to exclude (previously asked questions)
+        seen: Optional set of question IDs the user has already seen (e.g. a SeenQuestionSet);
+            unseen questions are preferred and seen ones only fill up the remainder
     
     Returns:
         List of question dictionaries
@@ -209,14 +406,125 @@ def get_quiz_questions(quiz_type: str, num_questions: int = 10, exclude_ids: Lis
     category = config['category']
     subcategory = config['subcategory']
     
-    # Fetch questions from database, excluding specified IDs
-    question_rows = _fetch_questions_from_db(category, subcategory, num_questions, exclude_ids)
-    logging.info("Fetched questions from db: %s",len(question_rows))
+    # Fetch questions from the question bank or database, excluding specified IDs
+    question_rows = _fetch_questions(category, subcategory, num_questions, exclude_ids, seen)
+    logging.info("Fetched questions: %s",len(question_rows))
     
     # Format and return questions
     return _format_questions_normalized(question_rows, config)
 
 
+def _fetch_questions_many(requests: Dict[Tuple[str, str], int], exclude_ids: List[int] = None,
+                          seen: Optional[Container[int]] = None) -> Dict[Tuple[str, str], List[Dict]]:
+    """Fetch questions for several subcategories from the bank, batching any misses into one database round trip."""
+    results = {}
+    misses = {}
+    for (category, subcategory), num_questions in requests.items():
+        question_rows = _fetch_questions_from_bank(category, subcategory, num_questions, exclude_ids, seen)
+        if question_rows is None:
+            misses[(category, subcategory)] = num_questions
+        else:
+            results[(category, subcategory)] = question_rows
+    
+    if misses:
+        results.update(_fetch_questions_from_db_many(misses, exclude_ids, seen))
+    return results
+
+
+def get_quiz_questions_many(question_counts: Dict[str, int], exclude_ids: List[int] = None,
+                            seen: Optional[Container[int]] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Get questions for several quiz types at once.
+    
+    Args:
+        question_counts: Mapping of quiz type to number of questions, e.g. {'flag': 5, 'capital': 5}
+        exclude_ids: List of question IDs to exclude (previously asked questions)
+        seen: Optional set of question IDs the user has already seen
+    
+    Returns:
+        Mapping of quiz type to its list of question dictionaries
+    
+    Raises:
+        ValueError: If any quiz_type is not supported
+    """
+    unknown_types = [quiz_type for quiz_type in question_counts if quiz_type not in QUIZ_CONFIG]
+    if unknown_types:
+        available_types = list(QUIZ_CONFIG.keys())
+        logging.error("Unknown quiz types: %s. Available: %s", unknown_types, available_types)
+        raise ValueError(f"Unknown quiz type: {', '.join(unknown_types)}. Available types: {available_types}")
+    
+    requests = {}
+    for quiz_type, num_questions in question_counts.items():
+        config = QUIZ_CONFIG[quiz_type]
+        key = (config['category'], config['subcategory'])
+        requests[key] = requests.get(key, 0) + num_questions
+    
+    question_rows = _fetch_questions_many(requests, exclude_ids, seen)
+    
+    # Hand out each subcategory's rows to the quiz types that asked for it
+    questions = {}
+    offsets = {}
+    for quiz_type, num_questions in question_counts.items():
+        config = QUIZ_CONFIG[quiz_type]
+        key = (config['category'], config['subcategory'])
+        offset = offsets.get(key, 0)
+        offsets[key] = offset + num_questions
+        questions[quiz_type] = _format_questions_normalized(
+            question_rows.get(key, [])[offset:offset + num_questions], config
+        )
+    
+    logging.info("Fetched questions for %d quiz types: %d total", len(questions),
+                 sum(len(type_questions) for type_questions in questions.values()))
+    return questions
+
+
+def get_category_mix_questions(category: str, num_questions: int = 10, exclude_ids: List[int] = None,
+                               seen: Optional[Container[int]] = None) -> List[Dict[str, Any]]:
+    """
+    Get a random mix of questions across every quiz type of a category.
+    
+    Questions are stratified by subcategory: each quiz type gets an equal share, and
+    any shortfall from small subcategories is topped up from the others.
+    
+    Args:
+        category: Category name (e.g. 'geography')
+        num_questions: Total number of questions
+        exclude_ids: List of question IDs to exclude (previously asked questions)
+        seen: Optional set of question IDs the user has already seen
+    
+    Returns:
+        Shuffled list of question dictionaries
+    """
+    quiz_types = get_quiz_types_by_category(category)
+    if not quiz_types or num_questions <= 0:
+        return []
+    
+    # Equal share per subcategory, with the remainder going to randomly chosen ones
+    share, remainder = divmod(num_questions, len(quiz_types))
+    counts = {quiz_type: share for quiz_type in quiz_types}
+    for quiz_type in random.sample(quiz_types, remainder):
+        counts[quiz_type] += 1
+    counts = {quiz_type: count for quiz_type, count in counts.items() if count > 0}
+    
+    by_type = get_quiz_questions_many(counts, exclude_ids, seen)
+    questions = [question for type_questions in by_type.values() for question in type_questions]
+    
+    shortfall = num_questions - len(questions)
+    full_types = [quiz_type for quiz_type, count in counts.items() if len(by_type[quiz_type]) == count]
+    if shortfall > 0 and full_types:
+        # Top up from subcategories that still had questions left
+        taken = set(exclude_ids or []) | {question['id'] for question in questions}
+        top_up_counts = {quiz_type: shortfall for quiz_type in full_types}
+        extra = [
+            question for type_questions in get_quiz_questions_many(top_up_counts, list(taken), seen).values()
+            for question in type_questions
+        ]
+        questions.extend(random.sample(extra, min(shortfall, len(extra))))
+    
+    random.shuffle(questions)
+    return questions
+
+
 def get_available_quiz_types() -> List[str]:
     """Get list of all available quiz types."""
     return list(QUIZ_CONFIG.keys())
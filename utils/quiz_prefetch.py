@@ -0,0 +1,146 @@
+"""
+Background prefetch of quiz question sets.
+
+While a player looks at the completion screen or the username modal, the next
+question set is built in a small thread pool. The click that starts the quiz then
+takes the prepared list instead of fetching synchronously.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class QuizPrefetcher:
+    """
+    Bounded, TTL-expiring cache of prefetched question lists keyed by (session key, quiz type)
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 300.0, max_workers: int = 2,
+                 wait_timeout: float = 2.0):
+        """
+        Args:
+            max_entries: Maximum number of prepared question sets kept at once
+            ttl: Seconds after which an unused prefetched set is discarded
+            max_workers: Size of the background thread pool
+            wait_timeout: Seconds to wait for a prefetch that is still running when taken
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.wait_timeout = wait_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='quiz-prefetch')
+        self._entries: 'OrderedDict[Tuple[Hashable, str], Tuple[Future, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.prefetches = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def prefetch(self, session_key: Hashable, quiz_type: str, loader: Callable[[], List[Dict[str, Any]]]):
+        """
+        Start building a question set in the background
+
+        Args:
+            session_key: Key identifying the player session the set is prepared for
+            quiz_type: Quiz type the questions belong to
+            loader: Callable returning the question list
+        """
+        key = (session_key, quiz_type)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[1] < self.ttl:
+                return
+            try:
+                future = self._executor.submit(loader)
+            except RuntimeError:
+                # Executor already shut down
+                return
+            self._entries[key] = (future, now)
+            self._entries.move_to_end(key)
+            self.prefetches += 1
+            self._purge_expired(now)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+
+    def _purge_expired(self, now: float):
+        """Drop expired entries from the oldest end (entries are kept in creation order)"""
+        while self._entries:
+            key, (future, created_at) = next(iter(self._entries.items()))
+            if now - created_at < self.ttl:
+                break
+            future.cancel()
+            del self._entries[key]
+            self.expired += 1
+
+    def take(self, session_key: Hashable, quiz_type: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Take a prefetched question set, consuming it
+
+        Returns:
+            The prepared question list, or None on a miss
+        """
+        key = (session_key, quiz_type)
+        with self._lock:
+            self._purge_expired(time.monotonic())
+            entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+
+        future, _ = entry
+        try:
+            questions = future.result(timeout=self.wait_timeout)
+        except Exception as e:
+            logging.warning("Prefetched questions for %s unavailable: %s", quiz_type, e)
+            return None
+        return questions or None
+
+    def get_questions(self, session_key: Hashable, quiz_type: str,
+                      loader: Callable[[], List[Dict[str, Any]]],
+                      accept: Optional[Callable[[List[Dict[str, Any]]], bool]] = None) -> List[Dict[str, Any]]:
+        """
+        Get a question set, using a prefetched one if available
+
+        Falls back to calling the loader synchronously on a miss, or when `accept`
+        rejects the prefetched set.
+        """
+        questions = self.take(session_key, quiz_type) if session_key is not None else None
+        if questions is not None and (accept is None or accept(questions)):
+            self.hits += 1
+            return questions
+        self.misses += 1
+        return loader()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get prefetch hit rate and cache counters for monitoring"""
+        with self._lock:
+            self._purge_expired(time.monotonic())
+            entries = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            'entries': entries,
+            'prefetches': self.prefetches,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits / lookups) if lookups > 0 else 0.0,
+            'expired': self.expired,
+            'evicted': self.evicted
+        }
+
+    def shutdown(self):
+        """Stop the background workers and drop pending prefetches"""
+        with self._lock:
+            for future, _ in self._entries.values():
+                future.cancel()
+            self._entries.clear()
+        self._executor.shutdown(wait=False)
+
+
+# Initialize default prefetcher
+quiz_prefetcher = QuizPrefetcher()
+atexit.register(quiz_prefetcher.shutdown)
@@ -6,12 +6,52 @@ This module provides functionality to track and manage quiz performance statisti
 including daily stats, rollover functionality, and performance analytics.
 """
 
+import argparse
+import atexit
+import os
+import random
 import sqlite3
+import threading
 from datetime import date, timedelta,timezone, datetime
-from typing import Dict, List
-from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+from dataclasses import dataclass, field
 import logging
+import time
 import uuid
+from .database_utils import DEFAULT_DB_PATH, QuizDatabase, chunked
+from .db_connections import connection_manager
+from .question_metadata import QuestionMetadataCache
+from . import distinct_counts, session_leaderboard, sketches, stats_rollups
+from .seen_questions import SeenQuestionSet
+from .stats_migrations import apply_migrations, get_schema_version
+from .trending import ORDER_BY_VOLUME, TrendingEngine
+
+# Shared username for players who skip the username prompt; not tracked per user
+ANONYMOUS_USER_ID = 'anonymous_user'
+
+# Columns of the append-only answer log, in AnswerEvent field order
+ANSWER_EVENT_COLUMNS = (
+    'question_id', 'is_correct', 'response_time', 'session_id', 'user_answer', 'user_id', 'date', 'recorded_at',
+    'event_id'
+)
+
+
+def answer_event_id(session_id: str, question_index: int) -> str:
+    """Idempotency key of the answer to a question of a session, stable across retries and double clicks"""
+    return f"{session_id}:{question_index}"
+
+
+def _is_retryable_write_error(error: sqlite3.Error) -> bool:
+    """Lock contention, or losing a race to record the same event id, clears up on retry"""
+    message = str(error).lower()
+    if isinstance(error, sqlite3.IntegrityError):
+        return 'event_id' in message
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in message or 'busy' in message)
+
+
+def append_only_enabled() -> bool:
+    """Whether answers are appended to the answer log instead of upserted, per the environment"""
+    return os.environ.get('QUIZ_STATS_APPEND_ONLY', '').lower() in ('1', 'true', 'yes', 'on')
 
 @dataclass
 class QuizStats:
@@ -24,26 +64,114 @@ class QuizStats:
     avg_response_time: float = 0.0
     accuracy_rate: float = 0.0
 
+def _utc_today() -> str:
+    return datetime.now(timezone.utc).date().isoformat()
+
+@dataclass
+class AnswerEvent:
+    """A single recorded answer, stamped with the UTC day it was given"""
+    question_id: int
+    is_correct: bool
+    response_time: float
+    session_id: Optional[str] = None
+    user_answer: Optional[str] = None
+    user_id: Optional[str] = None
+    date: str = field(default_factory=_utc_today)
+    # Original answer time for events folded in later by compaction
+    recorded_at: Optional[str] = None
+    # Client-generated idempotency key (see answer_event_id); repeats are recorded once
+    event_id: Optional[str] = None
+
 class QuizStatsManager:
     """
     Manages quiz statistics including daily tracking, rollover, and analytics
     """
     
-    def __init__(self, db_path: str = "data/quiz_database.db"):
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, append_only: bool = False,
+                 max_write_retries: int = 5, retry_base_delay: float = 0.05):
+        """
+        Args:
+            db_path: Path to the quiz database
+            append_only: Append answers to the answer_events log and fold them into the
+                aggregates with compact_answer_events() instead of upserting per answer
+            max_write_retries: Retries of an answer write that failed on a locked database
+            retry_base_delay: Seconds before the first retry, doubled for every further one
+        """
         logging.debug("Setting DB path as: %s",db_path)
         self.db_path = db_path
-        self.init_stats_tables()
+        self.append_only = append_only
+        self.max_write_retries = max_write_retries
+        self.retry_base_delay = retry_base_delay
+        self.write_retries = 0
+        self.duplicate_answers = 0
+        # Read-only connection so lookups never commit a write transaction in progress
+        self.question_metadata = QuestionMetadataCache(QuizDatabase(db_path, readonly=True))
+        self._compaction_thread = None
+        self._compaction_stop = threading.Event()
+        self._write_listeners: List[Callable[[], None]] = []
+        # Tables are created and migrated on first use, so importing the module touches no database
+        self._tables_ready = False
+        self._tables_lock = threading.Lock()
+        # Loaded on the first trending query; local writes refresh its recent buckets
+        self.trending = TrendingEngine(self)
+        self.add_write_listener(self.trending.invalidate)
     
     def get_connection(self) -> sqlite3.Connection:
-        """Get database connection with row factory"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+        """Get this thread's pooled database connection with row factory, creating the stats tables first if needed"""
+        if not self._tables_ready:
+            self.init_stats_tables()
+        return connection_manager.get_connection(self.db_path)
     
-    def init_stats_tables(self):
-        """Initialize statistics tables if they don't exist"""
+    def add_write_listener(self, listener: Callable[[], None]):
+        """
+        Register a callback run after statistics change, e.g. to invalidate cached analytics
+        
+        Only writes made through this manager are reported, not those of other processes.
+        """
+        self._write_listeners.append(listener)
+    
+    def notify_write(self):
+        """Run the write listeners; also called by writers that commit through another process"""
+        for listener in self._write_listeners:
+            try:
+                listener()
+            except Exception as e:
+                logging.error("Stats write listener failed: %s", e)
+    
+    def _bump_stats_version(self, cursor: sqlite3.Cursor):
+        """Advance the stats version inside a write transaction that changes what analytics show"""
+        cursor.execute("UPDATE stats_version SET version = version + 1 WHERE id = 1")
+    
+    def get_stats_version(self) -> int:
+        """
+        Get the stats version, a counter advanced by every committed statistics write
+        
+        The counter lives in the database, so writes from other processes advance it too.
+        Compacting the append-only answer log doesn't change any reported numbers and
+        leaves it unchanged.
+        
+        Returns:
+            Current version; equal versions mean the statistics have not changed
+        """
         with self.get_connection() as conn:
             cursor = conn.cursor()
+            cursor.execute("SELECT version FROM stats_version WHERE id = 1")
+            return cursor.fetchone()[0]
+    
+    def init_stats_tables(self):
+        """
+        Initialize statistics tables if they don't exist and apply pending schema migrations
+        
+        Runs once per manager, on its first database access or when called at app startup.
+        """
+        with self._tables_lock:
+            if not self._tables_ready:
+                self._create_stats_tables()
+                self._tables_ready = True
+    
+    def _create_stats_tables(self):
+        with connection_manager.get_connection(self.db_path) as conn:
+            cursor = conn.cursor()
             
             # Daily question statistics
             cursor.execute("""
@@ -100,6 +228,22 @@ class QuizStatsManager:
                 )
             """)
             
+            # Running per-question usage totals (mirror of SUM(daily_question_stats.times_asked))
+            cursor.execute("""
+                SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'question_usage_totals'
+            """)
+            usage_totals_exist = cursor.fetchone() is not None
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS question_usage_totals (
+                    question_id INTEGER PRIMARY KEY,
+                    times_asked INTEGER DEFAULT 0,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (question_id) REFERENCES questions_normalized(id)
+                )
+            """)
+            if not usage_totals_exist:
+                self._rebuild_usage_totals(cursor)
+            
             # Individual quiz answers per session
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS quiz_sessions (
@@ -137,10 +281,42 @@ class QuizStatsManager:
                 )
             """)
             
+            # Append-only log of answers not yet folded into the aggregates
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS answer_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    question_id INTEGER NOT NULL,
+                    is_correct BOOLEAN NOT NULL,
+                    response_time REAL NOT NULL,
+                    session_id TEXT,
+                    user_answer TEXT,
+                    user_id TEXT,
+                    date DATE NOT NULL,
+                    recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_answer_events_date ON answer_events(date)
+            """)
+            
+            # Per-user bitmap of questions already seen
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS user_seen_questions (
+                    user_id TEXT PRIMARY KEY,
+                    seen_bitmap BLOB NOT NULL,
+                    question_count INTEGER DEFAULT 0,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            
             conn.commit()
+            
+            # Columns and indexes added since are versioned migration steps
+            apply_migrations(conn)
     
     def record_quiz_answer(self, question_id: int, is_correct: bool, response_time: float, 
-                          session_id: str = None, user_answer: str = None):
+                          session_id: str = None, user_answer: str = None, user_id: str = None,
+                          event_id: str = None) -> bool:
         """
         Record a quiz answer and update daily statistics
         
@@ -150,60 +326,319 @@ class QuizStatsManager:
             response_time: Time taken to answer in seconds
             session_id: Optional session identifier
             user_answer: The answer provided by the user
+            user_id: Optional username whose seen questions should be updated
+            event_id: Optional idempotency key (see answer_event_id); an answer with an
+                already recorded event ID is ignored, so retries are safe
+            
+        Returns:
+            False if the answer was a duplicate and not recorded again
         """
      
-        today = datetime.now(timezone.utc).date().isoformat()
+        return self.record_quiz_answers([AnswerEvent(
+            question_id=question_id,
+            is_correct=is_correct,
+            response_time=response_time,
+            session_id=session_id,
+            user_answer=user_answer,
+            user_id=user_id,
+            event_id=event_id
+        )]) == 1
+    
+    def record_quiz_answers(self, answers: List[AnswerEvent]) -> int:
+        """
+        Record a batch of quiz answers in a single transaction
+        
+        Answers are aggregated per question, category and user before writing, so
+        each statistics table gets one executemany upsert per batch. Answers whose
+        event_id was already recorded are skipped. A write that fails because the
+        database is locked is retried with exponential backoff.
+        
+        In append-only mode the answers are only appended to the answer_events log.
+        
+        Args:
+            answers: Answers to record, in the order they were given
+            
+        Returns:
+            Number of answers recorded (duplicates excluded)
+        """
+        if not answers:
+            return 0
+        
+        for attempt in range(self.max_write_retries + 1):
+            try:
+                with self.get_connection() as conn:
+                    cursor = conn.cursor()
+                    if self.append_only:
+                        cursor.executemany(f"""
+                            INSERT OR IGNORE INTO answer_events ({', '.join(ANSWER_EVENT_COLUMNS)})
+                            VALUES (?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), ?)
+                        """, [tuple(getattr(answer, column) for column in ANSWER_EVENT_COLUMNS) for answer in answers])
+                        recorded = cursor.rowcount
+                    else:
+                        recorded = self._apply_answers(cursor, answers)
+                    if recorded:
+                        self._bump_stats_version(cursor)
+                    conn.commit()
+                break
+            except sqlite3.Error as e:
+                if attempt == self.max_write_retries or not _is_retryable_write_error(e):
+                    raise
+                self.write_retries += 1
+                delay = self.retry_base_delay * (2 ** attempt) * random.uniform(0.5, 1.5)
+                logging.warning("Retrying answer write in %.3fs after: %s", delay, e)
+                time.sleep(delay)
+        
+        if recorded < len(answers):
+            self.duplicate_answers += len(answers) - recorded
+            logging.info("Skipped %d duplicate answers", len(answers) - recorded)
+        if recorded:
+            self.notify_write()
+        return recorded
+    
+    def _drop_recorded_answers(self, cursor: sqlite3.Cursor, answers: List[AnswerEvent]) -> List[AnswerEvent]:
+        """Drop answers whose event ID is already recorded or repeats earlier in the batch"""
+        event_ids = list({answer.event_id for answer in answers if answer.event_id})
+        if not event_ids:
+            return answers
+        
+        recorded = set()
+        for chunk in chunked(event_ids):
+            placeholders = ','.join(['?' for _ in chunk])
+            cursor.execute(f"""
+                SELECT event_id FROM quiz_sessions WHERE event_id IN ({placeholders})
+            """, chunk)
+            recorded.update(row['event_id'] for row in cursor.fetchall())
         
+        unique_answers = []
+        for answer in answers:
+            if answer.event_id:
+                if answer.event_id in recorded:
+                    continue
+                recorded.add(answer.event_id)
+            unique_answers.append(answer)
+        return unique_answers
+    
+    def _apply_answers(self, cursor: sqlite3.Cursor, answers: List[AnswerEvent]) -> int:
+        """
+        Fold answers into the per-answer tables and aggregates using the given cursor
+        
+        Returns:
+            Number of answers applied (duplicates excluded)
+        """
+        answers = self._drop_recorded_answers(cursor, answers)
+        if not answers:
+            return 0
+        
+        # Aggregate per question and day: [asked, correct, total response time]
+        question_totals: Dict[tuple, List] = {}
+        usage_totals: Dict[int, int] = {}
+        seen_by_user: Dict[str, List[int]] = {}
+        # Per session: [answered, correct, total time, fastest, slowest]
+        session_totals: Dict[str, List] = {}
+        for answer in answers:
+            totals = question_totals.setdefault((answer.question_id, answer.date), [0, 0, 0.0])
+            totals[0] += 1
+            totals[1] += 1 if answer.is_correct else 0
+            totals[2] += answer.response_time
+            usage_totals[answer.question_id] = usage_totals.get(answer.question_id, 0) + 1
+            if answer.user_id:
+                seen_by_user.setdefault(answer.user_id, []).append(answer.question_id)
+            if answer.session_id:
+                totals = session_totals.get(answer.session_id)
+                if totals is None:
+                    session_totals[answer.session_id] = [0, 0, 0.0, answer.response_time, answer.response_time]
+                    totals = session_totals[answer.session_id]
+                totals[0] += 1
+                totals[1] += 1 if answer.is_correct else 0
+                totals[2] += answer.response_time
+                totals[3] = min(totals[3], answer.response_time)
+                totals[4] = max(totals[4], answer.response_time)
+        
+        # Category placement comes from the in-process cache rather than a lookup per answer
+        question_categories = self.question_metadata.get_many(usage_totals)
+        stats_rollups.add_answers(cursor, answers, question_categories)
+        
+        # Record individual answers in sessions table
+        cursor.executemany("""
+            INSERT INTO quiz_sessions 
+            (session_id, question_id, user_answer, is_correct, response_time, timestamp, event_id)
+            VALUES (?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), ?)
+        """, [(answer.session_id, answer.question_id, answer.user_answer, answer.is_correct,
+               answer.response_time, answer.recorded_at, answer.event_id) for answer in answers if answer.session_id])
+        
+        # Update daily question stats
+        cursor.executemany("""
+            INSERT INTO daily_question_stats 
+            (question_id, date, times_asked, times_correct, total_response_time,
+             avg_response_time, accuracy_rate)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(question_id, date) DO UPDATE SET
+                times_asked = times_asked + excluded.times_asked,
+                times_correct = times_correct + excluded.times_correct,
+                total_response_time = total_response_time + excluded.total_response_time,
+                avg_response_time = (total_response_time + excluded.total_response_time)
+                    / (times_asked + excluded.times_asked),
+                accuracy_rate = CAST(times_correct + excluded.times_correct AS REAL)
+                    / (times_asked + excluded.times_asked) * 100,
+                updated_at = CURRENT_TIMESTAMP
+        """, [(question_id, day, asked, correct, total_time, total_time / asked, correct / asked * 100)
+              for (question_id, day), (asked, correct, total_time) in question_totals.items()])
+        
+        # Update running usage totals used for least-asked-first selection
+        cursor.executemany("""
+            INSERT INTO question_usage_totals (question_id, times_asked)
+            VALUES (?, ?)
+            ON CONFLICT(question_id) DO UPDATE SET
+                times_asked = times_asked + excluded.times_asked,
+                updated_at = CURRENT_TIMESTAMP
+        """, list(usage_totals.items()))
+        
+        # Update daily category stats
+        category_totals: Dict[tuple, List[int]] = {}
+        for (question_id, day), (asked, correct, _) in question_totals.items():
+            metadata = question_categories.get(question_id)
+            if metadata is None:
+                continue
+            totals = category_totals.setdefault((metadata.category_id, metadata.subcategory_id, day), [0, 0])
+            totals[0] += asked
+            totals[1] += correct
+        
+        cursor.executemany("""
+            INSERT INTO daily_category_stats 
+            (category_id, subcategory_id, date, questions_asked, questions_correct, accuracy_rate)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(category_id, subcategory_id, date) DO UPDATE SET
+                questions_asked = questions_asked + excluded.questions_asked,
+                questions_correct = questions_correct + excluded.questions_correct,
+                accuracy_rate = CAST(questions_correct + excluded.questions_correct AS REAL)
+                    / (questions_asked + excluded.questions_asked) * 100,
+                updated_at = CURRENT_TIMESTAMP
+        """, [(category_id, subcategory_id, day, asked, correct, correct / asked * 100)
+              for (category_id, subcategory_id, day), (asked, correct) in category_totals.items()])
+        
+        # Update running session counters (update_session_stats recomputes them in full)
+        cursor.executemany("""
+            UPDATE session_stats SET
+                total_questions = total_questions + ?,
+                correct_answers = correct_answers + ?,
+                accuracy_rate = CAST(correct_answers + ? AS REAL) / (total_questions + ?) * 100,
+                total_time = total_time + ?,
+                avg_response_time = (total_time + ?) / (total_questions + ?),
+                fastest_answer = CASE WHEN total_questions = 0 THEN ? ELSE MIN(fastest_answer, ?) END,
+                slowest_answer = CASE WHEN total_questions = 0 THEN ? ELSE MAX(slowest_answer, ?) END,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE session_id = ?
+        """, [(answered, correct, correct, answered, total_time, total_time, answered,
+               fastest, fastest, slowest, slowest, session_id)
+              for session_id, (answered, correct, total_time, fastest, slowest) in session_totals.items()])
+        
+        for user_id, seen_ids in seen_by_user.items():
+            self._mark_questions_seen(cursor, user_id, seen_ids)
+        
+        # Response-time sketches are read, merged and rewritten, so this runs once the
+        # upserts above hold the write lock
+        sketches.add_response_times(cursor, self._response_times_by_sketch(answers, question_categories))
+        distinct_counts.add_values(cursor, self._distinct_values(cursor, answers))
+        
+        return len(answers)
+    
+    def _distinct_values(self, cursor: sqlite3.Cursor, answers: List[AnswerEvent]) -> Dict[tuple, set]:
+        """Group answers' users and sessions by the (kind, granularity, quiz type, bucket) counters they belong to"""
+        session_ids = list({answer.session_id for answer in answers if answer.session_id})
+        quiz_types = {}
+        for chunk in chunked(session_ids):
+            placeholders = ','.join(['?' for _ in chunk])
+            cursor.execute(f"""
+                SELECT session_id, session_name FROM session_stats WHERE session_id IN ({placeholders})
+            """, chunk)
+            quiz_types.update((row['session_id'], row['session_name']) for row in cursor.fetchall())
+        
+        now = datetime.now(timezone.utc)
+        values: Dict[tuple, set] = {}
+        for answer in answers:
+            if not answer.user_id and not answer.session_id:
+                continue
+            keys = distinct_counts.counter_keys(quiz_types.get(answer.session_id), date.fromisoformat(answer.date),
+                                                stats_rollups.answer_hour(answer, now))
+            for key in keys:
+                if answer.user_id:
+                    values.setdefault(('users',) + key, set()).add(answer.user_id)
+                if answer.session_id:
+                    values.setdefault(('sessions',) + key, set()).add(answer.session_id)
+        return values
+    
+    @staticmethod
+    def _response_times_by_sketch(answers: List[AnswerEvent], question_categories: Dict) -> Dict[tuple, List[float]]:
+        """Group answers' response times by the (scope, scope ID, day) sketches they belong to"""
+        response_times: Dict[tuple, List[float]] = {}
+        for answer in answers:
+            metadata = question_categories.get(answer.question_id)
+            for key in sketches.sketch_keys(answer.date, answer.question_id,
+                                            metadata.subcategory_id if metadata else None):
+                response_times.setdefault(key, []).append(answer.response_time)
+        return response_times
+    
+    def _mark_questions_seen(self, cursor: sqlite3.Cursor, user_id: str, question_ids: List[int]):
+        """Add question IDs to a user's seen bitmap using the given cursor"""
+        if not user_id or user_id == ANONYMOUS_USER_ID or not question_ids:
+            return
+        
+        cursor.execute("""
+            SELECT seen_bitmap FROM user_seen_questions WHERE user_id = ?
+        """, (user_id,))
+        row = cursor.fetchone()
+        seen = SeenQuestionSet.from_blob(row['seen_bitmap'] if row else None)
+        seen.update(question_ids)
+        
+        cursor.execute("""
+            INSERT INTO user_seen_questions (user_id, seen_bitmap, question_count)
+            VALUES (?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                seen_bitmap = excluded.seen_bitmap,
+                question_count = excluded.question_count,
+                updated_at = CURRENT_TIMESTAMP
+        """, (user_id, seen.to_blob(), len(seen)))
+    
+    def mark_questions_seen(self, user_id: str, question_ids: List[int]):
+        """
+        Mark questions as seen by a user
+        
+        Args:
+            user_id: Username
+            question_ids: IDs of the questions the user has seen
+        """
         with self.get_connection() as conn:
             cursor = conn.cursor()
+            self._mark_questions_seen(cursor, user_id, question_ids)
+            conn.commit()
+    
+    def get_seen_questions(self, user_id: str) -> SeenQuestionSet:
+        """
+        Get the set of questions a user has already seen
+        
+        Args:
+            user_id: Username
             
-            # Record individual answer in sessions table
-            if session_id:
-                cursor.execute("""
-                    INSERT INTO quiz_sessions 
-                    (session_id, question_id, user_answer, is_correct, response_time)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (session_id, question_id, user_answer, is_correct, response_time))
-            
-            # Update daily question stats
+        Returns:
+            SeenQuestionSet, empty for anonymous or unknown users
+        """
+        if not user_id or user_id == ANONYMOUS_USER_ID:
+            return SeenQuestionSet()
+        
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
             cursor.execute("""
-                INSERT INTO daily_question_stats 
-                (question_id, date, times_asked, times_correct, total_response_time)
-                VALUES (?, ?, 1, ?, ?)
-                ON CONFLICT(question_id, date) DO UPDATE SET
-                    times_asked = times_asked + 1,
-                    times_correct = times_correct + ?,
-                    total_response_time = total_response_time + ?,
-                    avg_response_time = (total_response_time + ?) / (times_asked + 1),
-                    accuracy_rate = CAST(times_correct + ? AS REAL) / (times_asked + 1) * 100,
-                    updated_at = CURRENT_TIMESTAMP
-            """, (question_id, today, 1 if is_correct else 0, response_time,
-                  1 if is_correct else 0, response_time, response_time, 1 if is_correct else 0))
+                SELECT seen_bitmap FROM user_seen_questions WHERE user_id = ?
+            """, (user_id,))
+            row = cursor.fetchone()
+            seen = SeenQuestionSet.from_blob(row['seen_bitmap'] if row else None)
             
-            # Update daily category stats
+            # Include answers still waiting in the append-only log
             cursor.execute("""
-                SELECT category_id, subcategory_id FROM questions_normalized 
-                WHERE id = ?
-            """, (question_id,))
-            
-            question_info = cursor.fetchone()
-            if question_info:
-                category_id = question_info['category_id']
-                subcategory_id = question_info['subcategory_id']
-                
-                cursor.execute("""
-                    INSERT INTO daily_category_stats 
-                    (category_id, subcategory_id, date, questions_asked, questions_correct)
-                    VALUES (?, ?, ?, 1, ?)
-                    ON CONFLICT(category_id, subcategory_id, date) DO UPDATE SET
-                        questions_asked = questions_asked + 1,
-                        questions_correct = questions_correct + ?,
-                        accuracy_rate = CAST(questions_correct AS REAL) / questions_asked * 100,
-                        updated_at = CURRENT_TIMESTAMP
-                """, (category_id, subcategory_id, today, 1 if is_correct else 0,
-                      1 if is_correct else 0))
-            
-            conn.commit()
+                SELECT DISTINCT question_id FROM answer_events WHERE user_id = ?
+            """, (user_id,))
+            seen.update(row['question_id'] for row in cursor.fetchall())
+            return seen
     
     def get_daily_stats(self, date_str: str = None) -> Dict:
         """
@@ -246,6 +681,8 @@ class QuizStatsManager:
             
             category_stats = [dict(row) for row in cursor.fetchall()]
             
+            self._merge_answer_event_tail(cursor, date_str, question_stats, category_stats)
+            
             return {
                 'date': date_str,
                 'question_stats': question_stats,
@@ -253,6 +690,455 @@ class QuizStatsManager:
                 'summary': self._calculate_daily_summary(question_stats)
             }
     
+    def get_daily_stats_range(self, start_date: str, end_date: str) -> List[Dict]:
+        """
+        Get daily summaries and category breakdowns for every active day in a date range
+        
+        Runs one grouped query per breakdown for the whole range instead of one
+        get_daily_stats call per day. Answers still in the append-only log are included.
+        
+        Args:
+            start_date: First date in YYYY-MM-DD format
+            end_date: Last date in YYYY-MM-DD format (inclusive)
+            
+        Returns:
+            List of {'date', 'summary', 'category_stats'} dictionaries in date order,
+            shaped like get_daily_stats results, for days with at least one answer
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            
+            # Per-day totals
+            cursor.execute("""
+                SELECT 
+                    date,
+                    SUM(times_asked) as total_questions_asked,
+                    SUM(times_correct) as total_correct_answers,
+                    SUM(total_response_time) as total_response_time
+                FROM (
+                    SELECT date, times_asked, times_correct, total_response_time
+                    FROM daily_question_stats
+                    WHERE date BETWEEN ? AND ?
+                    UNION ALL
+                    SELECT date, 1, is_correct, response_time
+                    FROM answer_events
+                    WHERE date BETWEEN ? AND ?
+                )
+                GROUP BY date
+                HAVING SUM(times_asked) > 0
+                ORDER BY date
+            """, (start_date, end_date, start_date, end_date))
+            
+            days: Dict[str, Dict] = {}
+            for row in cursor.fetchall():
+                asked = row['total_questions_asked']
+                correct = row['total_correct_answers']
+                days[row['date']] = {
+                    'date': row['date'],
+                    'summary': {
+                        'total_questions_asked': asked,
+                        'total_correct_answers': correct,
+                        'overall_accuracy': correct / asked * 100,
+                        'avg_response_time': row['total_response_time'] / asked
+                    },
+                    'category_stats': []
+                }
+            if not days:
+                return []
+            
+            # Per-day category breakdown
+            cursor.execute("""
+                SELECT 
+                    s.date, s.category_id, s.subcategory_id,
+                    SUM(s.questions_asked) as questions_asked,
+                    SUM(s.questions_correct) as questions_correct,
+                    c.display_name as category, sc.display_name as subcategory
+                FROM (
+                    SELECT date, category_id, subcategory_id, questions_asked, questions_correct
+                    FROM daily_category_stats
+                    WHERE date BETWEEN ? AND ?
+                    UNION ALL
+                    SELECT e.date, qn.category_id, qn.subcategory_id, 1, e.is_correct
+                    FROM answer_events e
+                    JOIN questions_normalized qn ON e.question_id = qn.id
+                    WHERE e.date BETWEEN ? AND ?
+                ) s
+                JOIN categories c ON s.category_id = c.id
+                LEFT JOIN subcategories sc ON s.subcategory_id = sc.id
+                GROUP BY s.date, s.category_id, s.subcategory_id
+                HAVING SUM(s.questions_asked) > 0
+                ORDER BY s.date, questions_asked DESC
+            """, (start_date, end_date, start_date, end_date))
+            
+            for row in cursor.fetchall():
+                day = days.get(row['date'])
+                if day is None:
+                    continue
+                category_stat = dict(row)
+                category_stat['accuracy_rate'] = row['questions_correct'] / row['questions_asked'] * 100
+                day['category_stats'].append(category_stat)
+            
+            return list(days.values())
+    
+    def _read_answer_event_tail(self, cursor: sqlite3.Cursor, start_date: str, end_date: str) -> List[AnswerEvent]:
+        """Get the answers of a date range not yet compacted from the append-only log"""
+        cursor.execute(f"""
+            SELECT {', '.join(ANSWER_EVENT_COLUMNS)} FROM answer_events
+            WHERE date BETWEEN ? AND ?
+        """, (start_date, end_date))
+        return [AnswerEvent(**{column: row[column] for column in ANSWER_EVENT_COLUMNS}) for row in cursor.fetchall()]
+    
+    def get_rollup_series(self, start_date: str, end_date: str, granularity: str = None) -> Dict:
+        """
+        Get answer and session activity per hour, day, week or month over a date range
+        
+        Args:
+            start_date: First date in YYYY-MM-DD format
+            end_date: Last date in YYYY-MM-DD format (inclusive)
+            granularity: 'hour', 'day', 'week' or 'month'; by default the coarsest that
+                still gives a readable chart for the range
+            
+        Returns:
+            {'granularity', 'buckets'} where buckets is a list of {'bucket_start', 'answers',
+            'correct_answers', 'accuracy_rate', 'avg_response_time', 'sessions_started',
+            'sessions_completed'} dictionaries in time order, for buckets with any activity
+        """
+        start, end = date.fromisoformat(start_date), date.fromisoformat(end_date)
+        granularity = granularity or stats_rollups.choose_granularity(start, end)
+        
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            series = stats_rollups.read_series(cursor, granularity, start, end)
+            tail = self._read_answer_event_tail(cursor, start_date, end_date)
+        
+        # Answers still in the append-only log count towards their buckets
+        _, _, activity = stats_rollups.aggregate_answers(tail, {}, datetime.now(timezone.utc), (granularity,))
+        for (_, bucket), (asked, correct, response_time) in activity.items():
+            totals = series.setdefault(bucket, [0, 0, 0.0, 0, 0])
+            totals[0] += asked
+            totals[1] += correct
+            totals[2] += response_time
+        
+        return {
+            'granularity': granularity,
+            'buckets': [{
+                'bucket_start': bucket,
+                'answers': answers,
+                'correct_answers': correct,
+                'accuracy_rate': correct / answers * 100 if answers else 0.0,
+                'avg_response_time': response_time / answers if answers else 0.0,
+                'sessions_started': started,
+                'sessions_completed': completed
+            } for bucket, (answers, correct, response_time, started, completed) in sorted(series.items())]
+        }
+    
+    def get_rollup_totals(self, start_date: str, end_date: str) -> Dict:
+        """
+        Get question, category and overall totals for a date range of any length
+        
+        The totals are read from the fewest monthly, weekly and daily rollup buckets
+        covering the range, so the cost barely grows with its length. Answers still
+        in the append-only log are included.
+        
+        Args:
+            start_date: First date in YYYY-MM-DD format
+            end_date: Last date in YYYY-MM-DD format (inclusive)
+            
+        Returns:
+            {'summary', 'question_stats', 'category_stats'}, with question and category
+            stats sorted by answers given
+        """
+        start, end = date.fromisoformat(start_date), date.fromisoformat(end_date)
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            questions, categories, activity = stats_rollups.read_totals(cursor, start, end)
+            tail = self._read_answer_event_tail(cursor, start_date, end_date)
+            cursor.execute("SELECT id, display_name FROM categories")
+            category_names = {row['id']: row['display_name'] for row in cursor.fetchall()}
+            cursor.execute("SELECT id, display_name FROM subcategories")
+            subcategory_names = {row['id']: row['display_name'] for row in cursor.fetchall()}
+        
+        if tail:
+            tail_questions, tail_categories, tail_activity = stats_rollups.aggregate_answers(
+                tail, self.question_metadata.get_many({answer.question_id for answer in tail}),
+                datetime.now(timezone.utc), ('day',))
+            for merged, totals_by_key, key_of in (
+                    (questions, tail_questions, lambda key: key[2]),
+                    (categories, tail_categories, lambda key: key[2:]),
+                    (activity, tail_activity, lambda key: 'all')):
+                for key, (asked, correct, response_time) in totals_by_key.items():
+                    totals = merged.setdefault(key_of(key), [0, 0, 0.0])
+                    totals[0] += asked
+                    totals[1] += correct
+                    totals[2] += response_time
+        
+        answers, correct, response_time, started, completed = activity['all']
+        question_stats = [{
+            'question_id': question_id,
+            'times_asked': asked,
+            'times_correct': correct_answers,
+            'accuracy_rate': correct_answers / asked * 100,
+            'avg_response_time': total_time / asked
+        } for question_id, (asked, correct_answers, total_time) in questions.items() if asked]
+        category_stats = [{
+            'category_id': category_id,
+            'subcategory_id': subcategory_id or None,
+            'category': category_names.get(category_id),
+            'subcategory': subcategory_names.get(subcategory_id),
+            'questions_asked': asked,
+            'questions_correct': correct_answers,
+            'accuracy_rate': correct_answers / asked * 100,
+            'avg_response_time': total_time / asked
+        } for (category_id, subcategory_id), (asked, correct_answers, total_time) in categories.items() if asked]
+        question_stats.sort(key=lambda stat: stat['times_asked'], reverse=True)
+        category_stats.sort(key=lambda stat: stat['questions_asked'], reverse=True)
+        
+        return {
+            'summary': {
+                'total_questions_asked': answers,
+                'total_correct_answers': correct,
+                'overall_accuracy': correct / answers * 100 if answers else 0.0,
+                'avg_response_time': response_time / answers if answers else 0.0,
+                'sessions_started': started,
+                'sessions_completed': completed
+            },
+            'question_stats': question_stats,
+            'category_stats': category_stats
+        }
+    
+    def get_response_time_percentiles(self, start_date: str, end_date: str, scope: str = 'all',
+                                      scope_ids: Optional[List[int]] = None,
+                                      quantiles: tuple = (0.5, 0.9, 0.99)) -> Dict[int, Dict]:
+        """
+        Get response-time percentiles over a date range
+        
+        The stored daily sketches of the range are merged, together with answers still
+        in the append-only log, so any range costs one read per day and scope ID.
+        Percentiles are within 1% of the exact values.
+        
+        Args:
+            start_date: First date in YYYY-MM-DD format
+            end_date: Last date in YYYY-MM-DD format (inclusive)
+            scope: 'all', 'subcategory' or 'question'; per-question sketches are only
+                kept for the last 30 days
+            scope_ids: Subcategory or question IDs to include (default: all of them)
+            quantiles: Quantiles to compute, between 0 and 1
+            
+        Returns:
+            Dictionary of scope ID (0 for 'all') to {'count', 'p50', 'p90', 'p99'}, with
+            one 'p<N>' key per quantile; subcategories also get 'category' and 'subcategory' names
+        """
+        if scope not in sketches.SKETCH_SCOPES:
+            raise ValueError(f"Unknown sketch scope: {scope}")
+        
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            merged = sketches.read_sketches(cursor, scope, start_date, end_date, scope_ids)
+            tail = self._read_answer_event_tail(cursor, start_date, end_date)
+            names = {}
+            if scope == 'subcategory':
+                cursor.execute("""
+                    SELECT s.id, s.display_name as subcategory, c.display_name as category
+                    FROM subcategories s
+                    JOIN categories c ON s.category_id = c.id
+                """)
+                names = {row['id']: {'category': row['category'], 'subcategory': row['subcategory']}
+                         for row in cursor.fetchall()}
+        
+        if tail:
+            question_categories = self.question_metadata.get_many({answer.question_id for answer in tail})
+            for (key_scope, scope_id, _), values in self._response_times_by_sketch(tail, question_categories).items():
+                if key_scope != scope or (scope_ids is not None and scope_id not in scope_ids):
+                    continue
+                merged.setdefault(scope_id, sketches.DDSketch()).add_all(values)
+        
+        percentiles = {}
+        for scope_id, sketch in merged.items():
+            stats = {'count': sketch.count}
+            for q, value in zip(quantiles, sketch.quantiles(quantiles)):
+                stats[f"p{q * 100:g}"] = value
+            stats.update(names.get(scope_id, {}))
+            percentiles[scope_id] = stats
+        return percentiles
+    
+    def _count_distinct(self, granularity: str, first_bucket: str, last_bucket: str,
+                        quiz_type: Optional[str]) -> Dict[str, int]:
+        """Merge the distinct-user and distinct-session counters of a bucket range, with the append-only tail"""
+        quiz_type = quiz_type or session_leaderboard.ALL_QUIZ_TYPES
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            counters = {kind: distinct_counts.merge_counters(distinct_counts.read_counters(
+                            cursor, kind, granularity, quiz_type, first_bucket, last_bucket).values())
+                        for kind in distinct_counts.DISTINCT_KINDS}
+            tail = self._read_answer_event_tail(cursor, first_bucket[:10], last_bucket[:10])
+            tail_values = self._distinct_values(cursor, tail) if tail else {}
+        
+        for (kind, key_granularity, key_type, bucket), values in tail_values.items():
+            if (key_granularity, key_type) == (granularity, quiz_type) and first_bucket <= bucket <= last_bucket:
+                counters[kind].add_all(values)
+        return {kind: counter.count() for kind, counter in counters.items()}
+    
+    def get_distinct_counts(self, start_date: str, end_date: str, quiz_type: str = None) -> Dict[str, int]:
+        """
+        Estimate the distinct players and sessions of a date range
+        
+        Daily HyperLogLog counters of the range are merged, so a player active on
+        several days counts once. Estimates are within about 2%.
+        
+        Args:
+            start_date: First date in YYYY-MM-DD format
+            end_date: Last date in YYYY-MM-DD format (inclusive)
+            quiz_type: Optional session name to count only one quiz
+            
+        Returns:
+            {'users': distinct usernames, 'sessions': distinct sessions}
+        """
+        return self._count_distinct('day', start_date, end_date, quiz_type)
+    
+    def get_distinct_counts_since(self, since: datetime, quiz_type: str = None) -> Dict[str, int]:
+        """
+        Estimate the distinct players and sessions from an hour until now
+        
+        Hourly counters are merged, so the range can start at any hour in the last
+        14 days, e.g. midnight in the viewer's time zone.
+        
+        Args:
+            since: Start time; counting starts at the beginning of its UTC hour
+            quiz_type: Optional session name to count only one quiz
+            
+        Returns:
+            {'users': distinct usernames, 'sessions': distinct sessions}
+        """
+        first_bucket, last_bucket = distinct_counts.hour_buckets(since.astimezone(timezone.utc),
+                                                                 datetime.now(timezone.utc))
+        return self._count_distinct('hour', first_bucket, last_bucket, quiz_type)
+    
+    def _merge_answer_event_tail(self, cursor: sqlite3.Cursor, date_str: str,
+                                 question_stats: List[Dict], category_stats: List[Dict]):
+        """Add answers not yet compacted from the append-only log to a day's question and category stats"""
+        cursor.execute("""
+            SELECT 
+                e.question_id,
+                COUNT(*) as times_asked,
+                SUM(CASE WHEN e.is_correct = 1 THEN 1 ELSE 0 END) as times_correct,
+                SUM(e.response_time) as total_response_time,
+                qn.question, qn.category_id, qn.subcategory_id,
+                c.display_name as category, sc.display_name as subcategory
+            FROM answer_events e
+            JOIN questions_normalized qn ON e.question_id = qn.id
+            JOIN categories c ON qn.category_id = c.id
+            LEFT JOIN subcategories sc ON qn.subcategory_id = sc.id
+            WHERE e.date = ?
+            GROUP BY e.question_id
+        """, (date_str,))
+        tail = [dict(row) for row in cursor.fetchall()]
+        if not tail:
+            return
+        
+        questions_by_id = {stat['question_id']: stat for stat in question_stats}
+        categories_by_id = {(stat['category_id'], stat['subcategory_id']): stat for stat in category_stats}
+        for event_stat in tail:
+            stat = questions_by_id.get(event_stat['question_id'])
+            if stat is None:
+                stat = {
+                    'question_id': event_stat['question_id'], 'date': date_str,
+                    'times_asked': 0, 'times_correct': 0, 'total_response_time': 0.0,
+                    'question': event_stat['question'], 'category': event_stat['category'],
+                    'subcategory': event_stat['subcategory']
+                }
+                question_stats.append(stat)
+            stat['times_asked'] += event_stat['times_asked']
+            stat['times_correct'] += event_stat['times_correct']
+            stat['total_response_time'] += event_stat['total_response_time']
+            stat['avg_response_time'] = stat['total_response_time'] / stat['times_asked']
+            stat['accuracy_rate'] = stat['times_correct'] / stat['times_asked'] * 100
+            
+            key = (event_stat['category_id'], event_stat['subcategory_id'])
+            category_stat = categories_by_id.get(key)
+            if category_stat is None:
+                category_stat = categories_by_id[key] = {
+                    'category_id': key[0], 'subcategory_id': key[1], 'date': date_str,
+                    'questions_asked': 0, 'questions_correct': 0, 'total_questions': 0,
+                    'avg_response_time': 0.0, 'category': event_stat['category'],
+                    'subcategory': event_stat['subcategory']
+                }
+                category_stats.append(category_stat)
+            category_stat['questions_asked'] += event_stat['times_asked']
+            category_stat['questions_correct'] += event_stat['times_correct']
+            category_stat['accuracy_rate'] = category_stat['questions_correct'] / category_stat['questions_asked'] * 100
+        
+        question_stats.sort(key=lambda stat: stat['times_asked'], reverse=True)
+        category_stats.sort(key=lambda stat: stat['questions_asked'], reverse=True)
+    
+    def compact_answer_events(self, batch_size: int = 5000) -> int:
+        """
+        Fold logged answer events into the aggregates and remove them from the log
+        
+        Each batch is folded and deleted in one transaction, so events are counted
+        exactly once even with several compacting processes.
+        
+        Args:
+            batch_size: Maximum number of events folded per transaction
+            
+        Returns:
+            Number of events compacted
+        """
+        compacted = 0
+        while True:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                # Take the write lock before reading so concurrent compactors never fold the same events
+                cursor.execute("BEGIN IMMEDIATE")
+                cursor.execute(f"""
+                    SELECT id, {', '.join(ANSWER_EVENT_COLUMNS)} FROM answer_events
+                    ORDER BY id
+                    LIMIT ?
+                """, (batch_size,))
+                rows = cursor.fetchall()
+                if rows:
+                    self._apply_answers(cursor, [
+                        AnswerEvent(**{column: row[column] for column in ANSWER_EVENT_COLUMNS}) for row in rows
+                    ])
+                    cursor.execute("DELETE FROM answer_events WHERE id <= ?", (rows[-1]['id'],))
+                conn.commit()
+            compacted += len(rows)
+            if len(rows) < batch_size:
+                break
+        
+        if compacted:
+            logging.info("Compacted %d answer events", compacted)
+        return compacted
+    
+    def start_compaction(self, interval: float = 30.0):
+        """
+        Compact the answer log every `interval` seconds in a background thread
+        
+        Args:
+            interval: Seconds between compaction runs
+        """
+        if self._compaction_thread is not None:
+            return
+        
+        def run():
+            while not self._compaction_stop.wait(interval):
+                try:
+                    self.compact_answer_events()
+                except Exception as e:
+                    logging.error("Answer event compaction failed: %s", e)
+        
+        self._compaction_stop.clear()
+        self._compaction_thread = threading.Thread(target=run, name='answer-compaction', daemon=True)
+        self._compaction_thread.start()
+    
+    def stop_compaction(self):
+        """Stop the background compaction thread and fold in the remaining events"""
+        if self._compaction_thread is None:
+            return
+        self._compaction_stop.set()
+        self._compaction_thread.join()
+        self._compaction_thread = None
+        self.compact_answer_events()
+    
     def _calculate_daily_summary(self, question_stats: List[Dict]) -> Dict:
         """Calculate summary statistics for the day"""
         if not question_stats:
@@ -319,6 +1205,10 @@ class QuizStatsManager:
         """
         Rollover daily stats to weekly historical stats and clean up old daily data
         This should be run weekly to maintain database performance
+        
+        Returns:
+            Dictionary with the week ending date, the number of weekly question rows written,
+            the numbers of daily question stats and answer rows removed, and the cutoff dates used
         """
         with self.get_connection() as conn:
             cursor = conn.cursor()
@@ -346,13 +1236,35 @@ class QuizStatsManager:
                 GROUP BY question_id
                 HAVING SUM(times_asked) > 0
             """, (week_ending.isoformat(), week_start.isoformat(), week_ending.isoformat()))
+            stats_aggregated = cursor.rowcount
             
             # Remove old daily stats (keep last 30 days)
             cutoff_date = today - timedelta(days=30)
+            
+            # Keep usage totals in step with the daily rows about to be deleted
+            cursor.execute("""
+                UPDATE question_usage_totals SET
+                    times_asked = times_asked - (
+                        SELECT COALESCE(SUM(dqs.times_asked), 0) FROM daily_question_stats dqs
+                        WHERE dqs.question_id = question_usage_totals.question_id AND dqs.date < ?
+                    ),
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE question_id IN (
+                    SELECT question_id FROM daily_question_stats WHERE date < ?
+                )
+            """, (cutoff_date.isoformat(), cutoff_date.isoformat()))
+            cursor.execute("""
+                DELETE FROM question_usage_totals
+                WHERE times_asked <= 0 AND question_id IN (
+                    SELECT question_id FROM daily_question_stats WHERE date < ?
+                )
+            """, (cutoff_date.isoformat(),))
+            
             cursor.execute("""
                 DELETE FROM daily_question_stats 
                 WHERE date < ?
             """, (cutoff_date.isoformat(),))
+            daily_stats_removed = cursor.rowcount
             
             cursor.execute("""
                 DELETE FROM daily_category_stats 
@@ -361,38 +1273,154 @@ class QuizStatsManager:
             
             # Remove old session data (keep last 7 days)
             session_cutoff = today - timedelta(days=7)
+            # Timestamps are stored as 'YYYY-MM-DD HH:MM:SS', so comparing them with the bare
+            # date matches DATE(timestamp) < date while still using the timestamp index
             cursor.execute("""
                 DELETE FROM quiz_sessions 
-                WHERE DATE(timestamp) < ?
+                WHERE timestamp < ?
             """, (session_cutoff.isoformat(),))
+            sessions_removed = cursor.rowcount
+            
+            # Hourly and daily rollups outlive the daily tables but are pruned too
+            stats_rollups.prune(cursor, today)
+            distinct_counts.prune(cursor, today)
+            sketches.prune_sketches(
+                cursor, (today - timedelta(days=sketches.QUESTION_SKETCH_RETENTION_DAYS)).isoformat(),
+                (today - timedelta(days=sketches.SKETCH_RETENTION_DAYS)).isoformat())
+            self._bump_stats_version(cursor)
             
             conn.commit()
+            self.notify_write()
             
             return {
                 'week_ending': week_ending.isoformat(),
-                'stats_aggregated': cursor.rowcount,
-                'old_daily_stats_removed': cutoff_date.isoformat(),
-                'old_sessions_removed': session_cutoff.isoformat()
+                'stats_aggregated': stats_aggregated,
+                'old_daily_stats_removed': daily_stats_removed,
+                'old_sessions_removed': sessions_removed,
+                'daily_stats_cutoff': cutoff_date.isoformat(),
+                'session_cutoff': session_cutoff.isoformat()
             }
     
-    def get_trending_questions(self, limit: int = 10, period_days: int = 7) -> List[Dict]:
+    def _rebuild_usage_totals(self, cursor: sqlite3.Cursor) -> int:
+        """Recompute question_usage_totals from daily_question_stats using the given cursor"""
+        cursor.execute("DELETE FROM question_usage_totals")
+        cursor.execute("""
+            INSERT INTO question_usage_totals (question_id, times_asked)
+            SELECT question_id, SUM(times_asked)
+            FROM daily_question_stats
+            GROUP BY question_id
+            HAVING SUM(times_asked) > 0
+        """)
+        return cursor.rowcount
+    
+    def rebuild_usage_totals(self) -> int:
+        """
+        Rebuild the question usage totals from the raw daily statistics
+        
+        Returns:
+            Number of questions with a usage total
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            rebuilt = self._rebuild_usage_totals(cursor)
+            conn.commit()
+        
+        logging.info("Rebuilt usage totals for %d questions", rebuilt)
+        return rebuilt
+    
+    def rebuild_leaderboards(self) -> int:
+        """
+        Recompute the precomputed session leaderboards from session_stats
+        
+        Returns:
+            Number of leaderboard entries
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            session_leaderboard.rebuild(cursor)
+            cursor.execute("SELECT COUNT(*) FROM session_leaderboard")
+            entries = cursor.fetchone()[0]
+            self._bump_stats_version(cursor)
+            conn.commit()
+        
+        self.notify_write()
+        logging.info("Rebuilt session leaderboards with %d entries", entries)
+        return entries
+    
+    def rebuild_rollups(self) -> int:
+        """
+        Recompute the hourly, daily, weekly and monthly rollups from the retained statistics
+        
+        Returns:
+            Number of activity buckets
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            stats_rollups.rebuild(cursor)
+            cursor.execute("SELECT COUNT(*) FROM rollup_session_stats")
+            buckets = cursor.fetchone()[0]
+            self._bump_stats_version(cursor)
+            conn.commit()
+        
+        self.notify_write()
+        logging.info("Rebuilt stats rollups with %d activity buckets", buckets)
+        return buckets
+    
+    def get_trending_questions(self, limit: int = 10, period_days: int = 7,
+                               order_by: str = ORDER_BY_VOLUME) -> List[Dict]:
         """
         Get trending questions based on recent activity and difficulty
         
+        Periods up to the trending engine's window are ranked from its in-memory day
+        buckets; longer ones are aggregated from daily_question_stats.
+        
         Args:
             limit: Number of questions to return
             period_days: Number of days to consider for trending
+            order_by: 'volume' for the most answered questions, 'difficulty' for the
+                lowest accuracy
             
         Returns:
             List of trending questions with stats
         """
+        if period_days > self.trending.window_days:
+            return self._query_trending_questions(limit, period_days, order_by)
+        
+        ranked = self.trending.top(limit, period_days, order_by)
+        if not ranked:
+            return []
+        question_ids = [entry['question_id'] for entry in ranked]
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT 
+                    qn.id as question_id,
+                    qn.question,
+                    qn.difficulty,
+                    c.display_name as category,
+                    sc.display_name as subcategory
+                FROM questions_normalized qn
+                JOIN categories c ON qn.category_id = c.id
+                LEFT JOIN subcategories sc ON qn.subcategory_id = sc.id
+                WHERE qn.id IN ({','.join('?' for _ in question_ids)})
+            """, question_ids)
+            details = {row['question_id']: dict(row) for row in cursor.fetchall()}
+        
+        return [{**details[entry['question_id']], **entry} for entry in ranked
+                if entry['question_id'] in details]
+    
+    def _query_trending_questions(self, limit: int, period_days: int, order_by: str) -> List[Dict]:
+        """Rank trending questions with one aggregate over daily_question_stats"""
         end_date = date.today()
         start_date = end_date - timedelta(days=period_days-1)
+        order = ("total_asked DESC, avg_accuracy ASC" if order_by == ORDER_BY_VOLUME
+                 else "avg_accuracy ASC, total_asked DESC") + ", dqs.question_id"
         
         with self.get_connection() as conn:
             cursor = conn.cursor()
             
-            cursor.execute("""
+            # Accuracy and response time are weighted by volume, not averaged over days
+            cursor.execute(f"""
                 SELECT 
                     dqs.question_id,
                     qn.question,
@@ -401,23 +1429,24 @@ class QuizStatsManager:
                     sc.display_name as subcategory,
                     SUM(dqs.times_asked) as total_asked,
                     SUM(dqs.times_correct) as total_correct,
-                    AVG(dqs.accuracy_rate) as avg_accuracy,
-                    AVG(dqs.avg_response_time) as avg_response_time
+                    SUM(dqs.times_correct) * 100.0 / SUM(dqs.times_asked) as avg_accuracy,
+                    SUM(dqs.total_response_time) / SUM(dqs.times_asked) as avg_response_time
                 FROM daily_question_stats dqs
                 JOIN questions_normalized qn ON dqs.question_id = qn.id
                 JOIN categories c ON qn.category_id = c.id
                 LEFT JOIN subcategories sc ON qn.subcategory_id = sc.id
                 WHERE dqs.date BETWEEN ? AND ?
                 GROUP BY dqs.question_id
-                HAVING total_asked >= 3
-                ORDER BY total_asked DESC, avg_accuracy ASC
+                HAVING total_asked >= ?
+                ORDER BY {order}
                 LIMIT ?
-            """, (start_date.isoformat(), end_date.isoformat(), limit))
+            """, (start_date.isoformat(), end_date.isoformat(), self.trending.min_asked, limit))
             
             return [dict(row) for row in cursor.fetchall()]
     
     def start_quiz_session(self, session_name: str = None, 
-                          user_id: str = None, category_filter: str = None) -> str:
+                          user_id: str = None, category_filter: str = None,
+                          session_id: str = None) -> str:
         """
         Start a new quiz session
         
@@ -425,11 +1454,12 @@ class QuizStatsManager:
             session_name: Optional name for the session
             user_id: Optional user identifier
             category_filter: Optional category filter (JSON string)
+            session_id: Optional pre-generated session ID (a new UUID by default)
             
         Returns:
             String session ID
         """
-        session_id = str(uuid.uuid4())
+        session_id = session_id or str(uuid.uuid4())
         
         with self.get_connection() as conn:
             cursor = conn.cursor()
@@ -439,14 +1469,27 @@ class QuizStatsManager:
                 (session_id, session_name, user_id, category_filter, status)
                 VALUES (?, ?, ?, ?, 'active')
             """, (session_id, session_name, user_id, category_filter))
+            stats_rollups.add_session_event(cursor, 'sessions_started')
+            now = datetime.now(timezone.utc)
+            started = {}
+            for key in distinct_counts.counter_keys(session_name, now.date(), now.hour):
+                started[('sessions',) + key] = {session_id}
+                if user_id:
+                    started[('users',) + key] = {user_id}
+            distinct_counts.add_values(cursor, started)
+            self._bump_stats_version(cursor)
             
             conn.commit()
+            self.notify_write()
             
             return session_id
     
     def update_session_stats(self, session_id: str):
         """
-        Update session statistics based on recorded answers
+        Recompute session statistics from all recorded answers
+        
+        Answers keep the session counters up to date as they are recorded; this full
+        recompute is the repair path, run when a session ends and by the consistency check.
         
         Args:
             session_id: Session identifier to update
@@ -498,12 +1541,22 @@ class QuizStatsManager:
         Returns:
             Final session statistics
         """
+        # Fold logged answers in so the session's answers are all in quiz_sessions
+        if self.append_only:
+            self.compact_answer_events()
+        
         # Update final stats
         self.update_session_stats(session_id)
         
         with self.get_connection() as conn:
             cursor = conn.cursor()
             
+            # A session ended twice is only counted as completed once
+            cursor.execute("SELECT status FROM session_stats WHERE session_id = ?", (session_id,))
+            previous = cursor.fetchone()
+            if previous and previous['status'] != 'completed':
+                stats_rollups.add_session_event(cursor, 'sessions_completed')
+            
             # Mark session as completed
             cursor.execute("""
                 UPDATE session_stats SET
@@ -521,7 +1574,13 @@ class QuizStatsManager:
             result = cursor.fetchone()
             session_stats = dict(result) if result else None
             
+            # Place a qualifying session on the precomputed leaderboards
+            if session_stats:
+                session_leaderboard.add_session(cursor, session_stats)
+            self._bump_stats_version(cursor)
+            
             conn.commit()
+            self.notify_write()
             
             return session_stats
     
@@ -610,23 +1669,49 @@ class QuizStatsManager:
             
             return [dict(row) for row in cursor.fetchall()]
     
-    def get_session_leaderboard(self, period_days: int = 7, limit: int = 10) -> List[Dict]:
+    def get_session_leaderboard(self, period_days: Optional[int] = 7, limit: int = 10,
+                                quiz_type: str = None) -> List[Dict]:
         """
         Get leaderboard of best session performances
         
+        The last 7 and 30 days and all time (period_days=None) are read from the
+        precomputed session_leaderboard boards; other periods, and limits longer than
+        a board, are computed from session_stats.
+        
         Args:
-            period_days: Number of days to look back
+            period_days: Number of days to look back, None for all time
             limit: Number of sessions to return
+            quiz_type: Optional session name to rank only sessions of one quiz
             
         Returns:
             List of top-performing sessions
         """
-        start_date = (date.today() - timedelta(days=period_days)).isoformat()
+        period = session_leaderboard.period_for_days(period_days)
+        if period is not None and limit <= session_leaderboard.LEADERBOARD_SIZE:
+            board = quiz_type or session_leaderboard.ALL_QUIZ_TYPES
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                if session_leaderboard.has_expired(cursor, period):
+                    cursor.execute("BEGIN IMMEDIATE")
+                    session_leaderboard.expire(cursor, period)
+                    conn.commit()
+                return session_leaderboard.read(cursor, period, board, limit)
+        
+        conditions = ["status = 'completed'", "total_questions >= ?"]
+        params: List = [session_leaderboard.MIN_QUESTIONS]
+        if period_days is not None:
+            conditions.append("started_at >= ?")
+            params.append((date.today() - timedelta(days=period_days)).isoformat())
+        if quiz_type:
+            conditions.append("session_name = ?")
+            params.append(quiz_type)
         
         with self.get_connection() as conn:
             cursor = conn.cursor()
             
-            cursor.execute("""
+            # started_at >= date is equivalent to DATE(started_at) >= date and can use
+            # the (status, started_at) index
+            cursor.execute(f"""
                 SELECT 
                     session_id,
                     session_name,
@@ -638,18 +1723,17 @@ class QuizStatsManager:
                     started_at,
                     ended_at
                 FROM session_stats
-                WHERE DATE(started_at) >= ? 
-                    AND status = 'completed'
-                    AND total_questions >= 5
+                WHERE {' AND '.join(conditions)}
                 ORDER BY accuracy_rate DESC, avg_response_time ASC
                 LIMIT ?
-            """, (start_date, limit))
+            """, params + [limit])
             
             return [dict(row) for row in cursor.fetchall()]
     
     def record_quiz_answer_with_session(self, session_id: str, question_id: int, 
                                        is_correct: bool, response_time: float, 
-                                       user_answer: str = None):
+                                       user_answer: str = None, user_id: str = None,
+                                       event_id: str = None) -> bool:
         """
         Record a quiz answer and automatically update session stats
         
@@ -659,18 +1743,131 @@ class QuizStatsManager:
             is_correct: Whether the answer was correct
             response_time: Time taken to answer in seconds
             user_answer: The answer provided by the user
+            user_id: Optional username whose seen questions should be updated
+            event_id: Optional idempotency key, see answer_event_id
+            
+        Returns:
+            False if the answer was a duplicate and not recorded again
         """
-        # Record the individual answer
-        self.record_quiz_answer(
+        # Record the individual answer; session counters are updated in the same transaction
+        return self.record_quiz_answer(
             question_id=question_id,
             is_correct=is_correct,
             response_time=response_time,
             session_id=session_id,
-            user_answer=user_answer
+            user_answer=user_answer,
+            user_id=user_id,
+            event_id=event_id
         )
+    
+    def check_session_consistency(self, repair: bool = True, active_only: bool = False) -> List[str]:
+        """
+        Compare running session counters with a full recompute from recorded answers
         
-        # Update session statistics
-        self.update_session_stats(session_id)
+        Args:
+            repair: Recompute the counters of inconsistent sessions, and the leaderboards
+                that completed ones among them may be on
+            active_only: Only check sessions that have not been ended
+            
+        Returns:
+            List of session IDs whose counters did not match their answers
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT s.session_id
+                FROM session_stats s
+                LEFT JOIN (
+                    SELECT session_id,
+                           COUNT(*) as total_questions,
+                           SUM(CASE WHEN is_correct = 1 THEN 1 ELSE 0 END) as correct_answers,
+                           SUM(response_time) as total_time,
+                           MIN(response_time) as fastest_answer,
+                           MAX(response_time) as slowest_answer
+                    FROM quiz_sessions
+                    GROUP BY session_id
+                ) a ON a.session_id = s.session_id
+                WHERE {"s.status = 'active' AND " if active_only else ""}(
+                    s.total_questions != COALESCE(a.total_questions, 0)
+                    OR s.correct_answers != COALESCE(a.correct_answers, 0)
+                    OR ABS(s.total_time - COALESCE(a.total_time, 0)) > 1e-6
+                    OR (a.total_questions > 0 AND (
+                        ABS(s.fastest_answer - a.fastest_answer) > 1e-6
+                        OR ABS(s.slowest_answer - a.slowest_answer) > 1e-6))
+                )
+            """)
+            inconsistent = [row['session_id'] for row in cursor.fetchall()]
+        
+        if inconsistent:
+            logging.warning("Found %d sessions with inconsistent counters", len(inconsistent))
+        if repair and inconsistent:
+            for session_id in inconsistent:
+                self.update_session_stats(session_id)
+            self._refill_leaderboards_of(inconsistent)
+        return inconsistent
+    
+    def _refill_leaderboards_of(self, session_ids: List[str]):
+        """Reload the leaderboards completed sessions among session_ids may be on, after their counters changed"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            quiz_types = set()
+            for chunk in chunked(session_ids):
+                cursor.execute(f"""
+                    SELECT DISTINCT COALESCE(session_name, '') FROM session_stats
+                    WHERE status = 'completed' AND session_id IN ({', '.join('?' for _ in chunk)})
+                """, chunk)
+                quiz_types.update(row[0] for row in cursor.fetchall())
+            if not quiz_types:
+                return
+            # A repaired session may rise onto, drop off or move within the all-types board too
+            quiz_types.add(session_leaderboard.ALL_QUIZ_TYPES)
+            session_leaderboard.refill_boards(cursor, sorted(quiz_types))
+            self._bump_stats_version(cursor)
+            conn.commit()
+        logging.info("Refilled session leaderboards for %d quiz types after repairing sessions", len(quiz_types))
+        self.notify_write()
 
 # Initialize default stats manager
-quiz_stats = QuizStatsManager()
+quiz_stats = QuizStatsManager(append_only=append_only_enabled())
+# Registered before the answer recorder's drain, so it runs after it at exit
+atexit.register(quiz_stats.stop_compaction)
+
+
+def main():
+    """Command line entry point for statistics maintenance tasks"""
+    parser = argparse.ArgumentParser(description="Quiz statistics maintenance")
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help="Path to the quiz database")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('rebuild-usage-totals', help="Recompute question usage totals from daily stats")
+    subparsers.add_parser('rollover', help="Roll daily stats over into weekly history")
+    subparsers.add_parser('rebuild-leaderboards', help="Recompute the session leaderboards from session stats")
+    subparsers.add_parser('rebuild-rollups', help="Recompute the hourly/daily/weekly/monthly rollups")
+    subparsers.add_parser('compact', help="Fold the append-only answer log into the aggregates")
+    subparsers.add_parser('migrate', help="Apply pending schema migrations and show the schema version")
+    check_sessions = subparsers.add_parser('check-sessions', help="Verify running session counters against recorded answers")
+    check_sessions.add_argument('--no-repair', action='store_true', help="Only report inconsistent sessions")
+    args = parser.parse_args()
+    
+    manager = QuizStatsManager(args.db)
+    if args.command == 'rebuild-usage-totals':
+        print(f"Rebuilt usage totals for {manager.rebuild_usage_totals()} questions")
+    elif args.command == 'rebuild-leaderboards':
+        print(f"Rebuilt session leaderboards with {manager.rebuild_leaderboards()} entries")
+    elif args.command == 'rebuild-rollups':
+        print(f"Rebuilt stats rollups with {manager.rebuild_rollups()} activity buckets")
+    elif args.command == 'rollover':
+        print(manager.rollover_weekly_stats())
+    elif args.command == 'compact':
+        print(f"Compacted {manager.compact_answer_events()} answer events")
+    elif args.command == 'migrate':
+        # The first connection creates the tables and applies any pending migrations
+        with manager.get_connection() as conn:
+            print(f"Stats schema at version {get_schema_version(conn.cursor())}")
+    elif args.command == 'check-sessions':
+        inconsistent = manager.check_session_consistency(repair=not args.no_repair)
+        action = "Found" if args.no_repair else "Repaired"
+        print(f"{action} {len(inconsistent)} inconsistent sessions")
+
+
+if __name__ == '__main__':
+    main()
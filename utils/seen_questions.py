@@ -0,0 +1,52 @@
+"""
+Compact per-user record of which questions have already been seen.
+
+Question IDs are small dense integers, so a plain bitmap (bit n set = question n
+seen) is both tiny and O(1) to query. The bitmap is zlib-compressed for storage.
+"""
+import zlib
+from typing import Iterable, Optional
+
+
+class SeenQuestionSet:
+    """
+    Set of question IDs backed by a bytearray bitmap
+    """
+
+    __slots__ = ('_bits',)
+
+    def __init__(self, bitmap: Optional[bytes] = None):
+        self._bits = bytearray(bitmap or b'')
+
+    @classmethod
+    def from_blob(cls, blob: Optional[bytes]) -> 'SeenQuestionSet':
+        """Create a set from a compressed bitmap as stored in the database"""
+        return cls(zlib.decompress(blob) if blob else None)
+
+    def to_blob(self) -> bytes:
+        """Serialize the bitmap compressed for storage"""
+        return zlib.compress(bytes(self._bits.rstrip(b'\x00')))
+
+    def add(self, question_id: int):
+        byte_index = question_id >> 3
+        if byte_index >= len(self._bits):
+            self._bits.extend(bytes(byte_index - len(self._bits) + 1))
+        self._bits[byte_index] |= 1 << (question_id & 7)
+
+    def update(self, question_ids: Iterable[int]):
+        for question_id in question_ids:
+            self.add(question_id)
+
+    def __contains__(self, question_id: int) -> bool:
+        byte_index = question_id >> 3
+        return byte_index < len(self._bits) and bool(self._bits[byte_index] & (1 << (question_id & 7)))
+
+    def __len__(self) -> int:
+        return int.from_bytes(self._bits, 'little').bit_count()
+
+    def __iter__(self):
+        for byte_index, byte in enumerate(self._bits):
+            while byte:
+                low_bit = byte & -byte
+                yield (byte_index << 3) + low_bit.bit_length() - 1
+                byte ^= low_bit
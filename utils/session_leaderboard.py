@@ -0,0 +1,169 @@
+"""
+Precomputed session leaderboards.
+
+The session_leaderboard table keeps the best LEADERBOARD_SIZE completed sessions
+for each period (last 7 days, last 30 days, all time), both across all quizzes and
+per quiz type (the session name). end_quiz_session adds a qualifying session and
+trims each board back to its size, so reading a leaderboard is one indexed range
+read instead of sorting session_stats.
+
+Entries whose session started before a period's cutoff are expired lazily. When a
+board loses entries that way it is refilled from session_stats, because sessions
+trimmed off earlier may now belong on it.
+"""
+import sqlite3
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional
+
+# Sessions kept per board; longer leaderboards are read from session_stats
+LEADERBOARD_SIZE = 50
+# Sessions with fewer answers don't qualify
+MIN_QUESTIONS = 5
+# Period name -> days looked back (None for all time)
+LEADERBOARD_PERIODS = {'7d': 7, '30d': 30, 'all': None}
+# quiz_type of the boards covering every quiz
+ALL_QUIZ_TYPES = ''
+
+LEADERBOARD_COLUMNS = ('session_id', 'session_name', 'user_id', 'total_questions', 'correct_answers',
+                       'accuracy_rate', 'avg_response_time', 'started_at', 'ended_at')
+
+
+def period_for_days(period_days: Optional[int]) -> Optional[str]:
+    """Get the precomputed period covering the last period_days days, or None if there is none"""
+    for period, days in LEADERBOARD_PERIODS.items():
+        if days == period_days:
+            return period
+    return None
+
+
+def period_cutoff(period: str, today: date = None) -> Optional[str]:
+    """Earliest started_at kept on a period's boards, or None for all time"""
+    days = LEADERBOARD_PERIODS[period]
+    if days is None:
+        return None
+    return ((today or date.today()) - timedelta(days=days)).isoformat()
+
+
+def _trim(cursor: sqlite3.Cursor, period: str, quiz_type: str):
+    cursor.execute("""
+        DELETE FROM session_leaderboard
+        WHERE period = ? AND quiz_type = ? AND session_id NOT IN (
+            SELECT session_id FROM session_leaderboard
+            WHERE period = ? AND quiz_type = ?
+            ORDER BY accuracy_rate DESC, avg_response_time ASC
+            LIMIT ?
+        )
+    """, (period, quiz_type, period, quiz_type, LEADERBOARD_SIZE))
+
+
+def refill(cursor: sqlite3.Cursor, period: str, quiz_type: str = ALL_QUIZ_TYPES, today: date = None):
+    """Reload one board with the best qualifying sessions from session_stats"""
+    cutoff = period_cutoff(period, today)
+    conditions = ["status = 'completed'", "total_questions >= ?"]
+    params: List = [MIN_QUESTIONS]
+    if cutoff is not None:
+        conditions.append("started_at >= ?")
+        params.append(cutoff)
+    if quiz_type != ALL_QUIZ_TYPES:
+        conditions.append("session_name = ?")
+        params.append(quiz_type)
+
+    cursor.execute("DELETE FROM session_leaderboard WHERE period = ? AND quiz_type = ?", (period, quiz_type))
+    cursor.execute(f"""
+        INSERT INTO session_leaderboard (period, quiz_type, {', '.join(LEADERBOARD_COLUMNS)})
+        SELECT ?, ?, {', '.join(LEADERBOARD_COLUMNS)}
+        FROM session_stats
+        WHERE {' AND '.join(conditions)}
+        ORDER BY accuracy_rate DESC, avg_response_time ASC
+        LIMIT ?
+    """, [period, quiz_type] + params + [LEADERBOARD_SIZE])
+
+
+def refill_boards(cursor: sqlite3.Cursor, quiz_types: Iterable[str], today: date = None):
+    """Reload the boards of the given quiz types for every period, e.g. after their sessions were repaired"""
+    for period in LEADERBOARD_PERIODS:
+        for quiz_type in quiz_types:
+            refill(cursor, period, quiz_type, today)
+
+
+def rebuild(cursor: sqlite3.Cursor, today: date = None):
+    """Recompute every board from session_stats"""
+    cursor.execute("DELETE FROM session_leaderboard")
+    cursor.execute("""
+        SELECT DISTINCT session_name FROM session_stats
+        WHERE status = 'completed' AND session_name IS NOT NULL AND session_name != ''
+    """)
+    refill_boards(cursor, [ALL_QUIZ_TYPES] + [row[0] for row in cursor.fetchall()], today)
+
+
+def expire(cursor: sqlite3.Cursor, period: str, today: date = None) -> int:
+    """
+    Remove entries that started before the period's cutoff and refill the boards that lost any
+
+    Returns:
+        Number of entries that aged out
+    """
+    cutoff = period_cutoff(period, today)
+    if cutoff is None:
+        return 0
+    cursor.execute("""
+        SELECT DISTINCT quiz_type FROM session_leaderboard WHERE period = ? AND started_at < ?
+    """, (period, cutoff))
+    quiz_types = [row[0] for row in cursor.fetchall()]
+    if not quiz_types:
+        return 0
+    cursor.execute("DELETE FROM session_leaderboard WHERE period = ? AND started_at < ?", (period, cutoff))
+    expired = cursor.rowcount
+    for quiz_type in quiz_types:
+        refill(cursor, period, quiz_type, today)
+    return expired
+
+
+def has_expired(cursor: sqlite3.Cursor, period: str, today: date = None) -> bool:
+    """Whether any board of the period holds an entry older than its cutoff"""
+    cutoff = period_cutoff(period, today)
+    if cutoff is None:
+        return False
+    cursor.execute("""
+        SELECT 1 FROM session_leaderboard WHERE period = ? AND started_at < ? LIMIT 1
+    """, (period, cutoff))
+    return cursor.fetchone() is not None
+
+
+def add_session(cursor: sqlite3.Cursor, session: Dict, today: date = None):
+    """
+    Put a completed session on every board it qualifies for, trimming each back to size
+
+    Args:
+        cursor: Cursor inside the transaction that completed the session
+        session: The session's session_stats row
+    """
+    if session.get('status') != 'completed' or (session.get('total_questions') or 0) < MIN_QUESTIONS:
+        return
+    quiz_types = [ALL_QUIZ_TYPES]
+    if session.get('session_name'):
+        quiz_types.append(session['session_name'])
+
+    for period in LEADERBOARD_PERIODS:
+        expire(cursor, period, today)
+        cutoff = period_cutoff(period, today)
+        if cutoff is not None and session['started_at'] < cutoff:
+            continue
+        for quiz_type in quiz_types:
+            cursor.execute(f"""
+                INSERT OR REPLACE INTO session_leaderboard (period, quiz_type, {', '.join(LEADERBOARD_COLUMNS)})
+                VALUES (?, ?, {', '.join('?' for _ in LEADERBOARD_COLUMNS)})
+            """, [period, quiz_type] + [session[column] for column in LEADERBOARD_COLUMNS])
+            _trim(cursor, period, quiz_type)
+
+
+def read(cursor: sqlite3.Cursor, period: str, quiz_type: str = ALL_QUIZ_TYPES, limit: int = 10) -> List[Dict]:
+    """Read the top sessions of one board in rank order"""
+    cursor.execute(f"""
+        SELECT {', '.join(LEADERBOARD_COLUMNS)}
+        FROM session_leaderboard
+        WHERE period = ? AND quiz_type = ?
+        ORDER BY accuracy_rate DESC, avg_response_time ASC
+        LIMIT ?
+    """, (period, quiz_type, limit))
+    return [dict(zip(LEADERBOARD_COLUMNS, row)) for row in cursor.fetchall()]
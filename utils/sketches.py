@@ -0,0 +1,256 @@
+"""
+Mergeable streaming quantile sketches for response times.
+
+DDSketch keeps counts in logarithmically sized buckets, so any quantile it returns
+is within ``relative_accuracy`` of the true value (1% by default) no matter how
+skewed the data is. Two sketches with the same accuracy merge by adding their
+bucket counts, which makes per-day sketches combinable into any date range.
+
+Sketches serialize to a compact varint encoding of their dense bucket range:
+a few hundred bytes for a day of response times. The response_time_sketches
+table keeps one serialized sketch per day for every question, every subcategory
+and all answers together ('question', 'subcategory' and 'all' scopes).
+"""
+import math
+import sqlite3
+import struct
+from typing import Dict, Iterable, List, Optional, Tuple
+from .database_utils import chunked
+
+SKETCH_FORMAT_VERSION = 1
+DEFAULT_RELATIVE_ACCURACY = 0.01
+# Values at or below this (seconds) are counted in a single zero bucket
+MIN_INDEXED_VALUE = 1e-3
+# Buckets kept at most; the lowest ones are merged first when a sketch grows past it
+MAX_BUCKETS = 2048
+
+
+def write_varint(out: bytearray, value: int):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data: bytes, offset: int):
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+class DDSketch:
+    """
+    Relative-error quantile sketch of non-negative values
+    """
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY):
+        """
+        Args:
+            relative_accuracy: Maximum relative error of returned quantiles
+        """
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def _index(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _value(self, index: int) -> float:
+        # Midpoint (in relative terms) of the bucket (gamma^(index-1), gamma^index]
+        return 2 * self._gamma ** index / (self._gamma + 1)
+
+    def add(self, value: float, count: int = 1):
+        """Add a value (count times)"""
+        value = max(value, 0.0)
+        if value <= MIN_INDEXED_VALUE:
+            self.zero_count += count
+        else:
+            index = self._index(value)
+            self.bins[index] = self.bins.get(index, 0) + count
+            if len(self.bins) > MAX_BUCKETS:
+                self._collapse()
+        self.count += count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def add_all(self, values: Iterable[float]) -> 'DDSketch':
+        for value in values:
+            self.add(value)
+        return self
+
+    def _collapse(self):
+        # Fold the lowest buckets into one; only the smallest quantiles lose accuracy
+        indexes = sorted(self.bins)
+        excess = indexes[:len(indexes) - MAX_BUCKETS + 1]
+        self.bins[excess[-1]] += sum(self.bins.pop(index) for index in excess[:-1])
+
+    def merge(self, other: 'DDSketch'):
+        """Add every value of another sketch with the same relative accuracy"""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        if len(self.bins) > MAX_BUCKETS:
+            self._collapse()
+        self.zero_count += other.zero_count
+        self.count += other.count
+        for bound in (other.min, other.max):
+            if bound is not None:
+                self.min = bound if self.min is None else min(self.min, bound)
+                self.max = bound if self.max is None else max(self.max, bound)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Get the value at a quantile
+
+        Args:
+            q: Quantile between 0 and 1, e.g. 0.99 for p99
+
+        Returns:
+            Estimated value, or None for an empty sketch
+        """
+        if not 0 <= q <= 1:
+            raise ValueError("Quantile must be between 0 and 1")
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return self.min
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if rank < seen:
+                # Bucket midpoints can fall just outside the observed range
+                return min(max(self._value(index), self.min), self.max)
+        return self.max
+
+    def quantiles(self, qs: Iterable[float]) -> List[Optional[float]]:
+        return [self.quantile(q) for q in qs]
+
+    def to_bytes(self) -> bytes:
+        """Serialize the sketch"""
+        out = bytearray(struct.pack('<Bfdd', SKETCH_FORMAT_VERSION, self.relative_accuracy,
+                                    self.min if self.min is not None else -1.0,
+                                    self.max if self.max is not None else -1.0))
+        write_varint(out, self.zero_count)
+        if self.bins:
+            low, high = min(self.bins), max(self.bins)
+            # Zigzag-encode the signed lowest index
+            write_varint(out, (low << 1) ^ (low >> 63))
+            write_varint(out, high - low + 1)
+            for index in range(low, high + 1):
+                write_varint(out, self.bins.get(index, 0))
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'DDSketch':
+        """Deserialize a sketch written by to_bytes"""
+        version, relative_accuracy, low_value, high_value = struct.unpack_from('<Bfdd', data)
+        if version != SKETCH_FORMAT_VERSION:
+            raise ValueError(f"Unsupported sketch format version: {version}")
+        # Stored as float32; round back to the accuracy the sketch was created with
+        sketch = cls(round(relative_accuracy, 6))
+        offset = struct.calcsize('<Bfdd')
+        sketch.zero_count, offset = read_varint(data, offset)
+        sketch.count = sketch.zero_count
+        if offset < len(data):
+            encoded, offset = read_varint(data, offset)
+            low = (encoded >> 1) ^ -(encoded & 1)
+            size, offset = read_varint(data, offset)
+            for index in range(low, low + size):
+                count, offset = read_varint(data, offset)
+                if count:
+                    sketch.bins[index] = count
+                    sketch.count += count
+        if sketch.count:
+            sketch.min, sketch.max = low_value, high_value
+        return sketch
+
+
+# Scope of stored sketches; 'all' sketches use scope ID 0
+SKETCH_SCOPES = ('question', 'subcategory', 'all')
+# Days of per-question sketches kept, like daily_question_stats; the other scopes are kept longer
+QUESTION_SKETCH_RETENTION_DAYS = 30
+SKETCH_RETENTION_DAYS = 400
+
+
+def sketch_keys(day: str, question_id: int, subcategory_id: Optional[int]) -> List[Tuple[str, int, str]]:
+    """(scope, scope ID, day) keys of the stored sketches an answer is added to"""
+    keys = [('question', question_id, day), ('all', 0, day)]
+    if subcategory_id:
+        keys.append(('subcategory', subcategory_id, day))
+    return keys
+
+
+def add_response_times(cursor: sqlite3.Cursor, response_times: Dict[Tuple[str, int, str], List[float]]):
+    """
+    Add response times to the stored sketches, inside the caller's write transaction
+
+    Args:
+        cursor: Cursor of a transaction that already holds the write lock, so the
+            read-merge-write of each sketch can't race another writer
+        response_times: (scope, scope ID, day) -> response times to add
+    """
+    by_scope_day: Dict[Tuple[str, str], List[int]] = {}
+    for scope, scope_id, day in response_times:
+        by_scope_day.setdefault((scope, day), []).append(scope_id)
+
+    sketches: Dict[Tuple[str, int, str], DDSketch] = {}
+    for (scope, day), scope_ids in by_scope_day.items():
+        for chunk in chunked(scope_ids):
+            cursor.execute(f"""
+                SELECT scope_id, sketch FROM response_time_sketches
+                WHERE scope = ? AND scope_id IN ({','.join('?' for _ in chunk)}) AND date = ?
+            """, [scope] + chunk + [day])
+            for scope_id, blob in cursor.fetchall():
+                sketches[(scope, scope_id, day)] = DDSketch.from_bytes(blob)
+
+    rows = []
+    for key, values in response_times.items():
+        sketch = sketches.get(key) or DDSketch()
+        sketch.add_all(values)
+        rows.append(key + (sketch.to_bytes(),))
+    cursor.executemany("""
+        INSERT OR REPLACE INTO response_time_sketches (scope, scope_id, date, sketch)
+        VALUES (?, ?, ?, ?)
+    """, rows)
+
+
+def read_sketches(cursor: sqlite3.Cursor, scope: str, start_date: str, end_date: str,
+                  scope_ids: Optional[List[int]] = None) -> Dict[int, DDSketch]:
+    """Merge the stored daily sketches of a date range, per scope ID"""
+    merged: Dict[int, DDSketch] = {}
+    for chunk in ([None] if scope_ids is None else chunked(scope_ids)):
+        conditions = ["scope = ?", "date BETWEEN ? AND ?"]
+        params: List = [scope, start_date, end_date]
+        if chunk is not None:
+            conditions.insert(1, f"scope_id IN ({','.join('?' for _ in chunk)})")
+            params[1:1] = chunk
+        cursor.execute(f"""
+            SELECT scope_id, sketch FROM response_time_sketches
+            WHERE {' AND '.join(conditions)}
+        """, params)
+        for scope_id, blob in cursor.fetchall():
+            sketch = DDSketch.from_bytes(blob)
+            if scope_id in merged:
+                merged[scope_id].merge(sketch)
+            else:
+                merged[scope_id] = sketch
+    return merged
+
+
+def prune_sketches(cursor: sqlite3.Cursor, question_cutoff: str, cutoff: str):
+    """Delete per-question sketches before question_cutoff and the others before cutoff"""
+    cursor.execute("DELETE FROM response_time_sketches WHERE scope = 'question' AND date < ?", (question_cutoff,))
+    cursor.execute("DELETE FROM response_time_sketches WHERE scope IN ('subcategory', 'all') AND date < ?",
+                   (cutoff,))
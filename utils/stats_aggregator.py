@@ -0,0 +1,530 @@
+"""
+Cross-process aggregation of answer statistics.
+
+Under gunicorn every worker process writing its own statistics contends for the
+SQLite write lock. The aggregator is a single process that owns the writer
+connection: workers send answer events to it over a Unix domain socket and it
+commits them in batches. It runs either as a sidecar
+
+    python -m utils.stats_aggregator --socket /tmp/quiz-stats.sock
+
+or is started by the gunicorn hooks in gunicorn.conf.py. Workers find it through
+QUIZ_STATS_AGGREGATOR_SOCKET and fall back to writing directly whenever it is
+unreachable.
+
+Messages are newline-delimited JSON objects:
+    {"answers": [{...AnswerEvent fields...}, ...]}   answers to record, no reply
+    {"flush": true}                                  commit pending answers, replies "ok"
+                                                     or "failed" if they could not be committed
+
+A batch that fails to commit because the database is busy or locked stays pending and
+is retried with exponential backoff. After max_attempts failures it is appended to a
+spill file (JSON lines next to the socket by default), which is replayed into the
+database after the next successful commit and when the aggregator starts.
+
+Any other error would fail the same batch again, so the batch is split and committed
+answer by answer instead. Answers that still fail on their own are appended to a
+dead-letter file in the same format (the socket path + ".dead" by default) for an
+operator to inspect, and counted in get_stats(). No answer is dropped silently.
+"""
+import argparse
+import dataclasses
+import json
+import logging
+import os
+import selectors
+import signal
+import socket
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .database_utils import DEFAULT_DB_PATH
+from .quiz_stats import AnswerEvent, QuizStatsManager, append_only_enabled
+
+DEFAULT_SOCKET_PATH = "/tmp/quiz-stats.sock"
+
+
+def aggregator_socket_path() -> Optional[str]:
+    """Socket of the aggregator workers should send answers to, if one is configured"""
+    return os.environ.get('QUIZ_STATS_AGGREGATOR_SOCKET') or None
+
+
+def _is_transient(error: Exception) -> bool:
+    """Whether a failed commit may succeed on retry: only lock contention clears by itself"""
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in message or 'busy' in message)
+
+
+class StatsAggregator:
+    """
+    Single-writer server that batches answer events from many worker processes
+    """
+
+    def __init__(self, stats_manager: QuizStatsManager, socket_path: str = DEFAULT_SOCKET_PATH,
+                 max_batch: int = 500, flush_interval: float = 0.2, max_attempts: int = 5,
+                 retry_base_delay: float = 0.5, spill_path: str = None, dead_letter_path: str = None):
+        """
+        Args:
+            stats_manager: Statistics manager owning the writer connection
+            socket_path: Path of the Unix domain socket to listen on
+            max_batch: Pending answers that trigger a commit
+            flush_interval: Maximum seconds an answer stays pending
+            max_attempts: Failed commits after which pending answers are spilled to disk
+            retry_base_delay: Seconds before the first retry of a failed commit, doubled per failure
+            spill_path: File failed answers are spilled to (default: the socket path + ".spill")
+            dead_letter_path: File answers that fail on their own are moved to
+                (default: the socket path + ".dead")
+        """
+        self.stats_manager = stats_manager
+        self.socket_path = socket_path
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.spill_path = spill_path or socket_path + '.spill'
+        self.dead_letter_path = dead_letter_path or socket_path + '.dead'
+        self._attempts = 0
+        self._retry_at = 0.0
+        self._selector = selectors.DefaultSelector()
+        self._server: Optional[socket.socket] = None
+        self._buffers: Dict[socket.socket, bytearray] = {}
+        self._pending: List[AnswerEvent] = []
+        self._oldest_pending = 0.0
+        self._stop = threading.Event()
+        # stop() writes to this pair to wake the selector
+        self._wakeup_reader, self._wakeup_writer = socket.socketpair()
+        self.received = 0
+        self.written = 0
+        self.failed = 0
+        self.spilled = 0
+        self.dead_lettered = 0
+        self.batches = 0
+
+    def bind(self):
+        """Create the listening socket, replacing a stale socket file"""
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.socket_path)
+        self._server.listen(128)
+        self._server.setblocking(False)
+        self._selector.register(self._server, selectors.EVENT_READ)
+        self._wakeup_reader.setblocking(False)
+        self._selector.register(self._wakeup_reader, selectors.EVENT_READ)
+
+    def serve_forever(self):
+        """Accept worker connections and commit their answers until stop() is called"""
+        if self._server is None:
+            self.bind()
+        logging.info("Stats aggregator listening on %s", self.socket_path)
+        self._replay_spill()
+        try:
+            while not self._stop.is_set():
+                timeout = self.flush_interval
+                if self._pending:
+                    due = max(self._oldest_pending + self.flush_interval, self._retry_at)
+                    timeout = max(0.0, due - time.monotonic())
+                for key, _ in self._selector.select(timeout):
+                    if key.fileobj is self._server:
+                        self._accept()
+                    elif key.fileobj is self._wakeup_reader:
+                        self._wakeup_reader.recv(64)
+                    else:
+                        self._read(key.fileobj)
+                if self._pending and time.monotonic() >= self._retry_at and (
+                        len(self._pending) >= self.max_batch or
+                        time.monotonic() - self._oldest_pending >= self.flush_interval):
+                    self._flush()
+        finally:
+            # Whatever cannot be committed on the way out is kept in the spill file
+            if not self._flush() and self._pending:
+                self._spill()
+            self._close()
+
+    def stop(self):
+        """Ask serve_forever to commit pending answers and return"""
+        self._stop.set()
+        try:
+            self._wakeup_writer.send(b'\0')
+        except OSError:
+            pass
+
+    def _accept(self):
+        conn, _ = self._server.accept()
+        conn.setblocking(False)
+        self._buffers[conn] = bytearray()
+        self._selector.register(conn, selectors.EVENT_READ)
+
+    def _drop(self, conn: socket.socket):
+        self._selector.unregister(conn)
+        self._buffers.pop(conn, None)
+        conn.close()
+
+    def _read(self, conn: socket.socket):
+        try:
+            data = conn.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self._drop(conn)
+            return
+
+        buffer = self._buffers[conn]
+        buffer.extend(data)
+        while True:
+            end = buffer.find(b'\n')
+            if end < 0:
+                break
+            line = bytes(buffer[:end])
+            del buffer[:end + 1]
+            self._handle(conn, line)
+
+    def _handle(self, conn: socket.socket, line: bytes):
+        try:
+            message = json.loads(line)
+        except ValueError:
+            message = None
+        if not isinstance(message, dict):
+            logging.warning("Stats aggregator ignored a malformed message")
+            return
+
+        answers = message.get('answers')
+        if answers:
+            try:
+                events = [AnswerEvent(**answer) for answer in answers]
+            except TypeError as e:
+                logging.warning("Stats aggregator ignored malformed answers: %s", e)
+                events = []
+            if events and not self._pending:
+                self._oldest_pending = time.monotonic()
+            self._pending.extend(events)
+            self.received += len(events)
+        if message.get('flush'):
+            # Retry at once, even during a backoff: the worker is waiting to end a session
+            committed = self._flush()
+            try:
+                conn.setblocking(True)
+                conn.sendall(b'ok\n' if committed else b'failed\n')
+            except OSError:
+                pass
+            finally:
+                conn.setblocking(False)
+
+    def _flush(self) -> bool:
+        """
+        Commit the pending answers, keeping them pending for a retry if the database is busy
+
+        Returns:
+            True if every pending answer is committed or, failing on its own, dead-lettered
+        """
+        if not self._pending:
+            return True
+        remaining, error = self._commit(self._pending)
+        if remaining:
+            self._pending = remaining
+            self._attempts += 1
+            self.failed += 1
+            if self._attempts >= self.max_attempts:
+                logging.error("Stats aggregator failed to write %d answers %d times, spilling them to %s: %s",
+                              len(remaining), self._attempts, self.spill_path, error)
+                self._spill()
+            else:
+                delay = self.retry_base_delay * (2 ** (self._attempts - 1))
+                self._retry_at = time.monotonic() + delay
+                logging.warning("Stats aggregator failed to write %d answers, retrying in %.1fs: %s",
+                                len(remaining), delay, error)
+            return False
+        self._pending = []
+        self._attempts = 0
+        self._retry_at = 0.0
+        self.batches += 1
+        self._replay_spill()
+        return True
+
+    def _commit(self, answers: List[AnswerEvent]) -> Tuple[List[AnswerEvent], Optional[Exception]]:
+        """
+        Commit answers in one transaction, or one by one after a non-transient error
+
+        Returns:
+            The answers left uncommitted by a transient error (busy or locked database)
+            together with that error, or ([], None) once every answer is committed or
+            dead-lettered
+        """
+        try:
+            # One transaction per call, so a failed commit leaves nothing half-written
+            self.stats_manager.record_quiz_answers(answers)
+        except Exception as e:
+            if _is_transient(e):
+                return answers, e
+            logging.warning("Stats aggregator failed to write a batch of %d answers, writing them one by one: %s",
+                            len(answers), e)
+        else:
+            self.written += len(answers)
+            return [], None
+
+        for index, answer in enumerate(answers):
+            try:
+                self.stats_manager.record_quiz_answers([answer])
+            except Exception as e:
+                if _is_transient(e):
+                    # Answers committed so far are not written twice on retry: event IDs are deduplicated
+                    return answers[index:], e
+                self._dead_letter(answer, e)
+            else:
+                self.written += 1
+        return [], None
+
+    def _dead_letter(self, answer: AnswerEvent, error: Exception):
+        """Move an answer that cannot be committed to the dead-letter file"""
+        self.dead_lettered += 1
+        line = json.dumps(dataclasses.asdict(answer))
+        try:
+            with open(self.dead_letter_path, 'a') as dead:
+                dead.write(line + '\n')
+        except OSError as e:
+            logging.critical("Stats aggregator dropped answer %s, which failed with %s and could not be "
+                             "written to %s: %s", line, error, self.dead_letter_path, e)
+            return
+        logging.error("Stats aggregator moved an answer to %s: %s", self.dead_letter_path, error)
+
+    def _spill(self):
+        """Move the pending answers to the spill file; they stay pending if it cannot be written"""
+        try:
+            with open(self.spill_path, 'a') as spill:
+                for answer in self._pending:
+                    spill.write(json.dumps(dataclasses.asdict(answer)) + '\n')
+        except OSError as e:
+            logging.critical("Stats aggregator could not spill %d answers to %s: %s",
+                             len(self._pending), self.spill_path, e)
+            self._retry_at = time.monotonic() + self.retry_base_delay * (2 ** self.max_attempts)
+            return
+        self.spilled += len(self._pending)
+        self._pending = []
+        self._attempts = 0
+        self._retry_at = 0.0
+
+    def _replay_spill(self):
+        """Write answers spilled by earlier failed commits, once the database accepts writes again"""
+        if not os.path.exists(self.spill_path):
+            return
+        try:
+            with open(self.spill_path) as spill:
+                answers = [AnswerEvent(**json.loads(line)) for line in spill if line.strip()]
+        except (OSError, ValueError, TypeError) as e:
+            logging.error("Stats aggregator could not read spilled answers from %s: %s", self.spill_path, e)
+            return
+        # Spilled answers keep their event IDs, so a replay after a crash mid-way is not double counted
+        remaining, error = self._commit(answers)
+        self.spilled -= min(self.spilled, len(answers) - len(remaining))
+        if remaining:
+            logging.error("Stats aggregator could not replay %d spilled answers from %s: %s",
+                          len(remaining), self.spill_path, error)
+            if len(remaining) < len(answers):
+                # Keep only what is still uncommitted, so dead-lettered answers are not retried
+                temp_path = self.spill_path + '.tmp'
+                try:
+                    with open(temp_path, 'w') as spill:
+                        for answer in remaining:
+                            spill.write(json.dumps(dataclasses.asdict(answer)) + '\n')
+                    os.replace(temp_path, self.spill_path)
+                except OSError as e:
+                    logging.error("Stats aggregator could not rewrite %s: %s", self.spill_path, e)
+            return
+        os.unlink(self.spill_path)
+        logging.info("Stats aggregator replayed %d spilled answers", len(answers))
+
+    def _close(self):
+        for conn in list(self._buffers):
+            self._drop(conn)
+        if self._server is not None:
+            self._selector.unregister(self._server)
+            self._server.close()
+            self._server = None
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+        self._selector.close()
+        self._wakeup_reader.close()
+        self._wakeup_writer.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get throughput counters for monitoring"""
+        return {
+            'connections': len(self._buffers),
+            'pending': len(self._pending),
+            'received': self.received,
+            'written': self.written,
+            'failed': self.failed,
+            'spilled': self.spilled,
+            'dead_lettered': self.dead_lettered,
+            'batches': self.batches
+        }
+
+
+class AggregatorClient:
+    """
+    Sends answers to the stats aggregator, writing them directly when it is unreachable
+
+    Exposes record_quiz_answers like QuizStatsManager, so it can stand in for it as the
+    answer recorder's writer.
+
+    Answers sent to the aggregator are committed by another process, so this process's
+    write listeners (analytics cache, trending engine, live stream) are only run once a
+    flush confirms the commit. Until then those readers pick the answers up through the
+    stats version poll: the live stream checks it every few seconds, the analytics page
+    on each refresh tick, and the trending engine re-reads recent days on its refresh interval.
+    """
+
+    def __init__(self, socket_path: str, fallback: QuizStatsManager, retry_interval: float = 5.0,
+                 timeout: float = 2.0):
+        """
+        Args:
+            socket_path: Path of the aggregator's Unix domain socket
+            fallback: Statistics manager used for direct writes
+            retry_interval: Seconds to keep writing directly after a failed connection
+            timeout: Socket timeout in seconds
+        """
+        self.socket_path = socket_path
+        self.fallback = fallback
+        self.retry_interval = retry_interval
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._retry_at = 0.0
+        self.sent = 0
+        self.fallbacks = 0
+
+    def _connect(self) -> Optional[socket.socket]:
+        """Get the connection to the aggregator (caller holds the lock), or None if unavailable"""
+        if self._pid != os.getpid():
+            # Never share a socket inherited from the parent process
+            self._sock = None
+            self._pid = os.getpid()
+        if self._sock is not None:
+            return self._sock
+        if time.monotonic() < self._retry_at:
+            return None
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError as e:
+            sock.close()
+            logging.warning("Stats aggregator unavailable at %s, writing directly: %s", self.socket_path, e)
+            self._retry_at = time.monotonic() + self.retry_interval
+            return None
+        self._sock = sock
+        return sock
+
+    def _disconnect(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        self._retry_at = time.monotonic() + self.retry_interval
+
+    def record_quiz_answers(self, answers: List[AnswerEvent]) -> int:
+        """
+        Send answers to the aggregator, or write them directly if it cannot be reached
+
+        Args:
+            answers: Answers to record
+
+        Returns:
+            Number of answers accepted: all of them when sent to the aggregator (which
+            drops duplicates on commit), else the number written directly
+        """
+        if not answers:
+            return 0
+        message = json.dumps({'answers': [dataclasses.asdict(answer) for answer in answers]}).encode() + b'\n'
+        with self._lock:
+            sock = self._connect()
+            if sock is not None:
+                try:
+                    sock.sendall(message)
+                    self.sent += len(answers)
+                    return len(answers)
+                except OSError as e:
+                    logging.warning("Lost connection to stats aggregator, writing directly: %s", e)
+                    self._disconnect()
+            self.fallbacks += len(answers)
+        return self.fallback.record_quiz_answers(answers)
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Ask the aggregator to commit everything sent so far and wait until it has
+
+        Returns:
+            True if the aggregator confirmed the commit (or was not in use); False if
+            the commit failed there, in which case the answers are retried or spilled
+            by the aggregator but are not in the database yet
+        """
+        with self._lock:
+            sock = self._sock
+            if sock is None:
+                return True
+            try:
+                sock.settimeout(timeout or self.timeout)
+                sock.sendall(b'{"flush": true}\n')
+                reply = b''
+                while not reply.endswith(b'\n'):
+                    chunk = sock.recv(16)
+                    if not chunk:
+                        raise ConnectionError("aggregator closed the connection")
+                    reply += chunk
+                committed = reply == b'ok\n'
+            except OSError as e:
+                logging.warning("Stats aggregator flush failed: %s", e)
+                self._disconnect()
+                return False
+            finally:
+                if self._sock is not None:
+                    self._sock.settimeout(self.timeout)
+        if committed:
+            # The answers are in the database now; let this process's caches and streams know
+            self.fallback.notify_write()
+        return committed
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get send and fallback counters for monitoring"""
+        return {
+            'socket': self.socket_path,
+            'connected': self._sock is not None,
+            'sent': self.sent,
+            'fallbacks': self.fallbacks
+        }
+
+
+def run_aggregator(socket_path: str, db_path: str = DEFAULT_DB_PATH, max_batch: int = 500,
+                   flush_interval: float = 0.2):
+    """
+    Run an aggregator until SIGTERM or SIGINT, committing pending answers on the way out
+
+    Used by the sidecar entry point and as the target of the process started from gunicorn.conf.py.
+    """
+    aggregator = StatsAggregator(QuizStatsManager(db_path, append_only=append_only_enabled()), socket_path,
+                                 max_batch, flush_interval)
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: aggregator.stop())
+    aggregator.serve_forever()
+
+
+def main():
+    """Run the aggregator as a standalone sidecar process"""
+    parser = argparse.ArgumentParser(description="Quiz statistics aggregator")
+    parser.add_argument('--socket', default=aggregator_socket_path() or DEFAULT_SOCKET_PATH,
+                        help="Unix domain socket to listen on")
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help="Path to the quiz database")
+    parser.add_argument('--max-batch', type=int, default=500, help="Pending answers that trigger a commit")
+    parser.add_argument('--flush-interval', type=float, default=0.2, help="Maximum seconds an answer stays pending")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    run_aggregator(args.socket, args.db, args.max_batch, args.flush_interval)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,398 @@
+"""
+Versioned schema migrations for the quiz statistics tables.
+
+QuizStatsManager.init_stats_tables creates the baseline tables; every later change
+to them is an ordered migration step here. Applied steps are recorded in the
+schema_version table, and each pending step runs once, in order, inside a write
+transaction, so several processes starting at the same time apply it only once.
+
+To change the schema, append a Migration with the next version number. Never edit
+or reorder a step that has been released. Steps are self-contained: seeding SQL
+and blob encodings are frozen here as they were when the step was released, rather
+than calling module code that keeps changing.
+"""
+import hashlib
+import logging
+import math
+import sqlite3
+import struct
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, List, NamedTuple
+
+
+class Migration(NamedTuple):
+    """A numbered schema change applied with a cursor inside a write transaction"""
+    version: int
+    name: str
+    apply: Callable[[sqlite3.Cursor], None]
+
+
+def _add_column_if_missing(cursor: sqlite3.Cursor, table: str, column: str, definition: str):
+    """Add a column to a table created before the column existed"""
+    cursor.execute(f"PRAGMA table_info({table})")
+    if column not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def _execute_all(*statements: str) -> Callable[[sqlite3.Cursor], None]:
+    def apply(cursor: sqlite3.Cursor):
+        for statement in statements:
+            cursor.execute(statement)
+    return apply
+
+
+def _add_answer_event_ids(cursor: sqlite3.Cursor):
+    # Idempotency keys for answers; repeats of an event ID are recorded once
+    _add_column_if_missing(cursor, 'quiz_sessions', 'event_id', 'TEXT')
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_quiz_sessions_event_id ON quiz_sessions(event_id)")
+    _add_column_if_missing(cursor, 'answer_events', 'event_id', 'TEXT')
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_answer_events_event_id ON answer_events(event_id)")
+
+
+def _create_session_leaderboard(cursor: sqlite3.Cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS session_leaderboard (
+            period TEXT NOT NULL,
+            quiz_type TEXT NOT NULL,
+            session_id TEXT NOT NULL,
+            session_name TEXT,
+            user_id TEXT,
+            total_questions INTEGER,
+            correct_answers INTEGER,
+            accuracy_rate REAL,
+            avg_response_time REAL,
+            started_at TIMESTAMP,
+            ended_at TIMESTAMP,
+            PRIMARY KEY (period, quiz_type, session_id)
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_session_leaderboard_rank ON session_leaderboard
+        (period, quiz_type, accuracy_rate DESC, avg_response_time)
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_session_leaderboard_started_at ON session_leaderboard(period, started_at)")
+    # Seed the boards from the sessions completed so far: the best 50 completed sessions with
+    # at least 5 answers per period, across all quizzes ('') and per session name
+    cursor.execute("""
+        SELECT DISTINCT session_name FROM session_stats
+        WHERE status = 'completed' AND session_name IS NOT NULL AND session_name != ''
+    """)
+    quiz_types = [''] + [row[0] for row in cursor.fetchall()]
+    for period, days in (('7d', 7), ('30d', 30), ('all', None)):
+        cutoff = (date.today() - timedelta(days=days)).isoformat() if days else None
+        for quiz_type in quiz_types:
+            cursor.execute("""
+                INSERT INTO session_leaderboard
+                (period, quiz_type, session_id, session_name, user_id, total_questions, correct_answers,
+                 accuracy_rate, avg_response_time, started_at, ended_at)
+                SELECT ?, ?, session_id, session_name, user_id, total_questions, correct_answers,
+                       accuracy_rate, avg_response_time, started_at, ended_at
+                FROM session_stats
+                WHERE status = 'completed' AND total_questions >= 5
+                  AND (? IS NULL OR started_at >= ?)
+                  AND (? = '' OR session_name = ?)
+                ORDER BY accuracy_rate DESC, avg_response_time ASC
+                LIMIT 50
+            """, (period, quiz_type, cutoff, cutoff, quiz_type, quiz_type))
+
+
+def _create_stats_rollups(cursor: sqlite3.Cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS rollup_question_stats (
+            granularity TEXT NOT NULL,
+            bucket_start TEXT NOT NULL,
+            question_id INTEGER NOT NULL,
+            times_asked INTEGER DEFAULT 0,
+            times_correct INTEGER DEFAULT 0,
+            total_response_time REAL DEFAULT 0.0,
+            PRIMARY KEY (granularity, bucket_start, question_id)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS rollup_category_stats (
+            granularity TEXT NOT NULL,
+            bucket_start TEXT NOT NULL,
+            category_id INTEGER NOT NULL,
+            subcategory_id INTEGER NOT NULL,
+            questions_asked INTEGER DEFAULT 0,
+            questions_correct INTEGER DEFAULT 0,
+            total_response_time REAL DEFAULT 0.0,
+            PRIMARY KEY (granularity, bucket_start, category_id, subcategory_id)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS rollup_session_stats (
+            granularity TEXT NOT NULL,
+            bucket_start TEXT NOT NULL,
+            sessions_started INTEGER DEFAULT 0,
+            sessions_completed INTEGER DEFAULT 0,
+            answers INTEGER DEFAULT 0,
+            correct_answers INTEGER DEFAULT 0,
+            total_response_time REAL DEFAULT 0.0,
+            PRIMARY KEY (granularity, bucket_start)
+        ) WITHOUT ROWID
+    """)
+    # Seed the buckets from the statistics retained so far: hourly ones from quiz_sessions,
+    # daily, weekly (starting Monday) and monthly ones from daily_question_stats
+    buckets = {
+        'hour': "strftime('%Y-%m-%d %H:00:00', {0})",
+        'day': "substr({0}, 1, 10)",
+        'week': "date({0}, '-' || ((CAST(strftime('%w', {0}) AS INTEGER) + 6) % 7) || ' days')",
+        'month': "strftime('%Y-%m-01', {0})",
+    }
+    for granularity, bucket in buckets.items():
+        source = """
+            SELECT timestamp as at, question_id, 1 as asked, is_correct as correct, response_time
+            FROM quiz_sessions
+        """ if granularity == 'hour' else """
+            SELECT date as at, question_id, times_asked as asked, times_correct as correct,
+                   total_response_time as response_time
+            FROM daily_question_stats
+        """
+        at = bucket.format('source.at')
+        cursor.execute(f"""
+            INSERT INTO rollup_question_stats
+            (granularity, bucket_start, question_id, times_asked, times_correct, total_response_time)
+            SELECT ?, {at}, question_id, SUM(asked), SUM(correct), SUM(response_time)
+            FROM ({source}) source
+            GROUP BY {at}, question_id
+        """, (granularity,))
+    cursor.execute("""
+        INSERT INTO rollup_category_stats
+        (granularity, bucket_start, category_id, subcategory_id, questions_asked, questions_correct,
+         total_response_time)
+        SELECT r.granularity, r.bucket_start, qn.category_id, COALESCE(qn.subcategory_id, 0),
+               SUM(r.times_asked), SUM(r.times_correct), SUM(r.total_response_time)
+        FROM rollup_question_stats r
+        JOIN questions_normalized qn ON r.question_id = qn.id
+        GROUP BY r.granularity, r.bucket_start, qn.category_id, COALESCE(qn.subcategory_id, 0)
+    """)
+    cursor.execute("""
+        INSERT INTO rollup_session_stats (granularity, bucket_start, answers, correct_answers, total_response_time)
+        SELECT granularity, bucket_start, SUM(times_asked), SUM(times_correct), SUM(total_response_time)
+        FROM rollup_question_stats
+        GROUP BY granularity, bucket_start
+    """)
+    for column, timestamp in (('sessions_started', 'started_at'), ('sessions_completed', 'ended_at')):
+        for granularity, bucket in buckets.items():
+            at = bucket.format(timestamp)
+            cursor.execute(f"""
+                INSERT INTO rollup_session_stats (granularity, bucket_start, {column})
+                SELECT ?, {at}, COUNT(*) FROM session_stats
+                WHERE {timestamp} IS NOT NULL
+                GROUP BY {at}
+                ON CONFLICT(granularity, bucket_start) DO UPDATE SET {column} = excluded.{column}
+            """, (granularity,))
+
+
+def _write_varint(out: bytearray, value: int):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _sketch_v1_blob(values: List[float]) -> bytes:
+    """Format 1 DDSketch (relative accuracy 0.01) of response times, see utils.sketches"""
+    log_gamma = math.log(1.01 / 0.99)
+    values = [max(value, 0.0) for value in values]
+    zero_count = 0
+    bins: Dict[int, int] = {}
+    for value in values:
+        if value <= 1e-3:
+            zero_count += 1
+        else:
+            index = math.ceil(math.log(value) / log_gamma)
+            bins[index] = bins.get(index, 0) + 1
+    out = bytearray(struct.pack('<Bfdd', 1, 0.01, min(values), max(values)))
+    _write_varint(out, zero_count)
+    if bins:
+        low, high = min(bins), max(bins)
+        _write_varint(out, (low << 1) ^ (low >> 63))
+        _write_varint(out, high - low + 1)
+        for index in range(low, high + 1):
+            _write_varint(out, bins.get(index, 0))
+    return bytes(out)
+
+
+def _hll_v1_blob(values: Iterable[str]) -> bytes:
+    """Format 1 HyperLogLog (precision 12) of distinct strings, see utils.distinct_counts"""
+    registers = bytearray(1 << 12)
+    for value in values:
+        hashed = int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+        index = hashed >> 52
+        rank = 52 - (hashed & ((1 << 52) - 1)).bit_length() + 1
+        registers[index] = max(registers[index], rank)
+    nonzero = [(index, rank) for index, rank in enumerate(registers) if rank]
+    if len(nonzero) * 3 >= len(registers):
+        return struct.pack('<BBB', 1, 12, 0) + bytes(registers)
+    out = bytearray(struct.pack('<BBB', 1, 12, 1))
+    _write_varint(out, len(nonzero))
+    previous = 0
+    for index, rank in nonzero:
+        _write_varint(out, index - previous)
+        out.append(rank)
+        previous = index
+    return bytes(out)
+
+
+def _create_response_time_sketches(cursor: sqlite3.Cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS response_time_sketches (
+            scope TEXT NOT NULL,
+            scope_id INTEGER NOT NULL,
+            date DATE NOT NULL,
+            sketch BLOB NOT NULL,
+            PRIMARY KEY (scope, scope_id, date)
+        ) WITHOUT ROWID
+    """)
+    # Seed from the answers quiz_sessions still holds; older response times were never kept
+    cursor.execute("DELETE FROM response_time_sketches")
+    cursor.execute("""
+        SELECT substr(s.timestamp, 1, 10) as date, s.question_id, qn.subcategory_id, s.response_time
+        FROM quiz_sessions s
+        LEFT JOIN questions_normalized qn ON s.question_id = qn.id
+    """)
+    response_times: Dict[tuple, List[float]] = {}
+    for day, question_id, subcategory_id, response_time in cursor.fetchall():
+        keys = [('question', question_id, day), ('all', 0, day)]
+        if subcategory_id:
+            keys.append(('subcategory', subcategory_id, day))
+        for key in keys:
+            response_times.setdefault(key, []).append(response_time)
+    cursor.executemany("""
+        INSERT INTO response_time_sketches (scope, scope_id, date, sketch) VALUES (?, ?, ?, ?)
+    """, [key + (_sketch_v1_blob(values),) for key, values in response_times.items()])
+
+
+def _create_distinct_counts(cursor: sqlite3.Cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS distinct_counts (
+            kind TEXT NOT NULL,
+            granularity TEXT NOT NULL,
+            quiz_type TEXT NOT NULL,
+            bucket_start TEXT NOT NULL,
+            registers BLOB NOT NULL,
+            PRIMARY KEY (kind, granularity, quiz_type, bucket_start)
+        ) WITHOUT ROWID
+    """)
+    # Seed from the sessions on record, counted in the hour they started
+    cursor.execute("DELETE FROM distinct_counts")
+    cursor.execute("SELECT session_id, session_name, user_id, started_at FROM session_stats")
+    values: Dict[tuple, set] = {}
+    for session_id, session_name, user_id, started_at in cursor.fetchall():
+        if not started_at:
+            continue
+        started = datetime.fromisoformat(started_at)
+        # Hourly and daily buckets, for the session's quiz type and all quiz types ('')
+        buckets = (('hour', started.strftime('%Y-%m-%d %H:00:00')), ('day', started.date().isoformat()))
+        for granularity, bucket in buckets:
+            for quiz_type in {'', session_name or ''}:
+                values.setdefault(('sessions', granularity, quiz_type, bucket), set()).add(session_id)
+                if user_id:
+                    values.setdefault(('users', granularity, quiz_type, bucket), set()).add(user_id)
+    cursor.executemany("""
+        INSERT INTO distinct_counts (kind, granularity, quiz_type, bucket_start, registers) VALUES (?, ?, ?, ?, ?)
+    """, [key + (_hll_v1_blob(sorted(members)),) for key, members in values.items()])
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, 'add_answer_event_ids', _add_answer_event_ids),
+    # Per-day and date-range reads (daily stats, range stats, trending, rollover)
+    # are answered from the index alone
+    Migration(2, 'covering_daily_stats_indexes', _execute_all(
+        "DROP INDEX IF EXISTS idx_daily_question_stats_date",
+        """CREATE INDEX idx_daily_question_stats_date ON daily_question_stats
+           (date, question_id, times_asked, times_correct, total_response_time)""",
+        "DROP INDEX IF EXISTS idx_daily_category_stats_date",
+        """CREATE INDEX idx_daily_category_stats_date ON daily_category_stats
+           (date, category_id, subcategory_id, questions_asked, questions_correct)""",
+    )),
+    # Session recomputes read only the answer columns they aggregate; rollover
+    # deletes old answers by timestamp range
+    Migration(3, 'quiz_sessions_indexes', _execute_all(
+        "DROP INDEX IF EXISTS idx_quiz_sessions_session_id",
+        """CREATE INDEX idx_quiz_sessions_session_id ON quiz_sessions
+           (session_id, is_correct, response_time)""",
+        "CREATE INDEX IF NOT EXISTS idx_quiz_sessions_timestamp ON quiz_sessions(timestamp)",
+    )),
+    # Recent sessions (optionally per user) and the leaderboard filter on status and start time
+    Migration(4, 'session_stats_indexes', _execute_all(
+        "CREATE INDEX IF NOT EXISTS idx_session_stats_started_at ON session_stats(started_at)",
+        "CREATE INDEX IF NOT EXISTS idx_session_stats_user_started_at ON session_stats(user_id, started_at)",
+        "CREATE INDEX IF NOT EXISTS idx_session_stats_status_started_at ON session_stats(status, started_at)",
+    )),
+    # Seen-question lookups merge in answers still waiting in the append-only log
+    Migration(5, 'answer_events_user_index', _execute_all(
+        "CREATE INDEX IF NOT EXISTS idx_answer_events_user_id ON answer_events(user_id, question_id)",
+    )),
+    # Bounded top-K boards per period and quiz type, maintained when sessions end
+    Migration(6, 'session_leaderboard', _create_session_leaderboard),
+    # Change watermark advanced by every statistics write, so idle dashboards can skip refreshes
+    Migration(7, 'stats_version', _execute_all(
+        """CREATE TABLE IF NOT EXISTS stats_version (
+               id INTEGER PRIMARY KEY CHECK (id = 1),
+               version INTEGER NOT NULL
+           )""",
+        "INSERT OR IGNORE INTO stats_version (id, version) VALUES (1, 0)",
+    )),
+    # Hourly, daily, weekly and monthly totals per question, per category and overall
+    Migration(8, 'stats_rollups', _create_stats_rollups),
+    # Mergeable response-time quantile sketches per question, subcategory and day
+    Migration(9, 'response_time_sketches', _create_response_time_sketches),
+    # HyperLogLog counters of distinct players and sessions per hour, day and quiz type
+    Migration(10, 'distinct_counts', _create_distinct_counts),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1].version
+
+
+def get_schema_version(cursor: sqlite3.Cursor) -> int:
+    """Get the highest applied migration version, 0 for a database without any"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    return cursor.fetchone()[0]
+
+
+def apply_migrations(conn: sqlite3.Connection, migrations: List[Migration] = MIGRATIONS) -> List[int]:
+    """
+    Apply every pending migration in version order
+
+    All pending steps run in one write transaction, which is rolled back entirely
+    if any step fails.
+
+    Args:
+        conn: Connection to the statistics database
+        migrations: Migration steps in version order
+
+    Returns:
+        Versions applied by this call
+    """
+    cursor = conn.cursor()
+    if get_schema_version(cursor) >= migrations[-1].version:
+        return []
+
+    # Take the write lock before re-reading the version so concurrent starts don't both migrate
+    conn.commit()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        current = get_schema_version(cursor)
+        applied = [migration for migration in migrations if migration.version > current]
+        for migration in applied:
+            migration.apply(cursor)
+            cursor.execute("INSERT INTO schema_version (version, name) VALUES (?, ?)",
+                           (migration.version, migration.name))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    for migration in applied:
+        logging.info("Applied stats schema migration %d (%s)", migration.version, migration.name)
+    return [migration.version for migration in applied]
@@ -0,0 +1,318 @@
+"""
+Hourly, daily, weekly and monthly rollups of the quiz statistics.
+
+The daily_* tables only keep 30 days, so longer trends had to come from the
+weekly historical table or raw answers. The rollup tables hold the same totals per
+time bucket at four granularities: per question, per category and for overall
+activity (answers, sessions started and sessions completed). Answers and session
+events update every granularity in the transaction that records them.
+
+Buckets are keyed by the UTC start of the bucket: 'YYYY-MM-DD HH:00:00' for hours,
+the day itself, the Monday of the week, and the first day of the month. Hourly
+buckets are kept for HOURLY_RETENTION_DAYS and daily ones for DAILY_RETENTION_DAYS;
+weekly and monthly buckets are kept indefinitely.
+
+A range total is read from the fewest buckets that exactly cover the range (whole
+months, then whole weeks, then single days), so a one-year query reads about a
+dozen buckets per question instead of 365 days of rows.
+"""
+import sqlite3
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+GRANULARITIES = ('hour', 'day', 'week', 'month')
+HOURLY_RETENTION_DAYS = 14
+DAILY_RETENTION_DAYS = 400
+# Category rollups store a missing subcategory as 0 so it can be part of the primary key
+NO_SUBCATEGORY = 0
+
+
+def bucket_start(granularity: str, day: date, hour: int = 0) -> str:
+    """Key of the bucket containing a UTC day (and hour, for hourly buckets)"""
+    if granularity == 'hour':
+        return f"{day.isoformat()} {hour:02d}:00:00"
+    if granularity == 'day':
+        return day.isoformat()
+    if granularity == 'week':
+        return (day - timedelta(days=day.weekday())).isoformat()
+    if granularity == 'month':
+        return day.replace(day=1).isoformat()
+    raise ValueError(f"Unknown rollup granularity: {granularity}")
+
+
+def _bucket_sql(granularity: str, column: str) -> str:
+    """SQL expression for the bucket key of a 'YYYY-MM-DD[ HH:MM:SS]' column"""
+    if granularity == 'hour':
+        return f"strftime('%Y-%m-%d %H:00:00', {column})"
+    if granularity == 'day':
+        return f"substr({column}, 1, 10)"
+    if granularity == 'week':
+        return f"date({column}, '-' || ((CAST(strftime('%w', {column}) AS INTEGER) + 6) % 7) || ' days')"
+    return f"strftime('%Y-%m-01', {column})"
+
+
+def _next_month(day: date) -> date:
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def choose_granularity(start: date, end: date) -> str:
+    """Granularity of a chart series over a date range, so it has at most about a hundred points"""
+    days = (end - start).days + 1
+    if days <= 3:
+        return 'hour'
+    if days <= 92:
+        return 'day'
+    if days <= 730:
+        return 'week'
+    return 'month'
+
+
+def cover(start: date, end: date) -> Dict[str, List[str]]:
+    """
+    Split a date range into the fewest whole months, weeks and days
+
+    Returns:
+        Granularity -> bucket keys; together the buckets cover start..end exactly
+    """
+    buckets: Dict[str, List[str]] = {'day': [], 'week': [], 'month': []}
+    day = start
+    while day <= end:
+        next_month = _next_month(day)
+        if day.day == 1 and next_month - timedelta(days=1) <= end:
+            buckets['month'].append(bucket_start('month', day))
+            day = next_month
+        elif (day.weekday() == 0 and day + timedelta(days=6) <= end
+              # Don't let a week straddle into a month that could be read whole
+              and (day + timedelta(days=6) < next_month or _next_month(next_month) - timedelta(days=1) > end)):
+            buckets['week'].append(bucket_start('week', day))
+            day += timedelta(days=7)
+        else:
+            buckets['day'].append(bucket_start('day', day))
+            day += timedelta(days=1)
+    return buckets
+
+
+def answer_hour(answer, now: datetime) -> int:
+    """UTC hour an answer was given; answers back-dated without a time count in hour 0"""
+    if answer.recorded_at and answer.recorded_at[:10] == answer.date:
+        return int(answer.recorded_at[11:13] or 0)
+    if answer.date == now.date().isoformat():
+        return now.hour
+    return 0
+
+
+def aggregate_answers(answers: Iterable, question_categories: Dict[int, Any], now: datetime,
+                      granularities: Iterable[str] = GRANULARITIES) -> Tuple[Dict, Dict, Dict]:
+    """
+    Sum answers into rollup buckets
+
+    Args:
+        answers: AnswerEvents to sum
+        question_categories: Question ID -> QuestionMetadata for the answered questions
+        now: Current UTC time, the hour of answers without a recorded time
+        granularities: Granularities to sum for
+
+    Returns:
+        (question, category, activity) totals as dictionaries keyed by
+        (granularity, bucket, question_id), (granularity, bucket, category_id, subcategory_id)
+        and (granularity, bucket), each holding [asked, correct, total response time]
+    """
+    questions: Dict[tuple, List] = {}
+    categories: Dict[tuple, List] = {}
+    activity: Dict[tuple, List] = {}
+    for answer in answers:
+        day = date.fromisoformat(answer.date)
+        hour = answer_hour(answer, now)
+        correct = 1 if answer.is_correct else 0
+        metadata = question_categories.get(answer.question_id)
+        for granularity in granularities:
+            bucket = bucket_start(granularity, day, hour)
+            keys = [(questions, (granularity, bucket, answer.question_id)), (activity, (granularity, bucket))]
+            if metadata is not None:
+                keys.append((categories, (granularity, bucket, metadata.category_id,
+                                          metadata.subcategory_id or NO_SUBCATEGORY)))
+            for totals, key in keys:
+                total = totals.get(key)
+                if total is None:
+                    total = totals[key] = [0, 0, 0.0]
+                total[0] += 1
+                total[1] += correct
+                total[2] += answer.response_time
+    return questions, categories, activity
+
+
+def add_answers(cursor: sqlite3.Cursor, answers: List, question_categories: Dict[int, Any],
+                now: Optional[datetime] = None):
+    """Add answers to every rollup bucket they fall in, inside the caller's transaction"""
+    questions, categories, activity = aggregate_answers(answers, question_categories,
+                                                        now or datetime.now(timezone.utc))
+    cursor.executemany("""
+        INSERT INTO rollup_question_stats
+        (granularity, bucket_start, question_id, times_asked, times_correct, total_response_time)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(granularity, bucket_start, question_id) DO UPDATE SET
+            times_asked = times_asked + excluded.times_asked,
+            times_correct = times_correct + excluded.times_correct,
+            total_response_time = total_response_time + excluded.total_response_time
+    """, [key + tuple(total) for key, total in questions.items()])
+    cursor.executemany("""
+        INSERT INTO rollup_category_stats
+        (granularity, bucket_start, category_id, subcategory_id, questions_asked, questions_correct,
+         total_response_time)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(granularity, bucket_start, category_id, subcategory_id) DO UPDATE SET
+            questions_asked = questions_asked + excluded.questions_asked,
+            questions_correct = questions_correct + excluded.questions_correct,
+            total_response_time = total_response_time + excluded.total_response_time
+    """, [key + tuple(total) for key, total in categories.items()])
+    cursor.executemany("""
+        INSERT INTO rollup_session_stats
+        (granularity, bucket_start, answers, correct_answers, total_response_time)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(granularity, bucket_start) DO UPDATE SET
+            answers = answers + excluded.answers,
+            correct_answers = correct_answers + excluded.correct_answers,
+            total_response_time = total_response_time + excluded.total_response_time
+    """, [key + tuple(total) for key, total in activity.items()])
+
+
+def add_session_event(cursor: sqlite3.Cursor, column: str, now: Optional[datetime] = None):
+    """
+    Count a session start or completion in the buckets of the current hour
+
+    Args:
+        cursor: Cursor inside the transaction that starts or ends the session
+        column: 'sessions_started' or 'sessions_completed'
+    """
+    if column not in ('sessions_started', 'sessions_completed'):
+        raise ValueError(f"Unknown session rollup column: {column}")
+    now = now or datetime.now(timezone.utc)
+    cursor.executemany(f"""
+        INSERT INTO rollup_session_stats (granularity, bucket_start, {column})
+        VALUES (?, ?, 1)
+        ON CONFLICT(granularity, bucket_start) DO UPDATE SET {column} = {column} + 1
+    """, [(granularity, bucket_start(granularity, now.date(), now.hour)) for granularity in GRANULARITIES])
+
+
+def rebuild(cursor: sqlite3.Cursor):
+    """
+    Recompute the rollups from the retained statistics
+
+    Daily, weekly and monthly buckets are rebuilt from daily_question_stats and
+    hourly ones from the per-session answers in quiz_sessions, so history older
+    than those tables keep is not recovered.
+    """
+    for table in ('rollup_question_stats', 'rollup_category_stats', 'rollup_session_stats'):
+        cursor.execute(f"DELETE FROM {table}")
+
+    sources = [('hour', """
+        SELECT timestamp as at, question_id, 1 as asked, is_correct as correct, response_time
+        FROM quiz_sessions
+    """)] + [(granularity, """
+        SELECT date as at, question_id, times_asked as asked, times_correct as correct,
+               total_response_time as response_time
+        FROM daily_question_stats
+    """) for granularity in ('day', 'week', 'month')]
+    for granularity, source in sources:
+        bucket = _bucket_sql(granularity, 'source.at')
+        cursor.execute(f"""
+            INSERT INTO rollup_question_stats
+            (granularity, bucket_start, question_id, times_asked, times_correct, total_response_time)
+            SELECT ?, {bucket}, question_id, SUM(asked), SUM(correct), SUM(response_time)
+            FROM ({source}) source
+            GROUP BY {bucket}, question_id
+        """, (granularity,))
+
+    cursor.execute("""
+        INSERT INTO rollup_category_stats
+        (granularity, bucket_start, category_id, subcategory_id, questions_asked, questions_correct,
+         total_response_time)
+        SELECT r.granularity, r.bucket_start, qn.category_id, COALESCE(qn.subcategory_id, ?),
+               SUM(r.times_asked), SUM(r.times_correct), SUM(r.total_response_time)
+        FROM rollup_question_stats r
+        JOIN questions_normalized qn ON r.question_id = qn.id
+        GROUP BY r.granularity, r.bucket_start, qn.category_id, COALESCE(qn.subcategory_id, ?)
+    """, (NO_SUBCATEGORY, NO_SUBCATEGORY))
+    cursor.execute("""
+        INSERT INTO rollup_session_stats (granularity, bucket_start, answers, correct_answers, total_response_time)
+        SELECT granularity, bucket_start, SUM(times_asked), SUM(times_correct), SUM(total_response_time)
+        FROM rollup_question_stats
+        GROUP BY granularity, bucket_start
+    """)
+    for column, timestamp in (('sessions_started', 'started_at'), ('sessions_completed', 'ended_at')):
+        for granularity in GRANULARITIES:
+            bucket = _bucket_sql(granularity, timestamp)
+            cursor.execute(f"""
+                INSERT INTO rollup_session_stats (granularity, bucket_start, {column})
+                SELECT ?, {bucket}, COUNT(*) FROM session_stats
+                WHERE {timestamp} IS NOT NULL
+                GROUP BY {bucket}
+                ON CONFLICT(granularity, bucket_start) DO UPDATE SET {column} = excluded.{column}
+            """, (granularity,))
+
+
+def prune(cursor: sqlite3.Cursor, today: date = None):
+    """Delete hourly and daily buckets older than their retention"""
+    today = today or date.today()
+    for granularity, days in (('hour', HOURLY_RETENTION_DAYS), ('day', DAILY_RETENTION_DAYS)):
+        cutoff = bucket_start(granularity, today - timedelta(days=days))
+        for table in ('rollup_question_stats', 'rollup_category_stats', 'rollup_session_stats'):
+            cursor.execute(f"DELETE FROM {table} WHERE granularity = ? AND bucket_start < ?",
+                           (granularity, cutoff))
+
+
+def _cover_condition(buckets: Dict[str, List[str]]) -> Tuple[str, List]:
+    conditions = []
+    params: List = []
+    for granularity, keys in buckets.items():
+        if keys:
+            conditions.append(f"(granularity = ? AND bucket_start IN ({','.join('?' for _ in keys)}))")
+            params += [granularity] + keys
+    return ' OR '.join(conditions) or '0', params
+
+
+def read_totals(cursor: sqlite3.Cursor, start: date, end: date) -> Tuple[Dict, Dict, Dict]:
+    """
+    Read range totals from the buckets covering start..end
+
+    Returns:
+        (question, category, activity) totals as dictionaries keyed by question_id,
+        (category_id, subcategory_id) and 'all', each holding [asked, correct, total response time]
+        (activity also holds sessions started and completed)
+    """
+    condition, params = _cover_condition(cover(start, end))
+    cursor.execute(f"""
+        SELECT question_id, SUM(times_asked), SUM(times_correct), SUM(total_response_time)
+        FROM rollup_question_stats WHERE {condition}
+        GROUP BY question_id
+    """, params)
+    questions = {row[0]: list(row[1:]) for row in cursor.fetchall()}
+    cursor.execute(f"""
+        SELECT category_id, subcategory_id, SUM(questions_asked), SUM(questions_correct), SUM(total_response_time)
+        FROM rollup_category_stats WHERE {condition}
+        GROUP BY category_id, subcategory_id
+    """, params)
+    categories = {(row[0], row[1]): list(row[2:]) for row in cursor.fetchall()}
+    cursor.execute(f"""
+        SELECT COALESCE(SUM(answers), 0), COALESCE(SUM(correct_answers), 0), COALESCE(SUM(total_response_time), 0.0),
+               COALESCE(SUM(sessions_started), 0), COALESCE(SUM(sessions_completed), 0)
+        FROM rollup_session_stats WHERE {condition}
+    """, params)
+    activity = {'all': list(cursor.fetchone())}
+    return questions, categories, activity
+
+
+def read_series(cursor: sqlite3.Cursor, granularity: str, start: date, end: date) -> Dict[str, List]:
+    """
+    Read the activity buckets overlapping start..end
+
+    Returns:
+        Bucket key -> [answers, correct, total response time, sessions started, sessions completed]
+    """
+    cursor.execute("""
+        SELECT bucket_start, answers, correct_answers, total_response_time, sessions_started, sessions_completed
+        FROM rollup_session_stats
+        WHERE granularity = ? AND bucket_start BETWEEN ? AND ?
+        ORDER BY bucket_start
+    """, (granularity, bucket_start(granularity, start), bucket_start(granularity, end, 23)))
+    return {row[0]: list(row[1:]) for row in cursor.fetchall()}
@@ -0,0 +1,208 @@
+"""
+Sliding-window trending questions.
+
+TrendingEngine keeps per-question counters for the last ``window_days`` days as a
+ring of day buckets in memory, so the dashboard's trending table is ranked without
+re-aggregating daily_question_stats on every refresh. daily_question_stats is the
+persisted form of the buckets: the engine loads the window from it once and then
+re-reads only the last two days (plus answers still in the append-only log) every
+``refresh_interval`` seconds, which also picks up answers recorded by other processes.
+
+Rankings use volume-weighted accuracy (correct answers / answers) over the whole
+period rather than the mean of daily accuracy rates.
+"""
+import heapq
+import logging
+import threading
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+ORDER_BY_VOLUME = 'volume'
+ORDER_BY_DIFFICULTY = 'difficulty'
+
+_BUCKETS_QUERY = """
+    SELECT date, question_id,
+           SUM(times_asked) as times_asked,
+           SUM(times_correct) as times_correct,
+           SUM(total_response_time) as total_response_time
+    FROM (
+        SELECT date, question_id, times_asked, times_correct, total_response_time
+        FROM daily_question_stats
+        WHERE date BETWEEN ? AND ?
+        UNION ALL
+        SELECT date, question_id, 1, is_correct, response_time
+        FROM answer_events
+        WHERE date BETWEEN ? AND ?
+    )
+    GROUP BY date, question_id
+"""
+
+
+class TrendingEngine:
+    """
+    Per-question day-bucket ring buffers with heap-based top-N queries
+    """
+
+    def __init__(self, stats_manager, window_days: int = 30, refresh_interval: float = 30.0,
+                 min_asked: int = 3):
+        """
+        Args:
+            stats_manager: QuizStatsManager whose database the buckets are read from
+            window_days: Number of day buckets kept; the longest period that can be ranked
+            refresh_interval: Seconds between re-reads of the most recent buckets
+            min_asked: Minimum answers in the period for a question to be ranked
+        """
+        self.stats_manager = stats_manager
+        self.window_days = window_days
+        self.refresh_interval = refresh_interval
+        self.min_asked = min_asked
+        # Day ordinal held by each ring slot, and question ID -> [asked, correct, response time] per slot
+        self._slot_days: List[Optional[int]] = [None] * window_days
+        self._counters: Dict[int, List[List[float]]] = {}
+        self._last_sync = 0.0
+        self._loaded_through: Optional[int] = None
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.syncs = 0
+
+    def _today(self) -> date:
+        return date.today()
+
+    def _read_days(self, first_day: date, last_day: date) -> List[tuple]:
+        with self.stats_manager.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(_BUCKETS_QUERY, (first_day.isoformat(), last_day.isoformat(),
+                                            first_day.isoformat(), last_day.isoformat()))
+            return [tuple(row) for row in cursor.fetchall()]
+
+    def _claim_slot(self, ordinal: int) -> int:
+        """Point the ring slot for a day at that day, clearing counters left from an older day"""
+        slot = ordinal % self.window_days
+        if self._slot_days[slot] != ordinal:
+            self._slot_days[slot] = ordinal
+            for counters in self._counters.values():
+                counters[slot] = [0, 0, 0.0]
+        return slot
+
+    def _apply(self, rows: List[tuple], today: int):
+        """Store full-day totals read from the database in their day buckets"""
+        for day, question_id, asked, correct, response_time in rows:
+            ordinal = date.fromisoformat(day).toordinal()
+            if not today - self.window_days < ordinal <= today:
+                continue
+            slot = self._claim_slot(ordinal)
+            counters = self._counters.get(question_id)
+            if counters is None:
+                counters = self._counters[question_id] = [[0, 0, 0.0] for _ in range(self.window_days)]
+            counters[slot] = [asked, correct or 0, response_time or 0.0]
+
+    def load(self) -> bool:
+        """
+        (Re)load every bucket in the window from the database
+
+        Returns:
+            True if the buckets were loaded successfully
+        """
+        today = self._today()
+        try:
+            rows = self._read_days(today - timedelta(days=self.window_days - 1), today)
+        except Exception as e:
+            logging.error("Failed to load trending question buckets: %s", e)
+            return False
+        with self._lock:
+            self._slot_days = [None] * self.window_days
+            self._counters = {}
+            self._apply(rows, today.toordinal())
+            self._loaded_through = today.toordinal()
+            self._last_sync = time.monotonic()
+            self.loads += 1
+        return True
+
+    def invalidate(self):
+        """Re-read the recent buckets on the next query"""
+        self._last_sync = 0.0
+
+    def _refresh_if_stale(self):
+        if self._loaded_through is None:
+            self.load()
+            return
+        if time.monotonic() - self._last_sync < self.refresh_interval:
+            return
+        # Yesterday can still change shortly after midnight, when the answer log is compacted
+        today = self._today()
+        try:
+            rows = self._read_days(today - timedelta(days=1), today)
+        except Exception as e:
+            logging.error("Failed to refresh trending question buckets: %s", e)
+            return
+        with self._lock:
+            self._apply(rows, today.toordinal())
+            self._loaded_through = today.toordinal()
+            self._last_sync = time.monotonic()
+            self.syncs += 1
+
+    def _period_totals(self, period_days: int) -> List[Tuple[int, int, int, float]]:
+        """Sum each question's buckets over the last period_days days (caller holds the lock)"""
+        today = self._today().toordinal()
+        slots = [slot for slot, ordinal in enumerate(self._slot_days)
+                 if ordinal is not None and today - period_days < ordinal <= today]
+        totals = []
+        for question_id, counters in self._counters.items():
+            asked = correct = 0
+            response_time = 0.0
+            for slot in slots:
+                bucket = counters[slot]
+                asked += bucket[0]
+                correct += bucket[1]
+                response_time += bucket[2]
+            if asked >= self.min_asked:
+                totals.append((question_id, asked, correct, response_time))
+        return totals
+
+    def top(self, limit: int = 10, period_days: int = 7, order_by: str = ORDER_BY_VOLUME) -> List[Dict[str, Any]]:
+        """
+        Get the top questions of the last period_days days
+
+        Args:
+            limit: Number of questions to return
+            period_days: Days to rank over, at most window_days
+            order_by: 'volume' for the most answered questions (ties: hardest first),
+                'difficulty' for the lowest accuracy (ties: most answered first);
+                remaining ties go to the lowest question ID
+
+        Returns:
+            List of {'question_id', 'total_asked', 'total_correct', 'avg_accuracy',
+            'avg_response_time'} dictionaries in rank order
+        """
+        if period_days > self.window_days:
+            raise ValueError(f"period_days must be at most {self.window_days}")
+        if order_by not in (ORDER_BY_VOLUME, ORDER_BY_DIFFICULTY):
+            raise ValueError(f"Unknown trending order: {order_by}")
+
+        self._refresh_if_stale()
+        with self._lock:
+            totals = self._period_totals(period_days)
+
+        if order_by == ORDER_BY_VOLUME:
+            key = lambda total: (total[1], -total[2] / total[1], -total[0])
+        else:
+            key = lambda total: (-total[2] / total[1], total[1], -total[0])
+        return [{
+            'question_id': question_id,
+            'total_asked': asked,
+            'total_correct': correct,
+            'avg_accuracy': correct / asked * 100,
+            'avg_response_time': response_time / asked
+        } for question_id, asked, correct, response_time in heapq.nlargest(limit, totals, key=key)]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get bucket and refresh counters for monitoring"""
+        return {
+            'loaded': self._loaded_through is not None,
+            'questions': len(self._counters),
+            'window_days': self.window_days,
+            'loads': self.loads,
+            'syncs': self.syncs,
+            'last_sync_age_seconds': round(time.monotonic() - self._last_sync, 3) if self._last_sync else None
+        }